@@ -0,0 +1,179 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+
+from constants import *
+from program import *
+
+# NumPy ist optional und wird nur fuer die Batch-Ausfuehrung benoetigt
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Zustand einer Spur
+RUNNING = 0
+HALTED = 1
+FAILED = 2
+
+INDIRECT = {Operator.INDLOAD, Operator.INDSTORE, Operator.INDADD, Operator.INDSUB, Operator.INDMULT, Operator.INDDIV}
+DIRECT = {Operator.LOAD, Operator.STORE, Operator.ADD, Operator.SUB, Operator.MULT, Operator.DIV}
+
+def register_dtype(limit: int):
+    """Kleinster vorzeichenloser Datentyp, der alle Registerwerte aufnehmen kann."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if limit - 1 <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+class BatchMachine:
+    """Fuehrt ein Programm gleichzeitig fuer viele Anfangsbelegungen der Register aus.
+
+    Jede Zeile von memory ist eine Spur mit eigenem Befehlszaehler. Spuren mit gleichem
+    Befehlszaehler werden gemeinsam vektorisiert ausgefuehrt, auseinanderlaufende Spruenge
+    werden ueber Masken behandelt. Spuren, die END erreichen oder das Programm verlassen,
+    werden angehalten, Spuren mit Laufzeitfehler behalten den Fehlertext in errors.
+    Die Semantik entspricht den Standardbefehlen der Machine."""
+
+    def __init__(self, program: Program, memory):
+        if np is None:
+            raise ImportError('BatchMachine requires numpy')
+        self.program = program
+        self.register_count = Constants.REGISTER_COUNT
+        self.register_limit = Constants.REGISTER_LIMIT
+        initial = np.asarray(memory, dtype=np.int64)
+        if initial.ndim != 2 or initial.shape[1] > self.register_count:
+            raise ValueError(f'Memory must have shape (N, k) with k <= {self.register_count}')
+        lanes = initial.shape[0]
+        self.memory = np.zeros((lanes, self.register_count), dtype=register_dtype(self.register_limit))
+        self.memory[:, :initial.shape[1]] = initial % self.register_limit
+        self.program_counter = np.ones(lanes, dtype=np.int64)
+        self.steps = np.zeros(lanes, dtype=np.int64)
+        self.state = np.full(lanes, RUNNING, dtype=np.int8)
+        self.errors: list[str | None] = [None] * lanes
+
+    @staticmethod
+    def zeros(program: Program, lanes: int) -> BatchMachine:
+        return BatchMachine(program, np.zeros((lanes, Constants.REGISTER_COUNT), dtype=np.int64))
+
+    def __len__(self) -> int:
+        return self.memory.shape[0]
+
+    def fail(self, lanes, message: str):
+        self.state[lanes] = FAILED
+        for lane in lanes.tolist():
+            self.errors[lane] = f'An error occured: {message}'
+
+    def invalid_register(self, index: int) -> str:
+        return f'Invalid register index {index}. Must be between 0 and {self.register_count - 1}'
+
+    def run(self, max_steps: int | None = None) -> BatchMachine:
+        """Fuehrt alle laufenden Spuren aus, bis sie anhalten, scheitern oder jeweils
+        max_steps weitere Befehle ausgefuehrt haben."""
+        size = self.program.size()
+        limit = None if max_steps is None else self.steps + max_steps
+        # Spuren, deren Befehlszaehler schon ausserhalb des Programms steht, sind fertig
+        self.state[(self.state == RUNNING) & ((self.program_counter > size) | (self.program_counter < 0))] = HALTED
+        while True:
+            active = self.state == RUNNING
+            if limit is not None:
+                active &= self.steps < limit
+            lanes = np.flatnonzero(active)
+            if lanes.size == 0:
+                break
+            pcs = self.program_counter[lanes]
+            first = pcs[0]
+            if (pcs == first).all():
+                self.execute(int(first), lanes)
+            else:
+                values, groups = np.unique(pcs, return_inverse=True)
+                for group, pc in enumerate(values.tolist()):
+                    self.execute(pc, lanes[groups == group])
+        return self
+
+    def execute(self, pc: int, lanes):
+        """Fuehrt den Befehl in Zeile pc fuer die angegebenen Spuren aus."""
+        instruction = self.program[pc - 1]
+        operator = instruction.operator
+        mem = self.memory
+        limit = self.register_limit
+        operand = instruction.operand % limit
+        if operator == Operator.END:
+            self.state[lanes] = HALTED
+            return
+        if (operator in DIRECT or operator in INDIRECT) and operand >= self.register_count:
+            self.fail(lanes, self.invalid_register(operand))
+            return
+        next_pc = np.full(lanes.size, pc + 1, dtype=np.int64)
+        accumulator = mem[lanes, 0].astype(np.int64)
+        if operator in INDIRECT:
+            # Spuren mit ungueltiger indirekter Adresse scheitern, die uebrigen laufen weiter
+            address = mem[lanes, operand].astype(np.int64)
+            invalid = address >= self.register_count
+            if invalid.any():
+                for index in np.unique(address[invalid]).tolist():
+                    self.fail(lanes[invalid & (address == index)], self.invalid_register(index))
+                lanes, address, accumulator, next_pc = lanes[~invalid], address[~invalid], accumulator[~invalid], next_pc[~invalid]
+            value = mem[lanes, address].astype(np.int64)
+        elif operator in DIRECT:
+            value = mem[lanes, operand].astype(np.int64)
+        else:
+            value = operand
+        match operator:
+            case Operator.NONE:
+                pass
+            case Operator.LOAD | Operator.INDLOAD | Operator.CLOAD:
+                mem[lanes, 0] = value
+            case Operator.STORE:
+                mem[lanes, operand] = accumulator
+            case Operator.INDSTORE:
+                mem[lanes, address] = accumulator
+            case Operator.ADD | Operator.INDADD | Operator.CADD:
+                mem[lanes, 0] = (accumulator + value) % limit
+            case Operator.SUB | Operator.INDSUB | Operator.CSUB:
+                mem[lanes, 0] = (accumulator - value) % limit
+            case Operator.MULT | Operator.INDMULT | Operator.CMULT:
+                mem[lanes, 0] = (accumulator * value) % limit
+            case Operator.DIV | Operator.INDDIV | Operator.CDIV:
+                zero = np.broadcast_to(np.asarray(value) == 0, lanes.shape)
+                if zero.any():
+                    self.fail(lanes[zero], 'integer division or modulo by zero')
+                    lanes, accumulator, next_pc = lanes[~zero], accumulator[~zero], next_pc[~zero]
+                    if np.ndim(value) > 0:
+                        value = value[~zero]
+                    elif lanes.size == 0:
+                        return
+                mem[lanes, 0] = accumulator // value
+            case Operator.GOTO:
+                next_pc[:] = operand
+            case Operator.IF_EQ:
+                next_pc += accumulator != operand
+            case Operator.IF_NE:
+                next_pc += accumulator == operand
+            case Operator.IF_LT:
+                next_pc += accumulator >= operand
+            case Operator.IF_LE:
+                next_pc += accumulator > operand
+            case Operator.IF_GT:
+                next_pc += accumulator <= operand
+            case Operator.IF_GE:
+                next_pc += accumulator < operand
+        self.program_counter[lanes] = next_pc
+        self.steps[lanes] += 1
+        # Spuren, die das Programm verlassen, sind fertig
+        self.state[lanes[next_pc > self.program.size()]] = HALTED
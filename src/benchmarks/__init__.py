@@ -0,0 +1,21 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Benchmarks fuer Parser, Einzelschritte und Ausfuehrung, laufen ohne Tk:
+#
+#   cd src && python3 -m benchmarks --save-baseline baseline.json
+#   cd src && python3 -m benchmarks --compare baseline.json
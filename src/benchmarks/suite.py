@@ -0,0 +1,218 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Misst Durchsatz und Speicherbedarf von Parser, Einzelschritt und Ausfuehrung und vergleicht
+# die Ergebnisse mit einer gespeicherten Basislinie, damit Verschlechterungen auffallen.
+
+from __future__ import annotations
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, NamedTuple
+
+from machine import *
+from benchmarks.workloads import example_programs, synthetic_programs
+
+# Schrittgrenze fuer die Ausfuehrung, die Beispielprogramme enthalten auch Endlosschleifen
+MAX_STEPS = 1_000_000
+# Schritte pro Aufruf beim Einzelschritt-Benchmark
+STEP_COUNT = 20_000
+# Zulaessige Verschlechterung gegenueber der Basislinie, bevor sie als Regression gilt
+DEFAULT_TOLERANCE = 0.10
+
+class Benchmark(NamedTuple):
+    name: str
+    # Liefert die Anzahl der erledigten Einheiten (Zeilen oder Schritte)
+    function: Callable[[], int]
+    unit: str
+
+class Result(NamedTuple):
+    name: str
+    unit: str
+    operations: int
+    # Beste Zeit eines Aufrufs in Sekunden
+    seconds: float
+    # Hoechster zusaetzlicher Speicherbedarf eines Aufrufs in Bytes (tracemalloc)
+    peak_bytes: int
+
+    @property
+    def rate(self) -> float:
+        return self.operations / self.seconds if self.seconds > 0 else float('inf')
+
+    def to_dict(self) -> dict:
+        return {'unit': self.unit, 'operations': self.operations, 'seconds': self.seconds,
+                'rate': self.rate, 'peak_bytes': self.peak_bytes}
+
+def parse_benchmark(source: str) -> Callable[[], int]:
+    lines = len(source.splitlines())
+    def function() -> int:
+        Program.from_string(source)
+        return lines
+    return function
+
+def instruction_benchmark(sources: list[str]) -> Callable[[], int]:
+    # Kommentare und Leerzeilen liest Program.from_string selbst, hier nur echte Befehle
+    lines = [line for source in sources for line in source.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+    def function() -> int:
+        for line in lines:
+            Instruction.from_string(line)
+        return len(lines)
+    return function
+
+def step_benchmark(program: Program, count: int) -> Callable[[], int]:
+    machine = Machine().add_standard_instructions()
+    def function() -> int:
+        machine.reset()
+        machine.program = program
+        for _ in range(count):
+            if machine.is_halted():
+                break
+            machine.step()
+        return machine.steps
+    return function
+
+def run_benchmark(program: Program, use_jit: bool, max_steps: int, fuse: bool = False) -> Callable[[], int]:
+    machine = Machine().add_standard_instructions().use_jit(use_jit).fuse_instructions(fuse)
+    def function() -> int:
+        # Entspricht run_program, aber mit Schrittgrenze fuer Programme ohne Ende
+        machine.reset()
+        machine.program = program
+        machine.run(max_steps)
+        return machine.steps
+    return function
+
+def benchmarks(scale: float = 1.0) -> list[Benchmark]:
+    """Alle Benchmarks, scale verkleinert die synthetischen Programme und die Schrittgrenzen."""
+    sources = example_programs()
+    sources.update(synthetic_programs(scale))
+    programs = {name: Program.from_string(source) for name, source in sources.items()}
+    result = [Benchmark(f'parse/{name}', parse_benchmark(source), 'lines') for name, source in sources.items()]
+    result.append(Benchmark('instruction/from_string', instruction_benchmark(list(sources.values())), 'lines'))
+    result += [Benchmark(f'step/{name}', step_benchmark(program, int(STEP_COUNT * scale)), 'steps') for name, program in programs.items()]
+    for engine, use_jit, fuse in (('interpreter', False, False), ('fused', False, True), ('jit', True, False)):
+        result += [Benchmark(f'run/{engine}/{name}', run_benchmark(program, use_jit, int(MAX_STEPS * scale), fuse), 'steps') for name, program in programs.items()]
+    return result
+
+def measure(benchmark: Benchmark, min_time: float = 0.2, repeat: int = 3) -> Result:
+    """Wie timeit: die Zahl der Aufrufe wird verdoppelt, bis eine Messung min_time dauert,
+    davon zaehlt die beste von repeat Messungen. Der Speicherbedarf wird in einem eigenen
+    Aufruf unter tracemalloc gemessen, da tracemalloc die Laufzeit verfaelscht."""
+    function = benchmark.function
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            operations = function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Result(benchmark.name, benchmark.unit, operations, best / number, peak)
+
+def to_json(results: list[Result]) -> dict:
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': {result.name: result.to_dict() for result in results},
+    }
+
+def load_baseline(path: str) -> dict[str, dict]:
+    with open(path, 'r', encoding='utf-8') as baseline_file:
+        return json.load(baseline_file)['results']
+
+def save_baseline(path: str, results: list[Result]):
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump(to_json(results), baseline_file, indent=2)
+
+def regressions(results: list[Result], baseline: dict[str, dict], tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    """Namen der Benchmarks, deren Durchsatz um mehr als tolerance gesunken
+    oder deren Speicherbedarf um mehr als tolerance gestiegen ist. Messungen mit anderer
+    Arbeitsmenge (z.B. --quick gegen eine volle Basislinie) werden nicht verglichen."""
+    slower = []
+    for result in results:
+        previous = baseline.get(result.name)
+        if previous is None or previous['operations'] != result.operations:
+            continue
+        if result.rate < previous['rate'] * (1 - tolerance) or result.peak_bytes > previous['peak_bytes'] * (1 + tolerance) + 1024:
+            slower.append(result.name)
+    return slower
+
+def format_rate(rate: float) -> str:
+    for factor, prefix in ((1e6, 'M'), (1e3, 'k')):
+        if rate >= factor:
+            return f'{rate / factor:.2f} {prefix}'
+    return f'{rate:.2f} '
+
+def format_result(result: Result, previous: dict | None) -> str:
+    line = (f'{result.name:<40} {format_rate(result.rate) + result.unit + "/s":>18} '
+            f'{result.seconds * 1e6:>12.1f} us {result.peak_bytes / 1024:>10.1f} KiB')
+    if previous is not None and previous['operations'] == result.operations:
+        line += f' {result.rate / previous["rate"] - 1:>+8.1%}'
+    return line
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python3 -m benchmarks',
+                                     description='Measures parsing, single stepping and execution without a GUI.')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--quick', action='store_true', help='smaller synthetic workloads and shorter measurements')
+    parser.add_argument('--min-time', type=float, default=None, help='minimum duration of one measurement in seconds')
+    parser.add_argument('--repeat', type=int, default=3, help='number of measurements per benchmark, the best one counts')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--save-baseline', metavar='PATH', help='store the results as baseline for later comparisons')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a stored baseline, exit code 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'allowed slowdown before a benchmark counts as regression (default: {DEFAULT_TOLERANCE})')
+    args = parser.parse_args(argv)
+
+    min_time = args.min_time if args.min_time is not None else (0.05 if args.quick else 0.2)
+    baseline = load_baseline(args.compare) if args.compare else {}
+    results = []
+    for benchmark in benchmarks(0.1 if args.quick else 1.0):
+        if args.filter not in benchmark.name:
+            continue
+        result = measure(benchmark, min_time, args.repeat)
+        results.append(result)
+        print(format_result(result, baseline.get(result.name)), flush=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(to_json(results), json_file, indent=2)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+    if args.compare:
+        slower = regressions(results, baseline, args.tolerance)
+        for name in slower:
+            print(f'Regression: {name}', file=sys.stderr)
+        return 1 if slower else 0
+    return 0
@@ -0,0 +1,95 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Programme, auf denen die Benchmarks laufen: die Beispielprogramme und synthetische Lasten
+
+from __future__ import annotations
+import os
+import random
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'Beispielprogramme')
+
+def example_programs() -> dict[str, str]:
+    """Quelltexte der Beispielprogramme, nach Dateiname."""
+    sources = {}
+    for name in sorted(os.listdir(EXAMPLES_DIR)):
+        if name.endswith('.ram'):
+            with open(os.path.join(EXAMPLES_DIR, name), 'r', encoding='utf-8') as program_file:
+                sources[os.path.splitext(name)[0]] = program_file.read()
+    return sources
+
+def straight_line(lines: int, seed: int = 0) -> str:
+    """Langer Code ohne Spruenge aus Konstanten-, Lade- und Speicherbefehlen."""
+    rng = random.Random(seed)
+    choices = ['cload {}', 'cadd {}', 'csub {}', 'cmult {}', 'load {r}', 'store {r}', 'add {r}', '# Kommentar', '']
+    result = []
+    for _ in range(lines):
+        result.append(rng.choice(choices).format(rng.randrange(256), r=rng.randrange(1, 8)))
+    result.append('end')
+    return '\n'.join(result)
+
+def counted_loops(depth: int, count: int) -> str:
+    """depth ineinander geschachtelte Zaehlschleifen mit je count Durchlaeufen, Zaehler in den
+    Registern 1 bis depth, die innerste Schleife erhoeht Register 7."""
+    lines = []
+    headers = []
+    for level in range(1, depth + 1):
+        lines += ['cload 0', f'store {level}']
+        headers.append(len(lines) + 1)
+    lines += ['load 7', 'cadd 1', 'store 7']
+    for level in range(depth, 0, -1):
+        lines += [f'load {level}', 'cadd 1', f'store {level}', f'if != {count}', f'goto {headers[level - 1]}']
+    lines.append('end')
+    return '\n'.join(lines)
+
+def indirect_addressing(rounds: int) -> str:
+    """Schleife, die ueber einen Zeiger in Register 1 reihum die Register 4 bis 7 liest und schreibt.
+    Register 2 zaehlt 255 Durchlaeufe, Register 3 wiederholt das rounds-mal (hoechstens 255)."""
+    return '\n'.join([
+        'cload 4',
+        'store 1',
+        # Schleifenanfang (Zeile 3)
+        'indload 1',
+        'indadd 1',
+        'cadd 1',
+        'indstore 1',
+        'load 1',
+        'cadd 1',
+        'store 1',
+        'if < 8',
+        'goto 14',
+        'cload 4',
+        'store 1',
+        'load 2',
+        'cadd 1',
+        'store 2',
+        'if != 0',
+        'goto 3',
+        'load 3',
+        'cadd 1',
+        'store 3',
+        f'if != {rounds}',
+        'goto 3',
+        'end',
+    ])
+
+def synthetic_programs(scale: float = 1.0) -> dict[str, str]:
+    return {
+        'straight_line': straight_line(int(20000 * scale)),
+        'counted_loops': counted_loops(3, max(2, int(60 * scale ** (1 / 3)))),
+        'indirect_addressing': indirect_addressing(max(1, min(255, int(40 * scale)))),
+    }
@@ -0,0 +1,175 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+# Haltepunkte auf Zeilen und Ueberwachung von Registern. Bedingungen wie "R3 > 200" werden
+# einmal in Python-Funktionen uebersetzt und nur in den betroffenen Zeilen geprueft: Haltepunkte
+# vor ihrer Zeile, Ueberwachungen nach den Befehlen, die das Register schreiben koennen. Alle
+# anderen Zeilen fuehrt der Interpreter unveraendert aus.
+
+from __future__ import annotations
+import ast
+import re
+from typing import Callable
+
+from bytecode import Code, OP_CALL, OP_END, OP_UNDEFINED
+from constants import *
+from machine import BreakpointHit, Machine
+from program import *
+from time_travel import WRITES_ACCUMULATOR
+
+# Namen, unter denen der Akkumulator in Bedingungen angesprochen werden kann
+ACCUMULATOR_NAMES = {'akku', 'acc', 'a'}
+REGISTER_NAME = re.compile(r'[rR](\d+)$')
+# Ein einzelnes = wie in "if = 0" steht fuer einen Vergleich
+SINGLE_EQUALS = re.compile(r'(?<![=!<>])=(?!=)')
+
+ALLOWED_NODES = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+                 ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod, ast.Compare, ast.Eq, ast.NotEq,
+                 ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Constant, ast.Name, ast.Load)
+
+class Registers(ast.NodeTransformer):
+    """Ersetzt Registernamen durch Zugriffe auf den Speicher."""
+
+    def __init__(self, register_count: int):
+        self.register_count = register_count
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        match = REGISTER_NAME.match(node.id)
+        if node.id.lower() in ACCUMULATOR_NAMES:
+            index = 0
+        elif match is not None:
+            index = int(match.group(1))
+        else:
+            raise ValueError(f'Unknown name {node.id!r} in condition, expected akku or R0 to R{self.register_count - 1}')
+        if index >= self.register_count:
+            raise ValueError(f'Invalid register index {index}. Must be between 0 and {self.register_count - 1}')
+        return ast.Subscript(ast.Name('mem', ast.Load()), ast.Constant(index), ast.Load())
+
+def compile_condition(condition: str, register_count: int = Constants.REGISTER_COUNT) -> Callable:
+    """Uebersetzt eine Bedingung wie "R3 > 200 and akku != 0" in eine Funktion des Speichers."""
+    try:
+        tree = ast.parse(SINGLE_EQUALS.sub('==', condition.strip()), mode='eval')
+    except SyntaxError:
+        raise ValueError(f'Invalid condition {condition!r}')
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES) or (isinstance(node, ast.Constant) and type(node.value) is not int):
+            raise ValueError(f'Invalid condition {condition!r}')
+    body = Registers(register_count).visit(tree).body
+    source = f'lambda mem: bool({ast.unparse(body)})'
+    return eval(compile(source, f'<condition {condition}>', 'eval'), {'__builtins__': {'bool': bool}})
+
+class Breakpoint:
+    """Haelt vor der Ausfuehrung der Zeile line an, wenn die Bedingung erfuellt ist."""
+
+    def __init__(self, line: int, condition: str | None, register_count: int):
+        self.line = line
+        self.condition = condition
+        self.predicate = compile_condition(condition, register_count) if condition else None
+
+    def __str__(self) -> str:
+        return f'Breakpoint at line {self.line}' + (f' ({self.condition})' if self.condition else '')
+
+class Watchpoint:
+    """Haelt nach einem Befehl an, der den Wert von register aendert, wenn die Bedingung
+    erfuellt ist. Mit line werden nur Befehle dieser Zeile ueberwacht."""
+
+    def __init__(self, register: int, condition: str | None, line: int | None, register_count: int):
+        if not 0 <= register < register_count:
+            raise ValueError(f'Invalid register index {register}. Must be between 0 and {register_count - 1}')
+        self.register = register
+        self.condition = condition
+        self.line = line
+        self.predicate = compile_condition(condition, register_count) if condition else None
+
+    def __str__(self) -> str:
+        name = 'akku' if self.register == 0 else f'R{self.register}'
+        return f'Watchpoint on {name}' + (f' at line {self.line}' if self.line is not None else '') + (f' ({self.condition})' if self.condition else '')
+
+def may_write(operator: Operator | None, operand: int, register: int) -> bool:
+    """Ob ein Befehl das Register schreiben kann, operator None steht fuer unbekannte Wirkung."""
+    if operator is None or operator == Operator.INDSTORE:
+        return True
+    if operator == Operator.STORE:
+        return operand == register
+    return register == 0 and operator in WRITES_ACCUMULATOR
+
+class Breakpoints:
+    """Haltepunkte und Ueberwachungen einer Maschine. Loest einer aus, bricht run() mit
+    BreakpointHit ab, die Maschine haelt den Grund in Machine.stopped fest. Ein Haltepunkt, an
+    dem angehalten wurde, wird beim naechsten run() an derselben Stelle einmal uebergangen."""
+
+    def __init__(self):
+        self.breakpoints: list[Breakpoint] = []
+        self.watchpoints: list[Watchpoint] = []
+        # Befehlszaehler und Schrittzahl des letzten ausgeloesten Haltepunkts
+        self.resumed: tuple[int, int] | None = None
+
+    def empty(self) -> bool:
+        return not self.breakpoints and not self.watchpoints
+
+    def lines(self) -> set[int]:
+        return {breakpoint.line for breakpoint in self.breakpoints}
+
+    def code_pass(self, machine: Machine, code: Code):
+        for pc in range(code.size + 1):
+            op = code.ops[pc]
+            if op in (OP_END, OP_UNDEFINED):
+                continue
+            # Index 0 ist die Kopie der letzten Zeile
+            line = code.program.source_line(pc or code.size)
+            operator = code.program[(pc or code.size) - 1].operator
+            known = None if op == OP_CALL else operator
+            breaks = [b for b in self.breakpoints if b.line == line]
+            watches = [w for w in self.watchpoints if (w.line is None or w.line == line) and may_write(known, code.args[pc], w.register)]
+            if not breaks and not watches:
+                continue
+            function = code.handlers[pc] if op == OP_CALL else machine.instruction_set[operator]
+            if watches:
+                function = self.watched(function, watches, line)
+            if breaks:
+                function = self.guarded(function, breaks)
+            code.handlers[pc] = function
+            code.ops[pc] = OP_CALL
+    # Vor den Superinstruktionen, damit keine Folge ueber eine gepruefte Zeile hinweg zusammengefasst wird
+    code_pass.order = 0.25
+
+    def guarded(self, function: Callable, breaks: list[Breakpoint]) -> Callable:
+        def handler(m: Machine, i: int) -> Machine:
+            for breakpoint in breaks:
+                if breakpoint.predicate is None or breakpoint.predicate(m.memory):
+                    position = (m.program_counter, m.steps)
+                    if position != self.resumed:
+                        self.resumed = position
+                        raise BreakpointHit(str(breakpoint), m.program_counter, m.steps)
+                    break
+            return function(m, i)
+        return handler
+
+    def watched(self, function: Callable, watches: list[Watchpoint], line: int) -> Callable:
+        def handler(m: Machine, i: int) -> Machine:
+            memory = m.memory
+            before = [memory[watch.register] for watch in watches]
+            function(m, i)
+            memory = m.memory
+            for watch, old in zip(watches, before):
+                value = memory[watch.register]
+                if value != old and (watch.predicate is None or watch.predicate(memory)):
+                    # Angehalten wird nach dem Befehl, wie ihn der Interpreter abgeschlossen haette
+                    raise BreakpointHit(f'{watch}: {old} -> {value} at line {line}', m.program_counter + 1, m.steps + 1)
+            return m
+        return handler
@@ -0,0 +1,315 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+import sys
+from typing import Callable, TYPE_CHECKING
+
+from constants import *
+from program import *
+
+if TYPE_CHECKING:
+    from machine import Machine
+
+# Jeder Operator bekommt als Opcode seine Position im Enum
+OPCODES: dict[Operator, int] = {operator: index for index, operator in enumerate(Operator)}
+
+OP_NONE = OPCODES[Operator.NONE]
+OP_LOAD = OPCODES[Operator.LOAD]
+OP_STORE = OPCODES[Operator.STORE]
+OP_ADD = OPCODES[Operator.ADD]
+OP_SUB = OPCODES[Operator.SUB]
+OP_MULT = OPCODES[Operator.MULT]
+OP_DIV = OPCODES[Operator.DIV]
+OP_END = OPCODES[Operator.END]
+OP_GOTO = OPCODES[Operator.GOTO]
+OP_IF_EQ = OPCODES[Operator.IF_EQ]
+OP_IF_NE = OPCODES[Operator.IF_NE]
+OP_IF_LT = OPCODES[Operator.IF_LT]
+OP_IF_LE = OPCODES[Operator.IF_LE]
+OP_IF_GT = OPCODES[Operator.IF_GT]
+OP_IF_GE = OPCODES[Operator.IF_GE]
+OP_CLOAD = OPCODES[Operator.CLOAD]
+OP_CADD = OPCODES[Operator.CADD]
+OP_CSUB = OPCODES[Operator.CSUB]
+OP_CMULT = OPCODES[Operator.CMULT]
+OP_CDIV = OPCODES[Operator.CDIV]
+OP_INDLOAD = OPCODES[Operator.INDLOAD]
+OP_INDSTORE = OPCODES[Operator.INDSTORE]
+OP_INDADD = OPCODES[Operator.INDADD]
+OP_INDSUB = OPCODES[Operator.INDSUB]
+OP_INDMULT = OPCODES[Operator.INDMULT]
+OP_INDDIV = OPCODES[Operator.INDDIV]
+
+# Interne Opcodes, die nicht direkt einem Operator entsprechen
+OP_CALL = len(OPCODES)          # Selbst registrierter Befehl, wird ueber den Befehlssatz aufgerufen
+OP_UNDEFINED = OP_CALL + 1      # Operator ohne Eintrag im Befehlssatz
+OP_EXIT = OP_CALL + 2           # Sprung hinter das Programmende
+
+# Superinstruktionen fuer haeufige Folgen, sie stehen in der ersten Zeile der Folge
+# (siehe superinstructions.py). Die uebrigen Zeilen behalten ihren eigenen Opcode.
+OP_LOAD_STORE = OP_CALL + 3
+OP_CLOAD_STORE = OP_CALL + 4
+OP_INDLOAD_STORE = OP_CALL + 5
+OP_LOAD_INDSTORE = OP_CALL + 6
+OP_INDLOAD_INDSTORE = OP_CALL + 7
+OP_IF_EQ_GOTO = OP_CALL + 8
+OP_IF_NE_GOTO = OP_CALL + 9
+OP_LOAD_ADD_STORE = OP_CALL + 10
+OP_LOAD_SUB_STORE = OP_CALL + 11
+OP_LOAD_CADD_STORE = OP_CALL + 12
+OP_LOAD_CSUB_STORE = OP_CALL + 13
+OP_CADD_IF_NE_GOTO = OP_CALL + 14
+
+# Obergrenze fuer Laeufe ohne Schrittbegrenzung
+UNLIMITED = sys.maxsize
+
+class Code:
+    """Vorab dekodiertes Programm als flache Arrays.
+
+    Die Arrays werden direkt mit dem Befehlszaehler indiziert: Index 0 enthaelt eine Kopie
+    des letzten Befehls (ein Sprung auf Zeile 0 fuehrt wie bisher den letzten Befehl aus),
+    die Indizes 1 bis size das Programm und die beiden letzten Eintraege sind END-Waechter,
+    damit ueber das Programmende hinauslaufende Schritte und IF-Spruenge anhalten."""
+
+    def __init__(self, program: Program, instruction_set: dict, ops: list[int], args: list[int], handlers: list[Callable | None]):
+        self.program = program
+        self.instruction_set = instruction_set
+        # Nachtraeglich angewendete Durchlaeufe (siehe Machine.code_passes)
+        self.passes: tuple = ()
+        self.size = program.size()
+        self.ops = ops
+        self.args = args
+        self.handlers = handlers
+
+def decode(machine: Machine, program: Program) -> Code:
+    """Uebersetzt ein Programm fuer den Befehlssatz einer Maschine in Code.
+
+    Operatoren, deren Eintrag im Befehlssatz noch der eingebaute Befehl ist, werden direkt
+    in der Schleife von execute() ausgefuehrt, alle anderen ueber ihre registrierte Funktion.
+    Danach duerfen die Durchlaeufe in machine.code_passes einzelne Befehle durch Aufrufe (OP_CALL) ersetzen."""
+    size = program.size()
+    ops = [OP_END] * (size + 3)
+    args = [0] * (size + 3)
+    handlers: list[Callable | None] = [None] * (size + 3)
+    for pc in range(1, size + 1):
+        instruction = program[pc - 1]
+        operator = instruction.operator
+        operand = instruction.operand & machine.mask
+        function = machine.instruction_set.get(operator)
+        if function is None:
+            ops[pc] = OP_UNDEFINED
+        elif function is not machine.native_instructions.get(operator):
+            ops[pc] = OP_CALL
+            handlers[pc] = function
+        elif operator == Operator.GOTO and operand > size:
+            ops[pc] = OP_EXIT
+        else:
+            ops[pc] = OPCODES[operator]
+        args[pc] = operand
+    if size > 0:
+        ops[0], args[0], handlers[0] = ops[size], args[size], handlers[size]
+    code = Code(program, dict(machine.instruction_set), ops, args, handlers)
+    code.passes = tuple(machine.code_passes)
+    for code_pass in code.passes:
+        code_pass(machine, code)
+    return code
+
+def execute(machine: Machine, code: Code, limit: int = UNLIMITED) -> None:
+    """Fuehrt Code ab dem aktuellen Befehlszaehler aus, bis END erreicht, das Programm
+    verlassen oder machine.steps den Wert limit erreicht hat.
+
+    Befehlszaehler und Schrittzaehler werden auch im Fehlerfall in die Maschine zurueckgeschrieben,
+    der Befehlszaehler steht dann auf dem fehlerhaften Befehl. Superinstruktionen fuehren ihre
+    weiteren Zeilen nur aus, solange das Schrittlimit reicht, und zaehlen jede Zeile als Schritt.
+    Nur ihr letzter Befehl darf scheitern, davor werden Befehlszaehler und Schritte weitergesetzt."""
+    ops = code.ops
+    args = code.args
+    size = code.size
+    mem = machine.memory
+    mask = machine.mask
+    pc = machine.program_counter
+    steps = machine.steps
+    machine.step_limit = limit
+    if pc < 0 or pc > size:
+        return
+    try:
+        while steps < limit:
+            op = ops[pc]
+            if op == OP_CADD:
+                mem[0] = (mem[0] + args[pc]) & mask
+            elif op == OP_GOTO:
+                pc = args[pc] - 1
+            elif op == OP_LOAD:
+                mem[0] = mem[args[pc]]
+            elif op == OP_STORE:
+                mem[args[pc]] = mem[0]
+            elif op == OP_NONE:
+                pass
+            elif op > OP_EXIT:
+                # Superinstruktionen
+                if op == OP_LOAD_CADD_STORE:
+                    mem[0] = mem[args[pc]]
+                    if limit - steps > 2:
+                        mem[0] = (mem[0] + args[pc + 1]) & mask
+                        pc += 2
+                        steps += 2
+                        mem[args[pc]] = mem[0]
+                elif op == OP_IF_NE_GOTO:
+                    if mem[0] == args[pc]:
+                        pc += 1
+                    elif limit - steps > 1:
+                        steps += 1
+                        pc = args[pc + 1] - 1
+                elif op == OP_IF_EQ_GOTO:
+                    if mem[0] != args[pc]:
+                        pc += 1
+                    elif limit - steps > 1:
+                        steps += 1
+                        pc = args[pc + 1] - 1
+                elif op == OP_LOAD_STORE:
+                    mem[0] = mem[args[pc]]
+                    if limit - steps > 1:
+                        pc += 1
+                        steps += 1
+                        mem[args[pc]] = mem[0]
+                elif op == OP_CLOAD_STORE:
+                    mem[0] = args[pc]
+                    if limit - steps > 1:
+                        pc += 1
+                        steps += 1
+                        mem[args[pc]] = mem[0]
+                elif op == OP_LOAD_ADD_STORE:
+                    mem[0] = mem[args[pc]]
+                    if limit - steps > 2:
+                        mem[0] = (mem[0] + mem[args[pc + 1]]) & mask
+                        pc += 2
+                        steps += 2
+                        mem[args[pc]] = mem[0]
+                elif op == OP_LOAD_SUB_STORE:
+                    mem[0] = mem[args[pc]]
+                    if limit - steps > 2:
+                        mem[0] = (mem[0] - mem[args[pc + 1]]) & mask
+                        pc += 2
+                        steps += 2
+                        mem[args[pc]] = mem[0]
+                elif op == OP_LOAD_CSUB_STORE:
+                    mem[0] = mem[args[pc]]
+                    if limit - steps > 2:
+                        mem[0] = (mem[0] - args[pc + 1]) & mask
+                        pc += 2
+                        steps += 2
+                        mem[args[pc]] = mem[0]
+                elif op == OP_CADD_IF_NE_GOTO:
+                    mem[0] = (mem[0] + args[pc]) & mask
+                    if limit - steps > 1:
+                        pc += 1
+                        steps += 1
+                        if mem[0] == args[pc]:
+                            pc += 1
+                        elif limit - steps > 1:
+                            steps += 1
+                            pc = args[pc + 1] - 1
+                elif op == OP_INDLOAD_STORE:
+                    mem[0] = mem[mem[args[pc]]]
+                    if limit - steps > 1:
+                        pc += 1
+                        steps += 1
+                        mem[args[pc]] = mem[0]
+                elif op == OP_LOAD_INDSTORE:
+                    mem[0] = mem[args[pc]]
+                    if limit - steps > 1:
+                        pc += 1
+                        steps += 1
+                        mem[mem[args[pc]]] = mem[0]
+                elif op == OP_INDLOAD_INDSTORE:
+                    mem[0] = mem[mem[args[pc]]]
+                    if limit - steps > 1:
+                        pc += 1
+                        steps += 1
+                        mem[mem[args[pc]]] = mem[0]
+            elif op == OP_IF_NE:
+                if mem[0] == args[pc]:
+                    pc += 1
+            elif op == OP_IF_EQ:
+                if mem[0] != args[pc]:
+                    pc += 1
+            elif op == OP_IF_LT:
+                if mem[0] >= args[pc]:
+                    pc += 1
+            elif op == OP_IF_LE:
+                if mem[0] > args[pc]:
+                    pc += 1
+            elif op == OP_IF_GT:
+                if mem[0] <= args[pc]:
+                    pc += 1
+            elif op == OP_IF_GE:
+                if mem[0] < args[pc]:
+                    pc += 1
+            elif op == OP_END:
+                break
+            elif op == OP_ADD:
+                mem[0] = (mem[0] + mem[args[pc]]) & mask
+            elif op == OP_SUB:
+                mem[0] = (mem[0] - mem[args[pc]]) & mask
+            elif op == OP_CLOAD:
+                mem[0] = args[pc]
+            elif op == OP_CSUB:
+                mem[0] = (mem[0] - args[pc]) & mask
+            elif op == OP_INDLOAD:
+                mem[0] = mem[mem[args[pc]]]
+            elif op == OP_INDSTORE:
+                mem[mem[args[pc]]] = mem[0]
+            elif op == OP_INDADD:
+                mem[0] = (mem[0] + mem[mem[args[pc]]]) & mask
+            elif op == OP_INDSUB:
+                mem[0] = (mem[0] - mem[mem[args[pc]]]) & mask
+            elif op == OP_MULT:
+                mem[0] = (mem[0] * mem[args[pc]]) & mask
+            elif op == OP_CMULT:
+                mem[0] = (mem[0] * args[pc]) & mask
+            elif op == OP_INDMULT:
+                mem[0] = (mem[0] * mem[mem[args[pc]]]) & mask
+            elif op == OP_DIV:
+                mem[0] = mem[0] // mem[args[pc]]
+            elif op == OP_CDIV:
+                mem[0] = mem[0] // args[pc]
+            elif op == OP_INDDIV:
+                mem[0] = mem[0] // mem[mem[args[pc]]]
+            elif op == OP_CALL:
+                machine.program_counter = pc
+                machine.steps = steps
+                code.handlers[pc](machine, args[pc])
+                pc = machine.program_counter
+                steps = machine.steps
+                mem = machine.memory
+                if pc < -1 or pc > size + 1:
+                    # Eigene Befehle duerfen beliebig springen, ausserhalb des Programms wird angehalten
+                    pc += 1
+                    steps += 1
+                    break
+            elif op == OP_EXIT:
+                pc = args[pc]
+                steps += 1
+                break
+            else:
+                raise KeyError(code.program[pc - 1].operator)
+            pc += 1
+            steps += 1
+    finally:
+        machine.program_counter = pc
+        machine.steps = steps
@@ -19,3 +19,6 @@ class Constants:
     # Variablen, die konstant bleiben sollen, zur Vermeidung von Magic Numbers
     REGISTER_COUNT = 8 # 1 Byte je Register, 8 Register insgesamt
     REGISTER_LIMIT = 256 # 0-255
+    # Standard-Wortbreite in Bit, einzelne Maschinen koennen auch 16, 32 oder 64 Bit verwenden
+    WORD_SIZE = 8
+    WORD_SIZES = (8, 16, 32, 64)
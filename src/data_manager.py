@@ -25,4 +25,14 @@ class DataManager:
     def __init__(self, root: tk.Tk):
         # Gemeinsame Variablen, die in der GUI und anderen Klassen verwendet werden
         self.registers: list[tk.StringVar] = [tk.StringVar(master=root, value="0") for _ in range(Constants.REGISTER_COUNT)]
-        self.program_counter = tk.IntVar(master=root, value=1)
\ No newline at end of file
+        self.program_counter = tk.IntVar(master=root, value=1)
+
+    def sync(self, program_counter: int, memory) -> None:
+        """Uebernimmt den Zustand einer Maschine gesammelt in die Tk-Variablen.
+        Es werden nur geaenderte Werte geschrieben, damit keine unnoetigen Traces ausgeloest werden."""
+        if self.program_counter.get() != program_counter:
+            self.program_counter.set(program_counter)
+        for var, value in zip(self.registers, memory):
+            text = str(value)
+            if var.get() != text:
+                var.set(text)
@@ -0,0 +1,211 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+# Vollstaendiger Vergleich zweier Programme, z.B. einer Abgabe mit einer Musterloesung.
+# Alle limit^k Belegungen der Eingaberegister werden in Bloecken mit der BatchMachine
+# ausgefuehrt, die Bloecke verteilen sich auf mehrere Prozesse.
+#
+#   python3 equivalence.py muster.ram abgabe.ram --inputs 1 2 --outputs 3 --max-steps 100000
+#
+# Spuren, die nach einer Runde im selben Zustand (Befehlszaehler und Speicher) stehen, verlaufen
+# ab dort gleich. Sie werden zusammengelegt und nur einmal weiter ausgefuehrt.
+
+from __future__ import annotations
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from batch import BatchMachine, FAILED, HALTED, RUNNING, np
+from constants import *
+from optimizer import Counterexample
+from program import *
+
+DEFAULT_MAX_STEPS = 100_000
+# Eingaben pro Block und Prozessaufruf
+CHUNK_SIZE = 1 << 16
+# Schritte zwischen zwei Zusammenlegungen gleicher Zustaende
+ROUND_STEPS = 64
+
+# Zustand einer Spur, die in einer anderen aufgegangen ist
+MERGED = 3
+
+# Rueckgabewert von main() ohne Gegenbeispiel, wenn Eingaben das Schrittlimit erreicht haben
+INCONCLUSIVE = 3
+
+class Verdict(NamedTuple):
+    counterexample: Counterexample | None
+    # Anzahl der geprueften Eingaben und derer, bei denen das Original das Schrittlimit erreicht hat
+    checked: int
+    undecided: int
+
+    @property
+    def equivalent(self) -> bool:
+        return self.counterexample is None
+
+def input_count(inputs: list[int]) -> int:
+    return Constants.REGISTER_LIMIT ** len(inputs)
+
+def initial_memory(inputs: list[int], start: int, stop: int, base: list[int] | None = None):
+    """Anfangsbelegungen der Eingaben start bis stop-1. Das erste Eingaberegister ist die hoechste Stelle."""
+    limit = Constants.REGISTER_LIMIT
+    memory = np.zeros((stop - start, Constants.REGISTER_COUNT), dtype=np.int64)
+    if base is not None:
+        memory[:, :len(base)] = base
+    index = np.arange(start, stop, dtype=np.int64)
+    for position, register in enumerate(reversed(inputs)):
+        memory[:, register] = index // limit ** position % limit
+    return memory
+
+def run_merged(program: Program, memory, max_steps: int, round_steps: int = ROUND_STEPS) -> BatchMachine:
+    """Fuehrt alle Spuren aus und legt dabei Spuren mit gleichem Zustand zusammen. Im Ergebnis
+    tragen zusammengelegte Spuren den Endzustand der Spur, in der sie aufgegangen sind."""
+    machine = BatchMachine(program, memory)
+    owner = np.arange(len(machine))
+    done = 0
+    while done < max_steps:
+        running = np.flatnonzero(machine.state == RUNNING)
+        if running.size == 0:
+            break
+        # Laufende Spuren haben alle dieselbe Schrittzahl, gleicher Zustand bedeutet daher gleiches Ergebnis
+        keys = np.column_stack((machine.program_counter[running], machine.memory[running].astype(np.int64)))
+        keys = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        if first.size < running.size:
+            representative = running[first[inverse.ravel()]]
+            duplicate = representative != running
+            owner[running[duplicate]] = representative[duplicate]
+            machine.state[running[duplicate]] = MERGED
+        steps = min(round_steps, max_steps - done)
+        machine.run(steps)
+        done += steps
+    # Ketten von Zusammenlegungen bis zur ausgefuehrten Spur verfolgen
+    while True:
+        resolved = owner[owner]
+        if (resolved == owner).all():
+            break
+        owner = resolved
+    machine.state = machine.state[owner]
+    machine.memory = machine.memory[owner]
+    machine.program_counter = machine.program_counter[owner]
+    machine.steps = machine.steps[owner]
+    machine.errors = [machine.errors[lane] for lane in owner.tolist()]
+    return machine
+
+def result(machine: BatchMachine, lane: int) -> tuple | None:
+    """Endzustand einer Spur in der Form von optimizer.outcome, None beim Schrittlimit."""
+    if machine.state[lane] == RUNNING:
+        return None
+    return machine.memory[lane].tolist(), machine.errors[lane]
+
+def check_chunk(original: Program, candidate: Program, inputs: list[int], start: int, stop: int,
+                max_steps: int, outputs: list[int] | None = None, base: list[int] | None = None) -> Verdict:
+    """Vergleicht beide Programme auf den Eingaben start bis stop-1."""
+    memory = initial_memory(inputs, start, stop, base)
+    expected = run_merged(original, memory, max_steps)
+    actual = run_merged(candidate, memory, max_steps)
+    columns = slice(None) if outputs is None else outputs
+    decided = expected.state != RUNNING
+    differs = decided & ((expected.state != actual.state)
+                         | (expected.memory[:, columns] != actual.memory[:, columns]).any(axis=1))
+    # Fehlertexte werden nur bei gescheiterten Spuren verglichen
+    for lane in np.flatnonzero(decided & ~differs & (expected.state == FAILED)).tolist():
+        if expected.errors[lane] != actual.errors[lane]:
+            differs[lane] = True
+            break
+    counterexample = None
+    lanes = np.flatnonzero(differs)
+    if lanes.size:
+        lane = int(lanes[0])
+        counterexample = Counterexample(memory[lane].tolist(), result(expected, lane), result(actual, lane))
+    return Verdict(counterexample, stop - start, int((~decided).sum()))
+
+def check_exhaustive(original: Program, candidate: Program, inputs: list[int], max_steps: int = DEFAULT_MAX_STEPS,
+                     outputs: list[int] | None = None, base: list[int] | None = None, workers: int | None = None,
+                     chunk_size: int = CHUNK_SIZE) -> Verdict:
+    """Vergleicht beide Programme auf allen Belegungen der Eingaberegister, die uebrigen Register
+    starten mit base bzw. 0. Verglichen werden Fehler und die Register outputs (ohne Angabe alle).
+    Eingaben, bei denen das Original das Schrittlimit erreicht, werden nicht bewertet.
+    Gemeldet wird das in Aufzaehlungsreihenfolge erste Gegenbeispiel."""
+    if np is None:
+        raise ImportError('Exhaustive equivalence checks require numpy')
+    total = input_count(inputs)
+    chunks = [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+    checked = undecided = 0
+    if workers == 1 or len(chunks) == 1:
+        verdicts = (check_chunk(original, candidate, inputs, start, stop, max_steps, outputs, base) for start, stop in chunks)
+        for verdict in verdicts:
+            checked += verdict.checked
+            undecided += verdict.undecided
+            if verdict.counterexample is not None:
+                return Verdict(verdict.counterexample, checked, undecided)
+        return Verdict(None, checked, undecided)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(check_chunk, original, candidate, inputs, start, stop, max_steps, outputs, base)
+                   for start, stop in chunks]
+        # In Reihenfolge auswerten, damit das erste Gegenbeispiel gemeldet wird
+        for future in futures:
+            verdict = future.result()
+            checked += verdict.checked
+            undecided += verdict.undecided
+            if verdict.counterexample is not None:
+                return Verdict(verdict.counterexample, checked, undecided)
+    finally:
+        # Nach einem Gegenbeispiel laufende Bloecke nicht abwarten und ausstehende nicht mehr starten
+        pool.shutdown(wait=False, cancel_futures=True)
+    return Verdict(None, checked, undecided)
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Checks whether two RAM programs behave the same on every input.')
+    parser.add_argument('original', help='reference program (.ram)')
+    parser.add_argument('candidate', help='program to check (.ram)')
+    parser.add_argument('--inputs', type=int, nargs='+', required=True, help='input registers, all their values are enumerated')
+    parser.add_argument('--outputs', type=int, nargs='+', default=None, help='registers to compare (default: all)')
+    parser.add_argument('--base', type=int, nargs='+', default=None,
+                        help=f'initial values of all {Constants.REGISTER_COUNT} registers, input registers are overwritten')
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS, help='step limit per run')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='inputs per batch')
+    args = parser.parse_args(argv)
+
+    if any(not 0 <= register < Constants.REGISTER_COUNT for register in args.inputs + (args.outputs or [])):
+        parser.error(f'Registers must be between 0 and {Constants.REGISTER_COUNT - 1}')
+    if len(set(args.inputs)) != len(args.inputs):
+        # Sonst wuerden dieselben Belegungen mehrfach aufgezaehlt und mitgezaehlt
+        parser.error('Input registers must not repeat')
+    if args.base is not None:
+        if len(args.base) != Constants.REGISTER_COUNT:
+            parser.error(f'--base needs exactly {Constants.REGISTER_COUNT} values, got {len(args.base)}')
+        if any(not 0 <= value < Constants.REGISTER_LIMIT for value in args.base):
+            parser.error(f'Values of --base must be between 0 and {Constants.REGISTER_LIMIT - 1}')
+    verdict = check_exhaustive(Program.from_file(args.original), Program.from_file(args.candidate), args.inputs,
+                               args.max_steps, args.outputs, args.base, args.workers, args.chunk_size)
+    print(f'Checked {verdict.checked} of {input_count(args.inputs)} inputs, {verdict.undecided} undecided (step limit)')
+    if verdict.counterexample is not None:
+        print(f'Counterexample: {verdict.counterexample}')
+        return 1
+    if verdict.undecided:
+        # Ohne Vergleich auf diesen Eingaben ist keine Aussage ueber die Gleichheit moeglich
+        print('Inconclusive: no counterexample, but not all inputs were compared')
+        return INCONCLUSIVE
+    print('Equivalent')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,12 +17,32 @@
 from platform import system
 import ctypes
 
+import math
 import pathlib
 import tkinter as tk
-from tkinter import filedialog
+from tkinter import filedialog, simpledialog
 
 from constants import *
+from data_manager import DataManager
 from machine import *
+from worker import MachineWorker
+
+# Anzeige wird hoechstens einmal pro Frame (ca. 60 Hz) aktualisiert
+FRAME_INTERVAL = 16 # ms
+# Auswahl fuer die Abspielgeschwindigkeit in Schritten pro Sekunde, None = so schnell wie moeglich
+SPEEDS = {
+    '1 / s': 1,
+    '10 / s': 10,
+    '100 / s': 100,
+    '1000 / s': 1000,
+    '100000 / s': 100000,
+    'Maximal': None,
+}
+
+# Hintergrundfarben der Heatmap von selten nach häufig ausgeführt
+HEAT_COLORS = ['#fff3e0', '#ffe0b2', '#ffcc80', '#ffb74d', '#ffa726', '#ff9800', '#fb8c00', '#f57c00']
+# Während Play wird die Heatmap nur alle HEATMAP_FRAMES Frames neu berechnet
+HEATMAP_FRAMES = 30
 
 class Gui:
     def __init__(self, root: tk.Tk, data_manager: DataManager, machine: Machine):
@@ -33,6 +53,24 @@ class Gui:
         self.editable = True # Flag für die Bearbeitbarkeit des Textfelds
         self.current_file_path = None
         self.auto_increment_active = False  # Flag für die automatische Inkrementierung (play aktiv)
+        self.speed = tk.StringVar(master=self.root, value=next(iter(SPEEDS)))
+        self.worker: MachineWorker | None = None # Führt die Maschine während Play aus
+
+        # Geänderte Register werden gesammelt und einmal pro Frame neu gezeichnet
+        self.dirty_registers: set[int] = set()
+        self.highlight_dirty = False
+        self.refresh_pending = None
+
+        # Wiederverwendbare Einträge der Zeilennummernleiste und deren zuletzt gezeichneter Inhalt
+        self.gutter_items: list[int] = []
+        self.gutter_lines: list[tuple[int, str]] = []
+        self.gutter_pending = None
+
+        # Heatmap aus den Zählern des Profilers: Zeile -> Ausführungen bzw. angezeigte Farbstufe
+        self.heatmap_enabled = tk.BooleanVar(master=self.root, value=False)
+        self.heat_hits: dict[int, int] = {}
+        self.heat_levels: dict[int, int] = {}
+        self.heatmap_frames = 0
 
         # Erstellen der GUI-Komponenten
         self.root.geometry("800x600")  # Größe des Fensters festlegen
@@ -78,7 +116,7 @@ class Gui:
             integer_label.grid(row=i, column=0, pady=5, padx=5, sticky='e')
 
             # StringVar für das Eingabefeld, damit Änderungen überwacht werden können
-            integer_var.trace_add("write", lambda name, index, mode, var=integer_var, idx=i: self.update_binary_representation(var, idx))
+            integer_var.trace_add("write", lambda name, index, mode, idx=i: self.mark_register_dirty(idx))
 
             # Eingabefeld für den Registerwert
             vcmd = (self.left_frame.register(self.validate_integer), '%P')
@@ -103,6 +141,7 @@ class Gui:
         # Anzeige des Werts des Program Counters
         self.pc_display = tk.Label(self.left_frame, textvariable=self.datamanager.program_counter, relief='sunken', width=10)
         self.pc_display.grid(row=Constants.REGISTER_COUNT, column=1, pady=10, padx=5)
+        self.datamanager.program_counter.trace_add("write", lambda name, index, mode: self.mark_highlight_dirty())
 
         # Reset-Button
         self.step_button = tk.Button(self.left_frame, text="Reset", command=self.reset)
@@ -116,10 +155,26 @@ class Gui:
         self.play_button = tk.Button(self.left_frame, text="Play", command=self.toggle_play_pause)
         self.play_button.grid(row=Constants.REGISTER_COUNT+1, column=2, pady=10, padx=5)
 
+        # Schritt zurück und Zurückspulen bis zu einer Zeile (benötigt Machine.record_trace)
+        self.step_back_button = tk.Button(self.left_frame, text="Zurück", command=self.step_back)
+        self.step_back_button.grid(row=Constants.REGISTER_COUNT+2, column=0, pady=5, padx=5)
+        self.run_back_button = tk.Button(self.left_frame, text="Zurück bis Zeile", command=self.run_back)
+        self.run_back_button.grid(row=Constants.REGISTER_COUNT+2, column=1, pady=5, padx=5)
+        self.run_back_line = tk.StringVar(master=self.root, value="1")
+        vcmd = (self.left_frame.register(self.validate_integer), '%P')
+        run_back_entry = tk.Entry(self.left_frame, textvariable=self.run_back_line, validate='key', validatecommand=vcmd, width=10)
+        run_back_entry.grid(row=Constants.REGISTER_COUNT+2, column=2, pady=5, padx=5)
+
+        # Auswahl der Abspielgeschwindigkeit
+        speed_label = tk.Label(self.left_frame, text="Tempo:")
+        speed_label.grid(row=Constants.REGISTER_COUNT+3, column=0, pady=5, padx=5, sticky='e')
+        self.speed_menu = tk.OptionMenu(self.left_frame, self.speed, *SPEEDS)
+        self.speed_menu.grid(row=Constants.REGISTER_COUNT+3, column=1, columnspan=2, pady=5, padx=5, sticky='w')
+
         # Textfeld für die Anzeige von Exceptions
         self.exception_frame = tk.Frame(self.left_frame)
-        self.exception_frame.grid(row=Constants.REGISTER_COUNT+2, column=0, columnspan=3, pady=10, padx=5)
-        self.exception_text = tk.Text(self.exception_frame, height=8, width=50, wrap='word', fg='red')
+        self.exception_frame.grid(row=Constants.REGISTER_COUNT+4, column=0, columnspan=3, pady=10, padx=5)
+        self.exception_text = tk.Text(self.exception_frame, height=6, width=50, wrap='word', fg='red')
         self.exception_text.configure(state='disabled')
         self.exception_text.pack(expand=True, fill='both')
 
@@ -144,10 +199,22 @@ class Gui:
         self.scrollbar.pack(side='right', fill='y')
 
         # Textbereich
-        self.text_area = tk.Text(self.text_frame, wrap='word', yscrollcommand=self.scrollbar.set)
+        self.text_area = tk.Text(self.text_frame, wrap='word', yscrollcommand=self.text_scrolled)
         self.text_area.pack(expand=True, fill='both')
+        for level, color in enumerate(HEAT_COLORS):
+            self.text_area.tag_configure(f'heat{level}', background=color)
+        self.text_area.tag_configure('breakpoint', background='#f4b6b6')
+        # Die Hervorhebung des Program Counters liegt über der Heatmap
+        self.text_area.tag_configure('highlight', background='yellow')
 
         self.scrollbar.config(command=self.scrollbar_command)
+        # Klick auf eine Zeilennummer setzt oder entfernt einen Haltepunkt
+        self.line_numbers.bind('<Button-1>', self.gutter_clicked)
+
+    def text_scrolled(self, first, last):
+        """Wird bei jeder Verschiebung des sichtbaren Bereichs aufgerufen, auch über Tastatur und Mausrad."""
+        self.scrollbar.set(first, last)
+        self.update_line_numbers()
 
     def scrollbar_command(self, *args):
         """Verknüpft die Scrollbar mit dem Textbereich. Zeilennummern werden aktualisiert."""
@@ -156,7 +223,7 @@ class Gui:
         
 
     def build_menu(self):
-        """Erstellt die Menüleiste mit den Menüs 'Datei' und 'Bearbeiten'."""
+        """Erstellt die Menüleiste mit den Menüs 'Datei', 'Bearbeiten', 'Ansicht' und 'Debuggen'."""
         self.menu_bar = tk.Menu(self.root)
         self.root.config(menu=self.menu_bar)
 
@@ -173,6 +240,19 @@ class Gui:
         self.edit_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Bearbeiten", menu=self.edit_menu)
         self.edit_menu.add_command(label="Bearbeiten umschalten", command=self.toggle_editable)
+
+        # Menü "Ansicht"
+        self.view_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Ansicht", menu=self.view_menu)
+        self.view_menu.add_checkbutton(label="Heatmap", variable=self.heatmap_enabled, command=self.toggle_heatmap)
+
+        # Menü "Debuggen"
+        self.debug_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Debuggen", menu=self.debug_menu)
+        self.debug_menu.add_command(label="Bedingter Haltepunkt...", command=self.add_conditional_breakpoint)
+        self.debug_menu.add_command(label="Register überwachen...", command=self.add_watchpoint)
+        self.debug_menu.add_separator()
+        self.debug_menu.add_command(label="Alle Haltepunkte entfernen", command=self.clear_breakpoints)
         self.highlight_program_counter_line()
 
     def build_status_bar(self):
@@ -192,7 +272,8 @@ class Gui:
                 self.text_area.insert(tk.END, content)
                 self.current_file_path = file_path
                 self.status_bar.config(text=f"Geöffnet: {file_path}")
-                self.update_line_numbers()  
+                self.update_line_numbers()
+                self.highlight_program_counter_line()
             except Exception as e:
                 self.show_exception(f"Datei konnte nicht geöffnet werden: {e}")
 
@@ -236,6 +317,10 @@ class Gui:
                     self.machine.program = Program.from_string(self.text_area.get(1.0, tk.END))
                 except Exception as e:
                     self.show_exception(f"Programm konnte nicht geladen werden: {e}")
+                # Die Hervorhebung kann beim Bearbeiten verloren gegangen sein
+                self.highlight_program_counter_line()
+            # Beim Bearbeiten passen die Zähler nicht mehr zu den Zeilen
+            self.render_heatmap()
 
     def validate_integer(self, value_if_allowed):
         """Validiert das Eingabefeld auf ganzzahlige positive Werte oder leer."""
@@ -262,64 +347,264 @@ class Gui:
                 led.config(text='1', bg='red')
             self.show_exception("Ungültige Eingabe: Bitte eine Zahl zwischen 0 und 255 eingeben.")
 
+    def mark_register_dirty(self, idx):
+        """Merkt ein geändertes Register für die nächste Aktualisierung der Anzeige vor."""
+        self.dirty_registers.add(idx)
+        self.schedule_refresh()
+
+    def mark_highlight_dirty(self):
+        self.highlight_dirty = True
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        if self.refresh_pending is None:
+            self.refresh_pending = self.root.after(FRAME_INTERVAL, self.refresh)
+
+    def refresh(self):
+        """Zeichnet alle seit dem letzten Frame geänderten Register und die Zeilenhervorhebung neu."""
+        self.refresh_pending = None
+        dirty, self.dirty_registers = self.dirty_registers, set()
+        for idx in sorted(dirty):
+            self.update_binary_representation(self.datamanager.registers[idx], idx)
+        if self.highlight_dirty:
+            self.highlight_dirty = False
+            self.highlight_program_counter_line()
+
     def reset(self):
         """Setzt den Program Counter auf 1 und setzt alle Register auf 0."""
-        self.machine.clear_memory()
-        self.datamanager.program_counter.set(1)
+        self.stop_play()
+        self.machine.reset()
         self.highlight_program_counter_line()
+        self.render_heatmap()
         self.exception_text.configure(state='normal')
         self.exception_text.delete(1.0, tk.END)
         self.exception_text.configure(state='disabled')
 
     def step(self):
         """Inkrementiert den Program Counter um 1 und aktualisiert die Zeilenhervorhebung."""
-        if not self.editable:
+        # Während Play gehört die Maschine dem Worker
+        if not self.editable and not self.auto_increment_active:
             try:
                 self.machine.step()
             except Exception as e:
                 self.show_exception(str(e))
             self.highlight_program_counter_line()
+            self.render_heatmap()
+
+    def step_back(self):
+        """Macht den letzten Schritt rückgängig."""
+        if not self.editable and not self.auto_increment_active:
+            try:
+                if not self.machine.step_back():
+                    self.show_exception("Es gibt keinen aufgezeichneten Schritt mehr.")
+            except Exception as e:
+                self.show_exception(str(e))
+            self.highlight_program_counter_line()
+
+    def run_back(self):
+        """Geht zurück bis zum letzten Zeitpunkt, an dem die eingegebene Zeile ausgeführt wurde."""
+        if not self.editable and not self.auto_increment_active and self.run_back_line.get():
+            line = int(self.run_back_line.get())
+            try:
+                if not self.machine.run_back_to(line):
+                    self.show_exception(f"Zeile {line} wurde in der Aufzeichnung nicht ausgeführt.")
+            except Exception as e:
+                self.show_exception(str(e))
+            self.highlight_program_counter_line()
 
     def toggle_play_pause(self):
         """Wechselt zwischen automatischer Inkrementierung (play) und Pause."""
         if self.auto_increment_active:
             # Pausiere die automatische Inkrementierung
-            self.auto_increment_active = False
-            self.play_button.config(text="Play")
+            self.stop_play()
         elif not self.editable:
-            # Starte die automatische Inkrementierung
+            # Starte die automatische Inkrementierung in einem eigenen Thread
             self.auto_increment_active = True
             self.play_button.config(text="Pause")
+            self.worker = MachineWorker(self.machine, SPEEDS[self.speed.get()]).start()
             self.auto_increment()
 
+    def stop_play(self):
+        """Beendet den Worker, danach gehört die Maschine wieder der GUI."""
+        if self.worker is not None:
+            snapshot = self.worker.stop()
+            self.worker = None
+            if snapshot.error is not None:
+                self.show_exception(snapshot.error)
+            if snapshot.stop is not None:
+                self.datamanager.sync(snapshot.program_counter, snapshot.memory)
+                self.status_bar.config(text=f"Angehalten: {snapshot.stop} (Schritt {snapshot.steps})")
+                self.highlight_program_counter_line()
+        self.auto_increment_active = False
+        self.play_button.config(text="Play")
+        self.render_heatmap()
+
     def auto_increment(self):
-        """Erhöht den Program Counter automatisch in Intervallen (1 Sek.), bis der Play-Button wieder gedrückt wird."""
-        if self.auto_increment_active:
-            self.step()
-            self.highlight_program_counter_line()
-            self.root.after(1000, self.auto_increment)  # Wird wieder aufgerufen, nach 1 Sekunde
+        """Übernimmt einmal pro Frame den letzten Zustand des Workers in die Anzeige,
+        bis der Play-Button wieder gedrückt wird oder die Maschine anhält."""
+        if not self.auto_increment_active:
+            return
+        # Geschwindigkeit kann während des Laufs geändert werden
+        self.worker.speed = SPEEDS[self.speed.get()]
+        snapshot = self.worker.snapshot
+        self.datamanager.sync(snapshot.program_counter, snapshot.memory)
+        self.heatmap_frames += 1
+        if self.heatmap_frames >= HEATMAP_FRAMES:
+            self.heatmap_frames = 0
+            self.render_heatmap()
+        if snapshot.running:
+            self.root.after(FRAME_INTERVAL, self.auto_increment)
+        else:
+            self.stop_play()
+
+    def gutter_clicked(self, event):
+        """Setzt oder entfernt den Haltepunkt der angeklickten Zeile."""
+        line = int(self.text_area.index(f"@0,{event.y}").split(".")[0])
+        # Die Durchläufe der Maschine dürfen nicht geändert werden, während der Worker läuft
+        self.stop_play()
+        if line in self.breakpoint_lines():
+            self.machine.remove_breakpoint(line)
+        else:
+            self.machine.add_breakpoint(line)
+        self.render_breakpoints()
+
+    def add_conditional_breakpoint(self):
+        """Fragt Zeile und Bedingung ab, z.B. "R3 > 200", und setzt den Haltepunkt."""
+        line = simpledialog.askinteger("Bedingter Haltepunkt", "Zeile:", parent=self.root, minvalue=1)
+        if line is None:
+            return
+        condition = simpledialog.askstring("Bedingter Haltepunkt", "Bedingung (z.B. R3 > 200, leer = immer):", parent=self.root)
+        if condition is None:
+            return
+        self.stop_play()
+        try:
+            self.machine.add_breakpoint(line, condition or None)
+        except ValueError as e:
+            self.show_exception(str(e))
+        self.render_breakpoints()
+
+    def add_watchpoint(self):
+        """Fragt Register, Bedingung und optional eine Zeile ab und überwacht das Register."""
+        register = simpledialog.askinteger("Register überwachen", "Register:", parent=self.root, minvalue=0)
+        if register is None:
+            return
+        condition = simpledialog.askstring("Register überwachen", "Bedingung (z.B. akku = 0, leer = jede Änderung):", parent=self.root)
+        if condition is None:
+            return
+        line = simpledialog.askstring("Register überwachen", "Nur in Zeile (leer = überall):", parent=self.root)
+        if line is None:
+            return
+        self.stop_play()
+        try:
+            self.machine.add_watchpoint(register, condition or None, int(line) if line.strip() else None)
+        except ValueError as e:
+            self.show_exception(str(e))
+        self.status_bar.config(text=f"Überwacht: R{register}")
+
+    def clear_breakpoints(self):
+        """Entfernt alle Haltepunkte und Überwachungen."""
+        self.stop_play()
+        self.machine.clear_breakpoints()
+        self.render_breakpoints()
+
+    def breakpoint_lines(self) -> set[int]:
+        breakpoints = self.machine.breakpoints
+        return breakpoints.lines() if breakpoints is not None else set()
+
+    def render_breakpoints(self):
+        """Markiert alle Zeilen mit Haltepunkt im Text und in der Zeilennummernleiste."""
+        self.text_area.tag_remove('breakpoint', 1.0, tk.END)
+        for line in self.breakpoint_lines():
+            self.text_area.tag_add('breakpoint', f'{line}.0', f'{line+1}.0')
+        # Beschriftungen ungültig machen, damit die Markierungen neu gezeichnet werden
+        self.gutter_lines = [(y, '') for y, _ in self.gutter_lines]
+        self.update_line_numbers()
+
+    def toggle_heatmap(self):
+        """Schaltet den Profiler der Maschine und die Heatmap ein oder aus."""
+        # Die Durchläufe der Maschine dürfen nicht geändert werden, während der Worker läuft
+        self.stop_play()
+        self.machine.profile(self.heatmap_enabled.get())
+        self.line_numbers.config(width=100 if self.heatmap_enabled.get() else 40)
+        self.render_heatmap()
+
+    def render_heatmap(self):
+        """Färbt die Zeilen nach der Anzahl ihrer Ausführungen (logarithmisch). Es werden nur
+        Zeilen angefasst, deren Farbstufe sich geändert hat."""
+        profiler = self.machine.profiler
+        hits: dict[int, int] = {}
+        if self.heatmap_enabled.get() and not self.editable and profiler is not None and profiler.program is self.machine.program:
+            hits = profiler.result().hits
+        highest = max(hits.values(), default=1)
+        levels = {}
+        for line, count in hits.items():
+            fraction = math.log(count) / math.log(highest) if highest > 1 else 1.0
+            levels[line] = min(len(HEAT_COLORS) - 1, int(fraction * len(HEAT_COLORS)))
+        for line, level in self.heat_levels.items():
+            if levels.get(line) != level:
+                self.text_area.tag_remove(f'heat{level}', f'{line}.0', f'{line+1}.0')
+        for line, level in levels.items():
+            if self.heat_levels.get(line) != level:
+                self.text_area.tag_add(f'heat{level}', f'{line}.0', f'{line+1}.0')
+        self.heat_levels = levels
+        if hits != self.heat_hits:
+            self.heat_hits = hits
+            # Beschriftungen ungültig machen, damit die Zeilennummern mit den neuen Zählern gezeichnet werden
+            self.gutter_lines = [(y, '') for y, _ in self.gutter_lines]
+            self.update_line_numbers()
 
     def highlight_program_counter_line(self):
         """Markiert die Zeile, auf die der Program Counter zeigt."""
-        # Entferne vorherige Hervorhebung
-        self.text_area.tag_remove('highlight', '1.0', tk.END)
-        
-        # Hole die Zeile, die hervorgehoben werden soll
-        line_num = self.datamanager.program_counter.get()
-        self.text_area.tag_add('highlight', f'{line_num}.0', f'{line_num+1}.0')
-        self.text_area.tag_configure('highlight', background='yellow')
+        line_num = self.machine.program.source_line(self.datamanager.program_counter.get())
+        start, end = f'{line_num}.0', f'{line_num+1}.0'
+        # Nur die alte und die neue Zeile anfassen statt den ganzen Text
+        ranges = self.text_area.tag_ranges('highlight')
+        if len(ranges) == 2 and self.text_area.compare(ranges[0], '==', start) and self.text_area.compare(ranges[1], '==', end):
+            return
+        if ranges:
+            self.text_area.tag_remove('highlight', *ranges)
+        self.text_area.tag_add('highlight', start, end)
 
     def update_line_numbers(self, event=None):
-        """Aktualisiert die Zeilennummern des Texteditors."""
-        self.line_numbers.delete("all")
-
+        """Fordert eine Aktualisierung der Zeilennummern an. Schnell aufeinanderfolgende
+        Ereignisse werden zu einer Aktualisierung pro Frame zusammengefasst."""
+        if self.gutter_pending is None:
+            self.gutter_pending = self.root.after(FRAME_INTERVAL, self.redraw_line_numbers)
+
+    def redraw_line_numbers(self):
+        """Zeichnet die Zeilennummern der sichtbaren Zeilen. Vorhandene Canvas-Einträge werden
+        wiederverwendet und nur geändert, wenn sich Zeilennummer oder Position geändert haben."""
+        self.gutter_pending = None
+        lines = []
+        breakpoint_lines = self.breakpoint_lines()
         i = self.text_area.index("@0,0")
         while True:
-            dline = self.text_area.dlineinfo(i) 
+            dline = self.text_area.dlineinfo(i)
             if dline is None:
                 break
-            y = dline[1]
-            line_number = str(i).split(".")[0]
-            self.line_numbers.create_text(2, y, anchor="nw", text=line_number, fill="black")
+            line_number = i.split(".")[0]
+            hits = self.heat_hits.get(int(line_number))
+            label = f'{line_number}  {hits}' if hits else line_number
+            lines.append((dline[1], f'● {label}' if int(line_number) in breakpoint_lines else label))
             i = self.text_area.index(f"{i}+1line")
-        self.highlight_program_counter_line()
+        if lines == self.gutter_lines:
+            return
+
+        for k, (y, line_number) in enumerate(lines):
+            if k == len(self.gutter_items):
+                self.gutter_items.append(self.line_numbers.create_text(2, y, anchor="nw", text=line_number, fill="black"))
+                continue
+            item = self.gutter_items[k]
+            old = self.gutter_lines[k] if k < len(self.gutter_lines) else None
+            if old is None:
+                self.line_numbers.itemconfigure(item, text=line_number, state='normal')
+                self.line_numbers.coords(item, 2, y)
+                continue
+            if old[1] != line_number:
+                self.line_numbers.itemconfigure(item, text=line_number)
+            if old[0] != y:
+                self.line_numbers.coords(item, 2, y)
+        # Nicht mehr benötigte Einträge ausblenden statt löschen
+        for item in self.gutter_items[len(lines):len(self.gutter_lines)]:
+            self.line_numbers.itemconfigure(item, state='hidden')
+        self.gutter_lines = lines
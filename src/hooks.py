@@ -0,0 +1,185 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+# Beobachter fuer die Ausfuehrung: Tracer, Abdeckung oder Metriken melden sich fuer Ereignisse
+# an (Machine.add_hook) und bekommen sie gesammelt als Listen geliefert. Ohne Beobachter fuer
+# Schritte, Schreibzugriffe oder Spruenge bleibt der Code unveraendert, der Interpreter und
+# der JIT laufen dann ohne jede Pruefung pro Schritt.
+
+from __future__ import annotations
+from typing import Callable, NamedTuple
+
+from bytecode import Code, OPCODES, OP_CALL, OP_END, OP_EXIT, OP_UNDEFINED
+from constants import *
+from memory import changed_registers, contents
+from program import *
+from time_travel import CONDITIONS, WRITES_ACCUMULATOR
+
+# Arten von Ereignissen
+STEP = 'step'
+WRITE = 'write'
+BRANCH = 'branch'
+END = 'end'
+ERROR = 'error'
+KINDS = (STEP, WRITE, BRANCH, END, ERROR)
+# Ereignisse, fuer die jeder Befehl umschlossen werden muss
+PER_STEP = (STEP, WRITE, BRANCH)
+
+# Ereignisse, nach denen die Beobachter spaetestens aufgerufen werden
+BATCH_SIZE = 4096
+
+class Event(NamedTuple):
+    kind: str
+    # Zeile des Befehls und Schrittzahl vor dem Befehl
+    pc: int
+    steps: int
+    # Geschriebenes Register bei WRITE
+    register: int | None = None
+    # Geschriebener Wert bei WRITE, naechste Zeile bei BRANCH, Fehlertext bei ERROR
+    value: int | str | None = None
+
+class Hooks:
+    """Angemeldete Beobachter einer Maschine und die noch nicht gelieferten Ereignisse.
+
+    Ereignisse werden je Art als Tupel gesammelt und bei jedem sync() der Maschine (am Ende von
+    run() und nach jedem Einzelschritt) sowie nach batch_size Ereignissen einer Art geliefert.
+    Jeder Beobachter bekommt die Ereignisse seiner Art in der Reihenfolge ihres Auftretens."""
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        self.callbacks: dict[str, list[Callable[[list[Event]], None]]] = {kind: [] for kind in KINDS}
+        self.pending: dict[str, list[tuple]] = {kind: [] for kind in KINDS}
+        self.batch_size = batch_size
+
+    def add(self, kind: str, callback: Callable[[list[Event]], None]):
+        if kind not in self.callbacks:
+            raise ValueError(f'Unknown event {kind!r}, expected one of {", ".join(KINDS)}')
+        self.callbacks[kind].append(callback)
+
+    def remove(self, kind: str, callback: Callable[[list[Event]], None]):
+        if callback in self.callbacks.get(kind, []):
+            self.callbacks[kind].remove(callback)
+
+    def per_step(self) -> bool:
+        return any(self.callbacks[kind] for kind in PER_STEP)
+
+    def empty(self) -> bool:
+        return not any(self.callbacks.values())
+
+    def emit(self, kind: str, pc: int, steps: int, register: int | None = None, value: int | str | None = None):
+        if self.callbacks[kind]:
+            self.pending[kind].append((kind, pc, steps, register, value))
+
+    def end(self, pc: int, steps: int):
+        self.emit(END, pc, steps)
+
+    def error(self, pc: int, steps: int, message: str):
+        # Nach einem Fehler folgt kein sync() mehr, alles Gesammelte wird sofort geliefert
+        self.emit(ERROR, pc, steps, None, message)
+        self.flush()
+
+    def flush(self):
+        for kind, pending in self.pending.items():
+            if pending:
+                batch = list(map(Event._make, pending))
+                pending.clear()
+                for callback in self.callbacks[kind]:
+                    callback(batch)
+
+    def code_pass(self, machine, code: Code):
+        """Umschliesst jeden Befehl, der Ereignisse ausloesen kann."""
+        for pc in range(code.size + 1):
+            op = code.ops[pc]
+            if op in (OP_END, OP_UNDEFINED):
+                continue
+            operator = code.program[(pc or code.size) - 1].operator
+            if op > OP_EXIT:
+                # Eine Superinstruktion fuehrt die folgenden Zeilen ohne deren Ereignisse aus,
+                # die Zeile wird wieder einzeln ausgefuehrt und die Folgezeilen selbst umschlossen
+                code.ops[pc] = op = OPCODES[operator]
+            if op == OP_CALL:
+                # Eigener oder von einem anderen Durchlauf ersetzter Befehl mit unbekannter Wirkung
+                function, known = code.handlers[pc], None
+            else:
+                function, known = machine.instruction_set[operator], operator
+            handler = self.wrap(function, known)
+            if handler is not None:
+                code.handlers[pc] = handler
+                code.ops[pc] = OP_CALL
+    # Nach den Superinstruktionen und der Aufzeichnung, vor dem Profiler
+    code_pass.order = 1.5
+
+    def wrap(self, function: Callable, operator: Operator | None) -> Callable | None:
+        """Umschlossener Befehl oder None, wenn er kein angemeldetes Ereignis ausloesen kann."""
+        step = bool(self.callbacks[STEP])
+        write = bool(self.callbacks[WRITE]) and (operator is None or operator in WRITES_ACCUMULATOR
+                                                 or operator in (Operator.STORE, Operator.INDSTORE))
+        branch = bool(self.callbacks[BRANCH]) and (operator is None or operator == Operator.GOTO or operator in CONDITIONS)
+        if not (step or write or branch):
+            return None
+        return self.observed(function, operator, step, write, branch)
+
+    def observed(self, function: Callable, operator: Operator | None, step: bool, write: bool, branch: bool) -> Callable:
+        """Umschliesst einen Befehl. operator None steht fuer einen Befehl mit unbekannter Wirkung
+        (eigene Befehle und von anderen Durchlaeufen ersetzte, auch von der Aufzeichnung). Fuer sie
+        werden durch Vergleich des Speichers nur Register gemeldet, deren Wert sich geaendert hat."""
+        step_events = self.pending[STEP]
+        write_events = self.pending[WRITE]
+        branch_events = self.pending[BRANCH]
+        batch_size = self.batch_size
+        if step and not write and not branch:
+            # Haeufigster Fall (Tracer, Abdeckung) ohne weitere Fallunterscheidung
+            def step_handler(m, i: int):
+                pc = m.program_counter
+                steps = m.steps
+                function(m, i)
+                step_events.append((STEP, pc, steps, None, None))
+                if len(step_events) >= batch_size:
+                    self.flush()
+                return m
+            return step_handler
+        def handler(m, i: int):
+            pc = m.program_counter
+            steps = m.steps
+            memory = m.memory
+            register = None
+            if write:
+                if operator is None:
+                    before = contents(memory)
+                elif operator == Operator.STORE:
+                    register = i
+                elif operator == Operator.INDSTORE:
+                    # Bei ungueltigem Zeiger scheitert der Befehl ohnehin
+                    register = memory[i] if i < len(memory) else None
+                else:
+                    register = 0
+            function(m, i)
+            if step:
+                step_events.append((STEP, pc, steps, None, None))
+            if write:
+                if operator is None:
+                    for changed in changed_registers(m.memory, before):
+                        write_events.append((WRITE, pc, steps, changed, m.memory[changed]))
+                elif register is not None:
+                    write_events.append((WRITE, pc, steps, register, m.memory[register]))
+            if branch and m.program_counter != pc:
+                # Die naechste Zeile ist nicht pc + 1
+                branch_events.append((BRANCH, pc, steps, None, m.program_counter + 1))
+            if len(step_events) >= batch_size or len(write_events) >= batch_size or len(branch_events) >= batch_size:
+                self.flush()
+            return m
+        return handler
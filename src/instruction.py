@@ -86,95 +86,80 @@ class InvalidOperator(Exception):
 class InvalidSyntax(Exception):
     pass
 
+class InvalidProgram(Exception):
+    """Sammelt alle Fehler eines Programms, errors enthaelt Paare aus Zeilennummer und Fehler."""
+
+    def __init__(self, errors: list[tuple[int, Exception]]):
+        self.errors = errors
+        super().__init__('\n'.join(f'Line {line}: {error}' for line, error in errors))
+
 def canonicalize(string: str) -> str:
-    return string.lower().replace('\\s+', ' ').lstrip().rstrip()
+    return ' '.join(string.lower().split())
+
+# Zuordnung der Befehlswoerter und Vergleichsoperatoren zu den Operatoren
+MNEMONICS: dict[str, Operator] = {name: Operator.from_string(name) for name in SIMPLE_INSTRUCTIONS}
+COMPARATORS: dict[str, Operator] = {
+    '=': Operator.IF_EQ,
+    '!=': Operator.IF_NE,
+    '<': Operator.IF_LT,
+    '<=': Operator.IF_LE,
+    '>': Operator.IF_GT,
+    '>=': Operator.IF_GE,
+}
+SYMBOLS: dict[Operator, str] = {operator: comparator for comparator, operator in COMPARATORS.items()}
+
+OPERAND_LIMIT = 1 << max(Constants.WORD_SIZES)
+
+def parse_operand(token: str) -> int:
+    try:
+        return int(token)
+    except ValueError:
+        raise InvalidOperand(f'Operand {token} is not an integer')
 
 class Instruction:
     def __init__(self, operator: Operator, operand: int):
         self.operator: Operator = operator
-        self.operand = operand % Constants.REGISTER_LIMIT
+        # Operanden sind 64-Bit-Worte, mit oder ohne Vorzeichen (z.B. bleibt -1 erhalten).
+        # Erst die Maschine reduziert sie auf ihre eigene Wortbreite
+        if not -OPERAND_LIMIT // 2 <= operand < OPERAND_LIMIT:
+            operand %= OPERAND_LIMIT
+        self.operand = operand
 
     def __str__(self) -> str:
         op = self.operator
-        match op:
-            case Operator.END:
-                return Operator.END.value
-            case Operator.IF_EQ | Operator.IF_GE | Operator.IF_GT | Operator.IF_LE | Operator.IF_LT:
-                comparator = ''
-                match op:
-                    case Operator.IF_EQ:
-                        comparator = '='
-                    case Operator.IF_NE:
-                        comparator = '!='
-                    case Operator.IF_LT:
-                        comparator = '<'
-                    case Operator.IF_LE:
-                        comparator = '<='
-                    case Operator.IF_GT:
-                        comparator = '>'
-                    case Operator.IF_GE: 
-                        comparator = '>='
-                return f'if {comparator} {str(self.operand)}'                   
-            case _:
-                return self.operator.replace('_', ' ') + ' ' + str(self.operand)
-    
+        if op == Operator.END:
+            return Operator.END.value
+        if op in SYMBOLS:
+            return f'if {SYMBOLS[op]} {str(self.operand)}'
+        return self.operator.replace('_', ' ') + ' ' + str(self.operand)
+
     @staticmethod
     def from_string(source: str) -> Instruction:
-        # Kommentare ignorieren
-        if source.startswith('#'):
+        return Instruction.from_tokens(source.lower().split())
+
+    @staticmethod
+    def from_tokens(parts: list[str]) -> Instruction:
+        """Erzeugt einen Befehl aus den bereits kleingeschriebenen Woertern einer Zeile."""
+        # Leerzeilen und Kommentare ignorieren
+        if not parts or parts[0].startswith('#'):
             return Instruction(Operator.NONE, 0)
-        
-        parts = canonicalize(source).split(' ')
         operator = parts[0]
-        part1 = ''
-        part2 = ''
-        try:
-            part1 = parts[1]
-        except IndexError:
-            part1 = Operator.NONE
-        try:
-            part2 = parts[2]
-        except IndexError:
-            part2 = Operator.NONE
-        match operator:
-            case '':
-                return Instruction(Operator.NONE, 0)
-            case operator if operator in SIMPLE_INSTRUCTIONS:
-                if len(parts) > 2:
-                    raise InvalidSyntax(f'Instruction {operator} expects only one operand')
-                operand = 0
-                try:
-                    operand = int(part1)
-                except ValueError:
-                    raise InvalidOperand(f'Operand {part1} is not an integer')
-                return Instruction(Operator.from_string(operator), operand)
-            case 'if':
-                if len(parts) != 3:
-                    raise InvalidSyntax(f'IF-Statements expect a comparator and a comparison value')
-                operand = 0
-                try:
-                    operand = int(part2)
-                except ValueError:
-                    if part2 == Operator.NONE:
-                        raise InvalidSyntax(f'IF-Statements expect a comparator and a comparison value')
-                    raise InvalidOperand(f'Operand {part2} is not an integer')
-                mode = part1
-                match mode:
-                    case '=':
-                        return Instruction(Operator.IF_EQ, operand)
-                    case '!=':
-                        return Instruction(Operator.IF_NE, operand)
-                    case '<':
-                        return Instruction(Operator.IF_LT, operand)
-                    case '<=':
-                        return Instruction(Operator.IF_LE, operand)
-                    case '>':
-                        return Instruction(Operator.IF_GT, operand)
-                    case '>=':
-                        return Instruction(Operator.IF_GE, operand)
-                    case _:
-                        raise InvalidOperand(f'Comparator {part1} is invalid')
-            case Operator.END:
-                return Instruction(Operator.END, 0)
-            case _:
-                raise InvalidOperator(f'Operator {operator} is invalid')
+        if operator == 'go' and len(parts) > 1 and parts[1] == 'to':
+            operator = 'goto'
+            parts = parts[1:]
+        if operator in MNEMONICS:
+            if len(parts) > 2:
+                raise InvalidSyntax(f'Instruction {operator} expects only one operand')
+            if len(parts) < 2:
+                raise InvalidSyntax(f'Instruction {operator} expects an operand')
+            return Instruction(MNEMONICS[operator], parse_operand(parts[1]))
+        if operator == 'if':
+            if len(parts) != 3:
+                raise InvalidSyntax(f'IF-Statements expect a comparator and a comparison value')
+            operand = parse_operand(parts[2])
+            if parts[1] not in COMPARATORS:
+                raise InvalidOperand(f'Comparator {parts[1]} is invalid')
+            return Instruction(COMPARATORS[parts[1]], operand)
+        if operator == Operator.END:
+            return Instruction(Operator.END, 0)
+        raise InvalidOperator(f'Operator {operator} is invalid')
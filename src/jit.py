@@ -0,0 +1,347 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+from array import array
+from collections import OrderedDict
+from typing import Callable, TYPE_CHECKING
+from weakref import WeakKeyDictionary
+
+from bytecode import execute
+from constants import *
+from memory import DenseMemory
+from program import *
+
+if TYPE_CHECKING:
+    from machine import Machine
+
+# Uebersetzte Programme, Schluessel ist der Inhaltshash des Programms und die Speichergeometrie
+CACHE: OrderedDict[tuple, JitProgram] = OrderedDict()
+CACHE_SIZE = 256
+# Inhaltshash und Operatoren je Programmobjekt. Wie Machine.compile() gehen sie davon aus, dass ein
+# Programm nach dem ersten Lauf nicht mehr veraendert wird, und ersparen kurzen Abschnitten
+# (run_async, Worker, Dienst) bei jedem run() einen Durchgang ueber das ganze Programm.
+SUMMARIES: WeakKeyDictionary[Program, tuple[str, frozenset[Operator]]] = WeakKeyDictionary()
+
+# Fehlerarten, die eine uebersetzte Funktion zurueckmelden kann
+FAULT_INDEX = 'index'
+FAULT_ZERO = 'zero'
+
+COMPARATORS = {
+    Operator.IF_EQ: '==',
+    Operator.IF_NE: '!=',
+    Operator.IF_LT: '<',
+    Operator.IF_LE: '<=',
+    Operator.IF_GT: '>',
+    Operator.IF_GE: '>=',
+}
+
+DIRECT = {Operator.LOAD, Operator.STORE, Operator.ADD, Operator.SUB, Operator.MULT, Operator.DIV}
+INDIRECT = {Operator.INDLOAD, Operator.INDSTORE, Operator.INDADD, Operator.INDSUB, Operator.INDMULT, Operator.INDDIV}
+
+class JitProgram:
+    """Ein in eine Python-Funktion uebersetztes Programm.
+
+    function(mem, pc, steps, limit) fuehrt ganze Grundbloecke aus, solange das Schrittlimit
+    fuer den naechsten Block reicht, und liefert (pc, steps, fault) zurueck."""
+
+    def __init__(self, function: Callable, leaders: set[int], source: str):
+        self.function = function
+        self.leaders = leaders
+        self.source = source
+
+def find_leaders(program: Program) -> list[int]:
+    """Startpositionen der Grundbloecke: Zeile 1, Sprungziele und die Zeilen nach Spruengen, IFs und END."""
+    size = program.size()
+    leaders = {1}
+    for pc in range(1, size + 1):
+        instruction = program[pc - 1]
+        if instruction.operator == Operator.GOTO:
+            leaders.add(instruction.operand)
+            leaders.add(pc + 1)
+        elif instruction.operator in COMPARATORS:
+            leaders.add(pc + 1)
+            leaders.add(pc + 2)
+        elif instruction.operator == Operator.END:
+            leaders.add(pc + 1)
+    return sorted(pc for pc in leaders if 0 <= pc <= size)
+
+class BlockCompiler:
+    """Erzeugt den Python-Quelltext fuer die Grundbloecke eines Programms.
+
+    Der Akkumulator liegt immer in der lokalen Variable a, die uebrigen Register ohne indirekte
+    Adressierung in r1, r2, ..., sonst direkt in mem. Die Reduktion auf die Wortbreite (Maskieren) wird
+    fuer Additionen und Subtraktionen aufgeschoben, bis der Wert gelesen, verglichen oder gespeichert wird.
+    Die Operanden des Programms muessen bereits reduziert sein (siehe Program.masked)."""
+
+    def __init__(self, program: Program, register_count: int, register_limit: int):
+        self.program = program
+        self.size = program.size()
+        self.register_count = register_count
+        self.register_limit = register_limit
+        self.mask = register_limit - 1
+        self.indirect = any(e.operator in INDIRECT for e in program.instructions)
+        # Direkt adressierte Register ausser dem Akkumulator, nur diese werden in lokale Variablen geladen
+        self.used = sorted({e.operand for e in program.instructions if e.operator in DIRECT and 0 < e.operand < register_count})
+        self.leaders = find_leaders(program)
+        self.leader_set = set(self.leaders)
+        self.lines: list[str] = []
+        self.wrapped = True
+
+    def emit(self, indent: int, line: str):
+        self.lines.append('    ' * indent + line)
+
+    def register(self, index: int) -> str:
+        if index == 0:
+            return 'a'
+        return f'mem[{index}]' if self.indirect else f'r{index}'
+
+    def wrap(self, indent: int):
+        if not self.wrapped:
+            self.emit(indent, f'a &= {self.mask}')
+            self.wrapped = True
+
+    def writeback(self, indent: int):
+        self.emit(indent, 'mem[0] = a' if self.wrapped else f'mem[0] = a & {self.mask}')
+        if not self.indirect:
+            for i in self.used:
+                self.emit(indent, f'mem[{i}] = r{i}')
+
+    def fault(self, indent: int, pc: int, steps: int, kind: str):
+        self.writeback(indent)
+        self.emit(indent, f'return {pc}, steps + {steps}, {kind!r}')
+
+    def compile(self) -> str:
+        self.emit(0, 'def run(mem, pc, steps, limit):')
+        self.emit(1, 'a = mem[0]')
+        if not self.indirect:
+            for i in self.used:
+                self.emit(1, f'r{i} = mem[{i}]')
+        self.emit(1, 'while True:')
+        self.dispatch(2, self.leaders)
+        self.writeback(1)
+        self.emit(1, 'return pc, steps, None')
+        return '\n'.join(self.lines) + '\n'
+
+    # Binaerer Entscheidungsbaum ueber die Blockanfaenge
+    def dispatch(self, indent: int, leaders: list[int]):
+        if not leaders:
+            self.emit(indent, 'break')
+            return
+        if len(leaders) > 4:
+            middle = len(leaders) // 2
+            self.emit(indent, f'if pc < {leaders[middle]}:')
+            self.dispatch(indent + 1, leaders[:middle])
+            self.emit(indent, 'else:')
+            self.dispatch(indent + 1, leaders[middle:])
+            return
+        for i, leader in enumerate(leaders):
+            self.emit(indent, f'{"if" if i == 0 else "elif"} pc == {leader}:')
+            self.block(indent + 1, leader)
+        # Alle anderen Werte liegen ausserhalb des Programms
+        self.emit(indent, 'else:')
+        self.emit(indent + 1, 'break')
+
+    def block(self, indent: int, leader: int):
+        instructions = []
+        pc = leader
+        while True:
+            instruction = self.program[pc - 1]
+            instructions.append(instruction)
+            pc += 1
+            if instruction.operator in COMPARATORS or instruction.operator in (Operator.GOTO, Operator.END):
+                break
+            if pc > self.size or pc in self.leader_set:
+                break
+        end = leader + len(instructions) - 1
+        last = instructions[-1].operator
+        # Ein IF mit folgendem GOTO wird direkt als bedingter Sprung uebersetzt
+        guarded_goto = last in COMPARATORS and end < self.size and self.program[end].operator == Operator.GOTO
+        count = len(instructions) - (1 if last == Operator.END else 0) + (1 if guarded_goto else 0)
+        if count > 0:
+            self.emit(indent, f'if steps + {count} > limit:')
+            self.emit(indent + 1, 'break')
+        self.wrapped = True
+        for k, instruction in enumerate(instructions):
+            if not self.instruction(indent, leader + k, k, instruction):
+                # Statisch ungueltiger Befehl, der Rest des Blocks ist unerreichbar
+                return
+        # Am Blockende ist der Akkumulator immer reduziert
+        self.wrap(indent)
+        done = len(instructions)
+        if last == Operator.END:
+            self.emit(indent, f'pc = {end}')
+            if done > 1:
+                self.emit(indent, f'steps += {done - 1}')
+            self.emit(indent, 'break')
+        elif last == Operator.GOTO:
+            self.emit(indent, f'steps += {done}')
+            self.emit(indent, f'pc = {instructions[-1].operand}')
+            self.emit(indent, 'continue')
+        elif last in COMPARATORS:
+            self.emit(indent, f'if a {COMPARATORS[last]} {instructions[-1].operand}:')
+            if guarded_goto:
+                self.emit(indent + 1, f'steps += {done + 1}')
+                self.emit(indent + 1, f'pc = {self.program[end].operand}')
+            else:
+                self.emit(indent + 1, f'steps += {done}')
+                self.emit(indent + 1, f'pc = {end + 1}')
+            self.emit(indent, 'else:')
+            self.emit(indent + 1, f'steps += {done}')
+            self.emit(indent + 1, f'pc = {end + 2}')
+            self.emit(indent, 'continue')
+        else:
+            self.emit(indent, f'steps += {done}')
+            self.emit(indent, f'pc = {end + 1}')
+            self.emit(indent, 'continue')
+
+    # Uebersetzt einen Befehl, liefert False, wenn er immer einen Fehler ausloest
+    def instruction(self, indent: int, pc: int, k: int, instruction: Instruction) -> bool:
+        operator = instruction.operator
+        operand = instruction.operand
+        mask = self.mask
+        if operator in (Operator.NONE, Operator.END, Operator.GOTO) or operator in COMPARATORS:
+            return True
+        if operator in DIRECT or operator in INDIRECT:
+            if operand >= self.register_count:
+                self.fault(indent, pc, k, FAULT_INDEX)
+                return False
+        match operator:
+            case Operator.CLOAD:
+                self.emit(indent, f'a = {operand}')
+                self.wrapped = True
+            case Operator.LOAD:
+                if operand != 0:
+                    self.emit(indent, f'a = {self.register(operand)}')
+                    self.wrapped = True
+            case Operator.STORE:
+                if operand != 0:
+                    self.wrap(indent)
+                    self.emit(indent, f'{self.register(operand)} = a')
+            case Operator.CADD | Operator.CSUB:
+                self.emit(indent, f'a {"+" if operator == Operator.CADD else "-"}= {operand}')
+                self.wrapped = False
+            case Operator.ADD | Operator.SUB:
+                self.emit(indent, f'a {"+" if operator == Operator.ADD else "-"}= {self.register(operand)}')
+                self.wrapped = False
+            case Operator.CMULT | Operator.MULT:
+                # Produkte werden sofort reduziert, damit die Zahlen nicht wachsen
+                factor = operand if operator == Operator.CMULT else self.register(operand)
+                self.emit(indent, f'a = a * {factor} & {mask}')
+                self.wrapped = True
+            case Operator.CDIV:
+                if operand == 0:
+                    self.fault(indent, pc, k, FAULT_ZERO)
+                    return False
+                self.wrap(indent)
+                self.emit(indent, f'a //= {operand}')
+            case Operator.DIV:
+                self.wrap(indent)
+                self.emit(indent, f'd = {self.register(operand)}')
+                self.emit(indent, 'if d == 0:')
+                self.fault(indent + 1, pc, k, FAULT_ZERO)
+                self.emit(indent, 'a //= d')
+            case _:
+                # Indirekte Adressierung, der Akkumulator muss dafuer in mem stehen
+                self.wrap(indent)
+                self.emit(indent, 'mem[0] = a')
+                self.emit(indent, f'x = {self.register(operand)}')
+                self.emit(indent, f'if x >= {self.register_count}:')
+                self.fault(indent + 1, pc, k, FAULT_INDEX)
+                match operator:
+                    case Operator.INDLOAD:
+                        self.emit(indent, 'a = mem[x]')
+                    case Operator.INDSTORE:
+                        self.emit(indent, 'mem[x] = a')
+                    case Operator.INDADD:
+                        self.emit(indent, 'a += mem[x]')
+                        self.wrapped = False
+                    case Operator.INDSUB:
+                        self.emit(indent, 'a -= mem[x]')
+                        self.wrapped = False
+                    case Operator.INDMULT:
+                        self.emit(indent, f'a = a * mem[x] & {mask}')
+                    case Operator.INDDIV:
+                        self.emit(indent, 'd = mem[x]')
+                        self.emit(indent, 'if d == 0:')
+                        self.fault(indent + 1, pc, k, FAULT_ZERO)
+                        self.emit(indent, 'a //= d')
+        return True
+
+def summary(program: Program) -> tuple[str, frozenset[Operator]]:
+    result = SUMMARIES.get(program)
+    if result is None:
+        result = (program.fingerprint(), frozenset(e.operator for e in program.instructions))
+        SUMMARIES[program] = result
+    return result
+
+def supports(machine: Machine, program: Program) -> bool:
+    """Nur Programme aus eingebauten Befehlen ohne zusaetzliche Durchlaeufe koennen uebersetzt werden."""
+    if machine.code_passes:
+        return False
+    for operator in summary(program)[1]:
+        function = machine.instruction_set.get(operator)
+        if function is None or function is not machine.native_instructions.get(operator):
+            return False
+    return True
+
+def compile_program(machine: Machine, program: Program) -> JitProgram | None:
+    """Liefert das uebersetzte Programm aus dem Cache oder uebersetzt es neu.
+    Enthaelt das Programm selbst registrierte Befehle, wird None geliefert."""
+    if not supports(machine, program):
+        return None
+    key = (summary(program)[0], len(machine.memory), machine.register_limit)
+    compiled = CACHE.get(key)
+    if compiled is None:
+        compiler = BlockCompiler(program.masked(machine.mask), len(machine.memory), machine.register_limit)
+        source = compiler.compile()
+        namespace: dict = {}
+        exec(compile(source, f'<jit {key[0][:12]}>', 'exec'), namespace)
+        compiled = JitProgram(namespace['run'], compiler.leader_set, source)
+        CACHE[key] = compiled
+        if len(CACHE) > CACHE_SIZE:
+            CACHE.popitem(last=False)
+    else:
+        CACHE.move_to_end(key)
+    return compiled
+
+def run(machine: Machine, compiled: JitProgram, limit: int) -> None:
+    """Fuehrt das uebersetzte Programm auf der Maschine aus.
+
+    Steht der Befehlszaehler nicht am Anfang eines Grundblocks, wird zuerst mit dem
+    Interpreter bis zum naechsten Block gelaufen. Reicht das Schrittlimit nicht fuer einen
+    ganzen Block, kehrt die Funktion vorher zurueck und der Rest bleibt dem Interpreter ueberlassen."""
+    code = machine.compile()
+    while machine.program_counter not in compiled.leaders and machine.steps < limit and not machine.is_halted():
+        execute(machine, code, machine.steps + 1)
+    if machine.program_counter not in compiled.leaders:
+        return
+    memory = machine.memory
+    # Auf einer Liste sind die Registerzugriffe des uebersetzten Codes deutlich schneller als auf dem
+    # typisierten array, die Werte sind beim Zurueckschreiben bereits auf die Wortbreite reduziert
+    mem = memory.tolist() if isinstance(memory, DenseMemory) else memory
+    try:
+        pc, steps, fault = compiled.function(mem, machine.program_counter, machine.steps, limit)
+    finally:
+        if mem is not memory:
+            memory[:] = array(memory.typecode, mem)
+    machine.program_counter = pc
+    machine.steps = steps
+    if fault == FAULT_INDEX:
+        raise IndexError(pc)
+    if fault == FAULT_ZERO:
+        raise ZeroDivisionError('integer division or modulo by zero')
@@ -0,0 +1,242 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+from math import gcd
+from typing import Callable
+
+from bytecode import Code, OP_CALL
+from constants import *
+from machine import Machine
+from program import *
+
+# Obergrenze fuer die schrittweise Berechnung der Iterationszahl, wenn es keine geschlossene Form gibt
+ITERATION_LIMIT = 1 << 16
+
+COMPARISONS: dict[Operator, Callable[[int, int], bool]] = {
+    Operator.IF_EQ: lambda a, c: a == c,
+    Operator.IF_NE: lambda a, c: a != c,
+    Operator.IF_LT: lambda a, c: a < c,
+    Operator.IF_LE: lambda a, c: a <= c,
+    Operator.IF_GT: lambda a, c: a > c,
+    Operator.IF_GE: lambda a, c: a >= c,
+}
+
+class Affine:
+    """Wert k * x + b (modulo modulus), wobei x der Wert von Register var zu Beginn der
+    Iteration ist. Ohne var ist der Wert konstant."""
+
+    def __init__(self, var: int | None, k: int, b: int, modulus: int):
+        self.var = var if k % modulus != 0 else None
+        self.k = k % modulus if self.var is not None else 0
+        self.b = b % modulus
+        self.modulus = modulus
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Affine) and (self.var, self.k, self.b) == (other.var, other.k, other.b)
+
+    def __call__(self, x: int) -> int:
+        return (self.k * x + self.b) % self.modulus
+
+    def shift(self, amount: int) -> Affine:
+        return Affine(self.var, self.k, self.b + amount, self.modulus)
+
+    def scale(self, factor: int) -> Affine:
+        return Affine(self.var, self.k * factor, self.b * factor, self.modulus)
+
+    def combine(self, other: Affine, sign: int) -> Affine | None:
+        if self.var is not None and other.var is not None and self.var != other.var:
+            return None
+        var = self.var if self.var is not None else other.var
+        return Affine(var, self.k + sign * other.k, self.b + sign * other.b, self.modulus)
+
+    def multiply(self, other: Affine) -> Affine | None:
+        if other.var is None:
+            return self.scale(other.b)
+        if self.var is None:
+            return other.scale(self.b)
+        return None
+
+class CountingLoop:
+    """Eine Schleife der Form
+
+        h:     Rumpf ohne Spruenge (affine Arithmetik)
+        g-1:   if <vergleich> c
+        g:     goto h
+
+    deren Zustand nur von einem Register x abhaengt. Jede Iteration bildet x affin ab,
+    daher laesst sich die Zahl der Iterationen ohne Ausfuehrung des Rumpfs berechnen."""
+
+    def __init__(self, header: int, goto_line: int, var: int | None, update: Affine | None,
+                 condition: Affine, comparison: Operator, constant: int, results: dict[int, Affine]):
+        self.header = header
+        self.goto_line = goto_line
+        self.var = var
+        self.update = update
+        self.condition = condition
+        self.comparison = comparison
+        self.constant = constant
+        self.results = results
+        self.body_length = goto_line - 1 - header
+        # Ergebnis von iterations() fuer den Wert von x beim naechsten Besuch des Schleifenanfangs,
+        # nachdem die Schleife nicht beschleunigt werden konnte und eine Iteration einzeln laeuft
+        self.cached: tuple[int, tuple[int, int] | None] | None = None
+
+    def iterations(self, x: int) -> tuple[int, int] | None:
+        """Liefert (n, x_n): nach n vollstaendigen Iterationen bricht die (n+1). Iteration ab,
+        x_n ist dann der Wert von x zu Beginn dieser letzten Iteration. None bei Endlosschleife."""
+        modulus = self.condition.modulus
+        compare = COMPARISONS[self.comparison]
+        update = self.update
+        if update is not None and update.var == self.var and update.k == 1 and self.comparison in (Operator.IF_EQ, Operator.IF_NE):
+            # Geschlossene Form: x_n = x + n*d, Bedingungswert y_n = k_c*x + b_c + n*k_c*d
+            step = self.condition.k * update.b % modulus
+            start = self.condition(x)
+            if self.comparison == Operator.IF_EQ:
+                if start != self.constant:
+                    return 0, x
+                return (1, update(x)) if step != 0 else None
+            # Gesucht ist das kleinste n mit step * n = constant - start (mod modulus)
+            difference = (self.constant - start) % modulus
+            divisor = gcd(step, modulus)
+            if difference % divisor != 0:
+                return None
+            reduced = modulus // divisor
+            n = difference // divisor * pow(step // divisor, -1, reduced) % reduced if reduced > 1 else 0
+            return n, (x + n * update.b) % modulus
+        for n in range(min(modulus, ITERATION_LIMIT) + 1):
+            if not compare(self.condition(x), self.constant):
+                return n, x
+            if update is None:
+                # x bleibt gleich, die Bedingung also auch
+                return None
+            x = update(x)
+        return None
+
+    def accelerate(self, m: Machine) -> bool:
+        x = m.memory[self.var] if self.var is not None else 0
+        cached = self.cached
+        result = cached[1] if cached is not None and cached[0] == x else self.iterations(x)
+        self.cached = None
+        if result is None:
+            # Ab dem naechsten Wert von x endet die Schleife ebenfalls nicht (oder nicht innerhalb
+            # von ITERATION_LIMIT), ohne Merker wuerde jede Iteration erneut simuliert
+            self.cached = (self.update(x) if self.update is not None else x, None)
+            return False
+        n, last = result
+        steps = n * (self.body_length + 2) + self.body_length + 1
+        if m.steps + steps > m.step_limit:
+            if n > 0:
+                self.cached = (self.update(x), (n - 1, last))
+            return False
+        for register, value in self.results.items():
+            m.memory[register] = value(last)
+        # Die Schleife des Interpreters zaehlt selbst noch einen Schritt und erhoeht den Befehlszaehler
+        m.steps += steps - 1
+        m.set_programcounter(self.goto_line)
+        return True
+
+def analyze_loop(program: Program, header: int, goto_line: int, register_count: int, modulus: int) -> CountingLoop | None:
+    """Prueft, ob die Zeilen header bis goto_line eine beschleunigbare Zaehlschleife bilden."""
+    condition_instruction = program[goto_line - 2]
+    if condition_instruction.operator not in COMPARISONS:
+        return None
+    values = [Affine(r, 1, 0, modulus) for r in range(register_count)]
+    for line in range(header, goto_line - 1):
+        instruction = program[line - 1]
+        operator = instruction.operator
+        operand = instruction.operand
+        if operator in (Operator.LOAD, Operator.STORE, Operator.ADD, Operator.SUB, Operator.MULT) and operand >= register_count:
+            return None
+        a = values[0]
+        match operator:
+            case Operator.NONE:
+                continue
+            case Operator.CLOAD:
+                a = Affine(None, 0, operand, modulus)
+            case Operator.CADD:
+                a = a.shift(operand)
+            case Operator.CSUB:
+                a = a.shift(-operand)
+            case Operator.CMULT:
+                a = a.scale(operand)
+            case Operator.LOAD:
+                a = values[operand]
+            case Operator.STORE:
+                values[operand] = a
+            case Operator.ADD:
+                a = a.combine(values[operand], 1)
+            case Operator.SUB:
+                a = a.combine(values[operand], -1)
+            case Operator.MULT:
+                a = a.multiply(values[operand])
+            case _:
+                # Division, indirekte Adressierung und Spruenge sind nicht affin bzw. nicht geradlinig
+                return None
+        if a is None:
+            return None
+        values[0] = a
+    condition = values[0]
+    results = {r: value for r, value in enumerate(values) if value != Affine(r, 1, 0, modulus)}
+    variables = {value.var for value in results.values()} | {condition.var}
+    variables.discard(None)
+    if len(variables) > 1:
+        return None
+    var = variables.pop() if variables else None
+    update = results.get(var) if var is not None else None
+    if var is not None and update is None:
+        # x wird in der Schleife nicht veraendert
+        update = None
+    return CountingLoop(header, goto_line, var, update, condition, condition_instruction.operator,
+                        condition_instruction.operand, results)
+
+def find_counting_loops(program: Program, register_count: int = Constants.REGISTER_COUNT,
+                        modulus: int = Constants.REGISTER_LIMIT) -> list[CountingLoop]:
+    """Sucht alle Schleifen aus Rumpf, IF und Rueckwaertssprung auf den Rumpfanfang."""
+    loops = []
+    for goto_line in range(2, program.size() + 1):
+        instruction = program[goto_line - 1]
+        header = instruction.operand
+        if instruction.operator != Operator.GOTO or not 1 <= header < goto_line:
+            continue
+        body = [program[line - 1].operator for line in range(header, goto_line - 1)]
+        if any(operator in COMPARISONS or operator in (Operator.GOTO, Operator.END) for operator in body):
+            continue
+        loop = analyze_loop(program, header, goto_line, register_count, modulus)
+        if loop is not None:
+            loops.append(loop)
+    return loops
+
+def loop_acceleration_pass(machine: Machine, code: Code):
+    """Ersetzt den Anfang jeder erkannten Zaehlschleife durch einen Aufruf, der die Schleife
+    in einem Schritt ausfuehrt. Laesst sie sich nicht beschleunigen (Endlosschleife oder zu
+    wenig verbleibende Schritte), wird der urspruengliche Befehl ausgefuehrt."""
+    for loop in find_counting_loops(code.program.masked(machine.mask), len(machine.memory), machine.register_limit):
+        header = loop.header
+        if code.ops[header] == OP_CALL:
+            fallback = code.handlers[header]
+        else:
+            fallback = machine.instruction_set[code.program[header - 1].operator]
+        code.ops[header] = OP_CALL
+        code.handlers[header] = accelerated(loop, fallback)
+
+def accelerated(loop: CountingLoop, fallback: Callable[[Machine, int], Machine]) -> Callable[[Machine, int], Machine]:
+    def handler(m: Machine, i: int) -> Machine:
+        if not loop.accelerate(m):
+            fallback(m, i)
+        return m
+    return handler
@@ -0,0 +1,63 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+
+from bytecode import Code, OP_CALL, OP_GOTO
+from machine import InfiniteLoopError, Machine
+from memory import contents
+
+class LoopDetector:
+    """Erkennt Endlosschleifen mit dem Zyklusfinder von Brent.
+
+    Der Zustand der Maschine besteht nur aus Befehlszaehler und Speicher, ist also endlich und
+    bestimmt den weiteren Ablauf vollstaendig. Jeder Zyklus im Programm fuehrt ueber einen
+    Rueckwaertssprung, deshalb wird der Zustand nur dort betrachtet. Gespeichert wird immer nur
+    ein Vergleichszustand, der bei jeder Zweierpotenz von Besuchen ersetzt wird."""
+
+    def __init__(self):
+        self.saved: tuple | None = None
+        self.saved_steps = 0
+        self.power = 1
+        self.length = 0
+
+    def visit(self, pc: int, memory, steps: int):
+        state = (pc, contents(memory))
+        if state == self.saved:
+            raise InfiniteLoopError(pc, steps - self.saved_steps)
+        self.length += 1
+        if self.length == self.power:
+            self.saved = state
+            self.saved_steps = steps
+            self.power *= 2
+            self.length = 0
+
+    # Ersetzt einen Rueckwaertssprung, prueft den Zustand am Sprungziel und springt dann
+    def goto(self, m: Machine, i: int) -> Machine:
+        self.visit(i, m.memory, m.steps)
+        m.set_programcounter(i-1)
+        return m
+
+def loop_detection_pass(machine: Machine, code: Code):
+    """Leitet alle Rueckwaertssprunge des Codes ueber einen neuen LoopDetector."""
+    detector = LoopDetector()
+    for pc in range(code.size + 1):
+        # Index 0 ist die Kopie der letzten Zeile
+        line = pc or code.size
+        if code.ops[pc] == OP_GOTO and code.args[pc] <= line:
+            code.ops[pc] = OP_CALL
+            code.handlers[pc] = detector.goto
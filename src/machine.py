@@ -16,29 +16,122 @@
 
 
 from __future__ import annotations
+import asyncio
+import copy
 from decimal import DivisionByZero
+from typing import NamedTuple
 from program import *
 from constants import *
-from typing import Callable
-from data_manager import DataManager
-        
+from typing import Callable, TYPE_CHECKING
+from bytecode import Code, decode, execute, UNLIMITED
+from memory import allocate, contents, copy_memory, restore_contents, Memory
+import jit
+
+if TYPE_CHECKING:
+    # Nur fuer Typannotationen, damit die Maschine ohne Tk importiert werden kann
+    from data_manager import DataManager
+    from time_travel import TimeTravel
+    from profiler import Profiler
+    from hooks import Event, Hooks
+    from breakpoints import Breakpoints
+    from mapped_state import MappedState
+
+# Schritte, nach denen run_async() die Kontrolle an die Ereignisschleife abgibt
+ASYNC_SLICE = 10_000
+
 class MachineRuntimeError(Exception):
     pass
 
+# Zustand einer Maschine, wie ihn snapshot() liefert und restore() wiederherstellt
+class MachineSnapshot(NamedTuple):
+    program: Program
+    program_counter: int
+    steps: int
+    memory: bytes | frozenset
+
+# Wird von der Endlosschleifenerkennung (siehe detect_loops) ausgeloest
+class InfiniteLoopError(MachineRuntimeError):
+    def __init__(self, entry_line: int, cycle_length: int):
+        super().__init__(f'Infinite loop detected: the machine returns to the same state at line {entry_line} every {cycle_length} steps')
+        self.entry_line = entry_line
+        self.cycle_length = cycle_length
+
+# Bricht run() ab, wenn ein Haltepunkt oder eine Ueberwachung ausloest (siehe add_breakpoint),
+# Befehlszaehler und Schrittzahl sind die, bei denen die Maschine anhaelt
+class BreakpointHit(Exception):
+    def __init__(self, message: str, program_counter: int, steps: int):
+        super().__init__(message)
+        self.program_counter = program_counter
+        self.steps = steps
+
 class Machine:
-    def __init__(self, data_manager: DataManager):
+    # register_count und word_size legen die Speichergeometrie fest, sparse=True speichert nur
+    # belegte Register (fuer sehr grosse Adressraeume, siehe memory.SparseMemory)
+    def __init__(self, data_manager: DataManager | None = None, register_count: int = Constants.REGISTER_COUNT,
+                 word_size: int = Constants.WORD_SIZE, sparse: bool = False):
         # Befehlssatz besteht aus einem Dictionary, welches Operatoren auf Funktionen abbildet,
         # die eine Maschine und einen ganzzahligen Operanden entgegennehmen und eine Maschine zurueckgeben
         self.instruction_set: dict[Operator, Callable[[Machine, int], Machine]] = {}
         self.instruction_set[Operator.NONE] = lambda m, i: m
         self.instruction_set[Operator.END] = self.end
+        # Eingebaute Befehle, die der Bytecode-Interpreter direkt ausfuehren darf
+        self.native_instructions: dict[Operator, Callable[[Machine, int], Machine]] = dict(self.instruction_set)
         self.program = Program()
+        # Zuletzt dekodiertes Programm, wird bei Aenderung von Programm oder Befehlssatz neu erzeugt
+        self.code: Code | None = None
+        # Programme vor der Ausfuehrung in Python-Funktionen uebersetzen (siehe use_jit)
+        self.jit = False
+        # Durchlaeufe, die nach dem Dekodieren einzelne Befehle ersetzen, z.B. die Endlosschleifenerkennung
+        self.code_passes: list[Callable[[Machine, Code], None]] = []
+        # Optionale Aufzeichnung fuer Schritte zurueck (siehe record_trace)
+        self.trace: TimeTravel | None = None
+        # Optionaler Profiler, zaehlt Ausfuehrungen je Zeile (siehe profile)
+        self.profiler: Profiler | None = None
+        # Optionale Beobachter fuer Schritte, Schreibzugriffe, Spruenge, Ende und Fehler (siehe add_hook)
+        self.hooks: Hooks | None = None
+        # Optionale Haltepunkte und Ueberwachungen (siehe add_breakpoint) und der Grund des letzten Anhaltens
+        self.breakpoints: Breakpoints | None = None
+        self.stopped: BreakpointHit | None = None
 
+        # Zustand der Maschine als reine Python-Werte, damit keine Tk-Variablen pro Befehl angefasst werden
+        self.program_counter = 1
+        self.register_count = register_count
+        self.word_size = word_size
+        self.sparse = sparse
+        self.memory: Memory = allocate(register_count, word_size, sparse)
+        # Werte und Operanden werden durch Maskieren auf die Wortbreite reduziert
+        self.register_limit = 1 << word_size
+        self.mask = self.register_limit - 1
+        # Optionale Zustandsdatei, in der die Register liegen (siehe map_state)
+        self.mapped_state: MappedState | None = None
+        # Anzahl der bisher ausgefuehrten Befehle
+        self.steps = 0
+        # Schrittgrenze des laufenden run(), damit eigene Befehle sie beachten koennen
+        self.step_limit = UNLIMITED
+
+        # Optionaler Beobachter (z.B. fuer die GUI), wird nur gesammelt per sync() aktualisiert
+        self.data_manager: DataManager | None = None
+        if data_manager is not None:
+            self.attach(data_manager)
+
+    # Haengt einen DataManager als Beobachter an und uebertraegt sofort den aktuellen Zustand
+    def attach(self, data_manager: DataManager) -> Machine:
         self.data_manager = data_manager
-        self.data_manager.program_counter.set(1)
-        self.memory = [0] * Constants.REGISTER_COUNT
-        for i in range(Constants.REGISTER_COUNT):
-            self.data_manager.registers[i].set('0')
+        return self.sync()
+
+    def detach(self) -> Machine:
+        self.data_manager = None
+        return self
+
+    # Uebertraegt Befehlszaehler und Register gesammelt an den Beobachter
+    def sync(self) -> Machine:
+        if self.data_manager is not None:
+            self.data_manager.sync(self.program_counter, self.memory)
+        if self.mapped_state is not None:
+            self.mapped_state.store(self.program_counter, self.steps)
+        if self.hooks is not None:
+            self.hooks.flush()
+        return self
 
     @staticmethod # Statisch, damit die Signatur passt
     def end(m: Machine, _: int) -> Machine:
@@ -46,23 +139,22 @@ class Machine:
         return m
     
     def set_programcounter(self, value: int) -> Machine:
-        self.data_manager.program_counter.set(value)
+        self.program_counter = value
         return self
     
     def change_programcounter(self, amount: int) -> Machine:
-        self.data_manager.program_counter.set(self.data_manager.program_counter.get() + amount)
+        self.program_counter += amount
         return self
     
     def get_programcounter(self) -> int:
-        return self.data_manager.program_counter.get()
+        return self.program_counter
     
     # Indexoperator fuer Register
-    # Macht die Instruktionen s.u. "cleaner" und hat eine Indexpreufung und Wertebereichsbeschraenkung auf 0-Constants.REGISTER_LIMIT-1 (0-255)
+    # Macht die Instruktionen s.u. "cleaner" und hat eine Indexpreufung und Wertebereichsbeschraenkung auf 0-register_limit-1 (z.B. 0-255)
     def __setitem__(self, index: int, value: int) -> Machine:
         if index < 0 or index >= len(self.memory):
             raise MachineRuntimeError(f'Invalid register index {index}. Must be between 0 and {len(self.memory)-1}')
-        self.memory[index] = value % Constants.REGISTER_LIMIT
-        self.data_manager.registers[index].set(str(self.memory[index]))
+        self.memory[index] = value & self.mask
         return self
 
     def __getitem__(self, index: int) -> int:
@@ -74,36 +166,358 @@ class Machine:
         return f'Program: {self.program}\nBefehlszähler: {self.get_programcounter()}\nSpeicher: {self.memory}\n'
     
     def clear_memory(self) -> Machine:
-        self.memory = [0] * Constants.REGISTER_COUNT
-        for i in range(Constants.REGISTER_COUNT):
-            self.data_manager.registers[i].set('0')
-        return self
+        if self.mapped_state is not None:
+            # Die Register bleiben in der Datei
+            self.mapped_state.clear()
+        else:
+            self.memory = allocate(self.register_count, self.word_size, self.sparse)
+        return self.sync()
+
+    # Befehlszaehler, Schrittzaehler und Register zuruecksetzen
+    def reset(self) -> Machine:
+        self.program_counter = 1
+        self.steps = 0
+        # Neu dekodieren, damit auch der Zustand der Durchlaeufe zurueckgesetzt wird
+        self.code = None
+        if self.trace is not None:
+            self.trace.clear()
+        if self.profiler is not None:
+            self.profiler.reset()
+        if self.breakpoints is not None:
+            self.breakpoints.resumed = None
+        self.stopped = None
+        return self.clear_memory()
+
+    # Sichert Programm, Befehlszaehler, Schrittzahl und Register, das dekodierte Programm wird nicht kopiert
+    def snapshot(self) -> MachineSnapshot:
+        return MachineSnapshot(self.program, self.program_counter, self.steps, contents(self.memory))
+
+    # Stellt einen mit snapshot() gesicherten Zustand derselben Speichergeometrie wieder her
+    def restore(self, snapshot: MachineSnapshot) -> Machine:
+        self.program = snapshot.program
+        self.program_counter = snapshot.program_counter
+        self.steps = snapshot.steps
+        restore_contents(self.memory, snapshot.memory)
+        if self.trace is not None:
+            # Die Aufzeichnung passt nicht mehr zum neuen Verlauf
+            self.trace.clear()
+        if self.code_passes:
+            # Auch der Zustand der Durchlaeufe (z.B. der Endlosschleifenerkennung) gehoert zum alten Verlauf
+            self.code = None
+        if self.breakpoints is not None:
+            self.breakpoints.resumed = None
+        self.stopped = None
+        return self.sync()
+
+    # Neue Maschine mit demselben Zustand fuer "Was waere wenn"-Ausfuehrungen. Befehlssatz, Programm und
+    # (ohne Durchlaeufe) das dekodierte Programm werden geteilt, kopiert werden nur die Register.
+    # Beobachter, Zustandsdatei, Aufzeichnung und Profiler gehoeren weiter nur dieser Maschine.
+    def fork(self) -> Machine:
+        clone = copy.copy(self)
+        clone.memory = copy_memory(self.memory)
+        # Eigene Tabellen, damit mit instruction() registrierte Befehle nur in einer Maschine landen
+        clone.instruction_set = dict(self.instruction_set)
+        clone.native_instructions = dict(self.native_instructions)
+        clone.data_manager = None
+        clone.mapped_state = None
+        clone.trace = None
+        clone.profiler = None
+        clone.hooks = None
+        clone.breakpoints = None
+        clone.stopped = None
+        private = [owner for owner in (self.trace, self.profiler, self.hooks, self.breakpoints) if owner is not None]
+        clone.code_passes = [p for p in self.code_passes if getattr(p, '__self__', None) not in private]
+        if clone.code_passes:
+            # Durchlaeufe haben eigenen Zustand, die Kopie dekodiert bei Bedarf neu
+            clone.code = None
+        return clone
+
+    def is_halted(self) -> bool:
+        pc = self.get_programcounter()
+        return not (pc <= self.program.size() and self.program[pc - 1].operator != Operator.END)
     
+    # Einzelschritt, danach wird der Beobachter aktualisiert
     def step(self) -> Machine:
+        return self.advance().sync()
+
+    # Fuehrt den aktuellen Befehl aus, ohne den Beobachter zu synchronisieren
+    def advance(self) -> Machine:
         if self.get_programcounter() <= self.program.size() and self.program[self.get_programcounter() - 1].operator != Operator.END:
             # Aktuellen Befehl erhalten
             instruction = self.program[self.get_programcounter() - 1]
             # Zugehoeriges Lambda ausfuehren
             try:
-                self.instruction_set[instruction.operator](self, instruction.operand)
+                function = self.instruction_set[instruction.operator]
+                native = function is self.native_instructions.get(instruction.operator)
+                if self.trace is not None:
+                    self.trace.follow(self.program)
+                    function = self.trace.recorded(function, instruction.operator if native else None)
+                if self.hooks is not None:
+                    function = self.hooks.wrap(function, instruction.operator if native else None) or function
+                if self.profiler is not None:
+                    self.profiler.count_step(self, instruction, function)
+                else:
+                    function(self, instruction.operand & self.mask)
             except KeyError:
                 # Tritt auf, wenn ein Befehl nicht definiert ist
-                raise MachineRuntimeError(f'Instruction {instruction.operator} is undefined')
+                raise self.runtime_error(f'Instruction {instruction.operator} is undefined')
             except DivisionByZero:
                 # Kann durch die Divisionsinstruktionen auftreten
-                raise MachineRuntimeError('Division by zero')
+                raise self.runtime_error('Division by zero')
             except Exception as e:
                 # Alle anderen Fehler werden weitergegeben
-                raise MachineRuntimeError(f'An error occured: {e}')
+                raise self.runtime_error(f'An error occured: {e}')
             # Befehlszaehler inkrementieren
             self.change_programcounter(1)
+            self.steps += 1
+        if self.hooks is not None and self.is_halted():
+            self.hooks.end(self.program_counter, self.steps)
         return self
+
+    # Liefert das vorab dekodierte aktuelle Programm, bei Bedarf wird es neu dekodiert
+    def compile(self) -> Code:
+        if (self.code is None or self.code.program is not self.program or self.code.instruction_set != self.instruction_set
+                or self.code.passes != tuple(self.code_passes)):
+            self.code = decode(self, self.program)
+        return self.code
+
+    # Fuehrt das aktuelle Programm mit dem Bytecode-Interpreter aus,
+    # hoechstens max_steps Befehle, falls angegeben
+    def run(self, max_steps: int | None = None) -> Machine:
+        code = self.compile()
+        limit = UNLIMITED if max_steps is None else self.steps + max_steps
+        self.stopped = None
+        try:
+            if self.jit:
+                compiled = jit.compile_program(self, self.program)
+                if compiled is not None:
+                    jit.run(self, compiled, limit)
+            # Interpreter fuer Programme mit eigenen Befehlen und die Restschritte, die nicht fuer einen ganzen Block reichen
+            execute(self, code, limit)
+            if self.hooks is not None and self.is_halted():
+                self.hooks.end(self.program_counter, self.steps)
+        except BreakpointHit as hit:
+            self.program_counter = hit.program_counter
+            self.steps = hit.steps
+            self.stopped = hit
+        except InfiniteLoopError as e:
+            if self.hooks is not None:
+                self.hooks.error(self.program_counter, self.steps, str(e))
+            raise
+        except KeyError:
+            raise self.runtime_error(f'Instruction {self.program[self.get_programcounter() - 1].operator} is undefined')
+        except IndexError:
+            raise self.runtime_error(f'An error occured: {self.invalid_register_message()}')
+        except Exception as e:
+            raise self.runtime_error(f'An error occured: {e}')
+        finally:
+            # Beobachter nur einmal am Ende (auch im Fehlerfall) aktualisieren
+            self.sync()
+        return self
+
+    # Meldet einen Laufzeitfehler an die Beobachter und liefert die auszuloesende Ausnahme
+    def runtime_error(self, message: str) -> MachineRuntimeError:
+        if self.hooks is not None:
+            self.hooks.error(self.program_counter, self.steps, message)
+        return MachineRuntimeError(message)
+
+    # Fehlermeldung fuer einen ungueltigen Registerzugriff des aktuellen Befehls, wie sie __getitem__ erzeugt
+    def invalid_register_message(self) -> str:
+        instruction = self.program[self.get_programcounter() - 1]
+        index = instruction.operand & self.mask
+        if instruction.operator.startswith('ind') and index < len(self.memory):
+            index = self.memory[index]
+        return f'Invalid register index {index}. Must be between 0 and {len(self.memory)-1}'
     
+    # Programme aus eingebauten Befehlen werden blockweise in Python-Funktionen uebersetzt und ausgefuehrt
+    def use_jit(self, enabled: bool = True) -> Machine:
+        self.jit = enabled
+        return self
+
+    # Schaltet einen Durchlauf aus code_passes ein oder aus. Durchlaeufe mit hoeherem Attribut order
+    # (z.B. Aufzeichnung und Profiler) laufen spaeter und umschliessen damit die Ersetzungen der anderen
+    def set_code_pass(self, code_pass: Callable[[Machine, Code], None], enabled: bool = True) -> Machine:
+        if enabled and code_pass not in self.code_passes:
+            self.code_passes.append(code_pass)
+            self.code_passes.sort(key=lambda p: getattr(p, 'order', 0))
+        elif not enabled and code_pass in self.code_passes:
+            self.code_passes.remove(code_pass)
+        return self
+
+    # Zeichnet jeden Schritt kompakt auf, damit step_back() und run_back_to() moeglich sind.
+    # capacity begrenzt die Anzahl der Schritte, die zurueckgegangen werden kann.
+    def record_trace(self, enabled: bool = True, capacity: int | None = None) -> Machine:
+        from time_travel import TimeTravel, DEFAULT_CAPACITY
+        if self.trace is not None:
+            self.set_code_pass(self.trace.code_pass, False)
+            self.trace = None
+        if enabled:
+            self.trace = TimeTravel(capacity or DEFAULT_CAPACITY)
+            self.set_code_pass(self.trace.code_pass)
+        return self
+
+    # Zaehlt Ausfuehrungen je Zeile und Operator sowie die Ergebnisse der IF-Befehle,
+    # das Ergebnis liefert self.profiler.result()
+    def profile(self, enabled: bool = True) -> Machine:
+        from profiler import Profiler
+        if self.profiler is not None:
+            self.set_code_pass(self.profiler.code_pass, False)
+            self.profiler = None
+        if enabled:
+            self.profiler = Profiler()
+            self.set_code_pass(self.profiler.code_pass)
+        return self
+
+    # Meldet callback fuer Ereignisse der Art kind an ('step', 'write', 'branch', 'end' oder 'error', siehe hooks.py).
+    # Der Beobachter bekommt Listen von Ereignissen, spaetestens bei jedem sync(). Nur fuer die ersten drei
+    # Arten wird der Code umschlossen, ohne sie laufen Interpreter und JIT unveraendert.
+    def add_hook(self, kind: str, callback: Callable[[list[Event]], None]) -> Machine:
+        from hooks import Hooks
+        if self.hooks is None:
+            self.hooks = Hooks()
+        self.hooks.add(kind, callback)
+        # Die umschlossenen Befehle haengen von den angemeldeten Arten ab
+        self.code = None
+        return self.set_code_pass(self.hooks.code_pass, self.hooks.per_step())
+
+    def remove_hook(self, kind: str, callback: Callable[[list[Event]], None]) -> Machine:
+        if self.hooks is None:
+            return self
+        self.hooks.flush()
+        self.hooks.remove(kind, callback)
+        self.code = None
+        self.set_code_pass(self.hooks.code_pass, self.hooks.per_step())
+        if self.hooks.empty():
+            self.hooks = None
+        return self
+
+    # Haelt run() vor der Zeile line an (bei optimierten Programmen die Zeile im Quelltext), mit condition
+    # nur, wenn die Bedingung erfuellt ist, z.B. "R3 > 200". Bedingungen werden einmal uebersetzt und nur
+    # in dieser Zeile geprueft. Der Grund des Anhaltens steht danach in stopped, run() setzt dort fort.
+    def add_breakpoint(self, line: int, condition: str | None = None) -> Machine:
+        from breakpoints import Breakpoint
+        self.debug_points().breakpoints.append(Breakpoint(line, condition, self.register_count))
+        return self.update_breakpoints()
+
+    # Haelt run() nach einem Befehl an, der den Wert von register aendert, optional nur in Zeile line
+    # und nur, wenn condition erfuellt ist. Geprueft wird nur nach Befehlen, die das Register schreiben koennen.
+    def add_watchpoint(self, register: int, condition: str | None = None, line: int | None = None) -> Machine:
+        from breakpoints import Watchpoint
+        self.debug_points().watchpoints.append(Watchpoint(register, condition, line, self.register_count))
+        return self.update_breakpoints()
+
+    # Entfernt alle Haltepunkte der Zeile line
+    def remove_breakpoint(self, line: int) -> Machine:
+        if self.breakpoints is not None:
+            self.breakpoints.breakpoints = [b for b in self.breakpoints.breakpoints if b.line != line]
+        return self.update_breakpoints()
+
+    def clear_breakpoints(self) -> Machine:
+        if self.breakpoints is not None:
+            self.breakpoints.breakpoints = []
+            self.breakpoints.watchpoints = []
+        return self.update_breakpoints()
+
+    def debug_points(self) -> Breakpoints:
+        from breakpoints import Breakpoints
+        if self.breakpoints is None:
+            self.breakpoints = Breakpoints()
+        return self.breakpoints
+
+    def update_breakpoints(self) -> Machine:
+        if self.breakpoints is None:
+            return self
+        # Die geprueften Zeilen haengen von den Haltepunkten ab
+        self.code = None
+        if self.breakpoints.empty():
+            self.set_code_pass(self.breakpoints.code_pass, False)
+            self.breakpoints = None
+            return self
+        return self.set_code_pass(self.breakpoints.code_pass)
+
+    # Macht den letzten aufgezeichneten Schritt rueckgaengig, liefert False, wenn es keinen mehr gibt
+    def step_back(self) -> bool:
+        if self.trace is None:
+            raise MachineRuntimeError('Stepping back requires record_trace()')
+        done = self.trace.undo(self)
+        self.sync()
+        return done
+
+    # Geht zurueck bis zum letzten Zeitpunkt, an dem der Befehlszaehler auf Zeile line stand
+    # (bei optimierten Programmen die Zeile im Quelltext), liefert False, wenn es keinen gibt
+    def run_back_to(self, line: int) -> bool:
+        if self.trace is None:
+            raise MachineRuntimeError('Stepping back requires record_trace()')
+        entry = self.trace.find_line(line, self.program)
+        done = entry is not None and self.trace.rewind_to(self, entry)
+        self.sync()
+        return done
+
+    # Legt die Register in der Datei path ab, die andere Prozesse ohne Kopie mitlesen koennen
+    # (siehe mapped_state). Mit resume=True wird eine vorhandene Datei ab ihrem letzten Checkpoint
+    # fortgesetzt, dafuer muss das Programm bereits gesetzt sein. path=None beendet die Einblendung.
+    def map_state(self, path: str | None, resume: bool = False) -> Machine:
+        from mapped_state import map_machine
+        if self.mapped_state is not None:
+            memory = allocate(self.register_count, self.word_size)
+            restore_contents(memory, contents(self.memory))
+            self.memory = memory
+            self.mapped_state.close()
+            self.mapped_state = None
+        if path is not None:
+            self.mapped_state = map_machine(self, path, resume)
+            self.memory = self.mapped_state.memory
+        return self.sync()
+
+    # Sichert Register, Befehlszaehler und Schrittzahl dauerhaft in der Datei von map_state()
+    def checkpoint(self) -> Machine:
+        if self.mapped_state is None:
+            raise MachineRuntimeError('Checkpoints require map_state()')
+        self.mapped_state.checkpoint(self.program_counter, self.steps, self.program)
+        return self
+
+    # Bricht run() mit InfiniteLoopError ab, sobald sich ein Zustand (Befehlszaehler, Speicher) an einem
+    # Rueckwaertssprung wiederholt. Setzt voraus, dass der Speicher nur vom Programm veraendert wird.
+    def detect_loops(self, enabled: bool = True) -> Machine:
+        from loop_detection import loop_detection_pass
+        return self.set_code_pass(loop_detection_pass, enabled)
+
+    # Einfache Zaehlschleifen werden in geschlossener Form statt Schritt fuer Schritt ausgefuehrt,
+    # Speicher, Befehlszaehler und Schrittzahl sind danach dieselben
+    def accelerate_loops(self, enabled: bool = True) -> Machine:
+        from loop_acceleration import loop_acceleration_pass
+        return self.set_code_pass(loop_acceleration_pass, enabled)
+
+    # Haeufige Befehlsfolgen werden vom Interpreter als Superinstruktionen ausgefuehrt,
+    # Speicher, Befehlszaehler und Schrittzahl sind danach dieselben
+    def fuse_instructions(self, enabled: bool = True) -> Machine:
+        from superinstructions import fusion_pass
+        return self.set_code_pass(fusion_pass, enabled)
+
     def run_program(self, program: Program) -> Machine:
         self.program = program
-        while self.get_programcounter() <= self.program.size() and self.program[self.get_programcounter() - 1].operator != Operator.END:
-            self.step()
+        return self.run()
+
+    # Wie run(), gibt aber nach jeweils slice_steps Schritten die Kontrolle an die Ereignisschleife ab,
+    # damit viele Maschinen in einem Prozess nebeneinander laufen koennen. Wird die Aufgabe abgebrochen,
+    # bleibt die Maschine im (synchronisierten) Zustand nach dem letzten Abschnitt stehen
+    async def run_async(self, max_steps: int | None = None, slice_steps: int = ASYNC_SLICE) -> Machine:
+        limit = None if max_steps is None else self.steps + max_steps
+        while not self.is_halted():
+            steps = slice_steps if limit is None else min(slice_steps, limit - self.steps)
+            if steps <= 0:
+                break
+            before = self.steps
+            self.run(steps)
+            if self.stopped is not None or self.steps == before:
+                # Kein Fortschritt moeglich, z.B. Befehlszaehler vor dem Programmanfang
+                break
+            await asyncio.sleep(0)
         return self
+
+    async def run_program_async(self, program: Program, max_steps: int | None = None, slice_steps: int = ASYNC_SLICE) -> Machine:
+        self.program = program
+        return await self.run_async(max_steps, slice_steps)
     
     def run_file(self, path: str = 'prog.ram') -> Machine:
         return self.run_program(Program.from_file(path))
@@ -114,7 +528,8 @@ class Machine:
     # Decorator, um Befehle zu registrieren
     # Der Name der Python-Funktion wird als Operator interpretiert
     # und die Python-Funktion wird im Befehlssatz abgelegt
-    def instruction(self):
+    # native=True markiert die eingebauten Befehle, die der Bytecode-Interpreter direkt ausfuehrt
+    def instruction(self, native: bool = False):
         def decorator(function: Callable[[Machine, int], Machine]):
             try:
                 operator = Operator.from_string(function.__name__)
@@ -123,38 +538,42 @@ class Machine:
                 return function
             
             self.instruction_set[operator] = function
+            if native:
+                self.native_instructions[operator] = function
+            else:
+                self.native_instructions.pop(operator, None)
             return function
         
         return decorator
     
     # 'Mathematische' Befehle hinzufuegen
     def add_math(self) -> Machine:
-        @self.instruction()
+        @self.instruction(native=True)
         def load(m: Machine, i: int) -> Machine:
             m[0] = m[i]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def store(m: Machine, i: int) -> Machine:
             m[i] = m[0]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def add(m: Machine, i: int) -> Machine:
             m[0] = m[0] + m[i]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def sub(m: Machine, i: int) -> Machine:
             m[0] = m[0] - m[i]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def mult(m: Machine, i: int) -> Machine:
             m[0] = m[0] * m[i]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def div(m: Machine, i: int) -> Machine:
             m[0] = m[0] // m[i]
             return m
@@ -163,27 +582,27 @@ class Machine:
     
     # Konstanten
     def add_constants(self) -> Machine:
-        @self.instruction()
+        @self.instruction(native=True)
         def cload(m: Machine, i: int) -> Machine:
             m[0] = i
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def cadd(m: Machine, i: int) -> Machine:
             m[0] = m[0] + i
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def csub(m: Machine, i: int) -> Machine:
             m[0] = m[0] - i
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def cmult(m: Machine, i: int) -> Machine:
             m[0] = m[0] * i
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def cdiv(m: Machine, i: int) -> Machine:
             m[0] = m[0] // i
             return m
@@ -192,32 +611,32 @@ class Machine:
     
     # Indirekte Adressierung
     def add_indirections(self) -> Machine:
-        @self.instruction()
+        @self.instruction(native=True)
         def indload(m: Machine, i: int) -> Machine:
             m[0] = m[m[i]]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def indstore(m: Machine, i: int) -> Machine:
             m[m[i]] = m[0]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def indadd(m: Machine, i: int) -> Machine:
             m[0] = m[0] + m[m[i]]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def indsub(m: Machine, i: int) -> Machine:
             m[0] = m[0] - m[m[i]]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def indmult(m: Machine, i: int) -> Machine:
             m[0] = m[0] * m[m[i]]
             return m
     
-        @self.instruction()
+        @self.instruction(native=True)
         def inddiv(m: Machine, i: int) -> Machine:
             m[0] = m[0] // m[m[i]]
             return m
@@ -226,42 +645,42 @@ class Machine:
     
     # Sprungbefehle
     def add_jumps(self) -> Machine:
-        @self.instruction()
+        @self.instruction(native=True)
         def goto(m: Machine, i: int) -> Machine:
             m.set_programcounter(i-1)
             return m
         
-        @self.instruction()
+        @self.instruction(native=True)
         def if_eq(m: Machine, i: int) -> Machine:
             if not m[0] == i:
                 m.change_programcounter(1)
             return m
         
-        @self.instruction()
+        @self.instruction(native=True)
         def if_ne(m: Machine, i: int) -> Machine:
             if not m[0] != i:
                 m.change_programcounter(1)
             return m
         
-        @self.instruction()
+        @self.instruction(native=True)
         def if_lt(m: Machine, i: int) -> Machine:
             if not m[0] < i:
                 m.change_programcounter(1)
             return m
         
-        @self.instruction()
+        @self.instruction(native=True)
         def if_le(m: Machine, i: int) -> Machine:
             if not m[0] <= i:
                 m.change_programcounter(1)
             return m
         
-        @self.instruction()
+        @self.instruction(native=True)
         def if_gt(m: Machine, i: int) -> Machine:
             if not m[0] > i:
                 m.change_programcounter(1)
             return m
         
-        @self.instruction()
+        @self.instruction(native=True)
         def if_ge(m: Machine, i: int) -> Machine:
             if not m[0] >= i:
                 m.change_programcounter(1)
@@ -20,7 +20,8 @@ from gui import *
 def main():
     root = tk.Tk()
     datamanager = DataManager(root)
-    machine = Machine(datamanager).add_standard_instructions()
+    # Die Aufzeichnung ermoeglicht Schritte zurueck in der GUI
+    machine = Machine(datamanager).add_standard_instructions().record_trace()
     gui = Gui(root, datamanager, machine)
     gui.root.mainloop()
 
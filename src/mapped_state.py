@@ -0,0 +1,222 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Maschinenzustand in einer Datei, die per mmap eingeblendet wird. Die Register der Maschine
+# liegen direkt in der Datei, ein anderer Prozess kann den laufenden Zustand also ohne Kopie
+# und ohne IPC mitlesen. Aufbau (little endian, alle Bereiche auf 8 Byte ausgerichtet):
+#
+#   Kopf        Magic 'RAMS', Version, Wortbreite, Anzahl der Register,
+#               Befehlszaehler und Schrittzahl (bei jedem Machine.sync aktualisiert)
+#   Register    die laufenden Register der Maschine
+#   Slot 0, 1   Checkpoints: Generation, Befehlszaehler, Schrittzahl, Programm-Hash, Register
+#
+# Ein Checkpoint wird immer in den aelteren Slot geschrieben und erst danach ueber seine
+# Generation gueltig gemacht. Wird der Prozess mitten im Checkpoint beendet, bleibt der
+# andere Slot erhalten.
+#
+#   python3 mapped_state.py run.rams [--watch 1]
+
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import TYPE_CHECKING
+
+from memory import typecode
+
+if TYPE_CHECKING:
+    from machine import Machine
+    from program import Program
+
+MAGIC = b'RAMS'
+VERSION = 1
+HEADER = struct.Struct('<4sHBxQqQ')
+HEADER_SIZE = 64
+SLOT = struct.Struct('<QqQ32s')
+SLOT_HEADER_SIZE = 64
+
+class StateFileError(Exception):
+    pass
+
+def aligned(size: int) -> int:
+    return (size + 7) & ~7
+
+def program_hash(program: Program) -> bytes:
+    return hashlib.sha256(program.fingerprint().encode()).digest()
+
+class MappedState:
+    """Eingeblendete Zustandsdatei. memory ist ein memoryview auf die laufenden Register
+    und kann direkt als Machine.memory verwendet werden."""
+
+    def __init__(self, path: str, writable: bool = True):
+        self.path = path
+        self.writable = writable
+        with open(path, 'r+b' if writable else 'rb') as state_file:
+            try:
+                self.map = mmap.mmap(state_file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+            except ValueError:
+                raise StateFileError('State file is empty')
+        try:
+            if len(self.map) < HEADER_SIZE:
+                raise StateFileError('File is too short for a machine state')
+            magic, version, self.word_size, self.register_count, _, _ = HEADER.unpack_from(self.map)
+            if magic != MAGIC:
+                raise StateFileError('File is no machine state')
+            if version != VERSION:
+                raise StateFileError(f'Unsupported version {version}, expected {VERSION}')
+            self.typecode = typecode(self.word_size)
+            self.registers_size = aligned(self.register_count * array(self.typecode).itemsize)
+            self.slot_size = SLOT_HEADER_SIZE + self.registers_size
+            if len(self.map) != HEADER_SIZE + self.registers_size + 2 * self.slot_size:
+                raise StateFileError('State file is truncated or corrupted')
+        except (StateFileError, ValueError):
+            self.map.close()
+            raise
+        view = memoryview(self.map)
+        self.memory = view[HEADER_SIZE:HEADER_SIZE + self.register_count * array(self.typecode).itemsize].cast(self.typecode)
+        view.release()
+
+    @staticmethod
+    def create(path: str, register_count: int, word_size: int) -> MappedState:
+        """Legt eine neue Zustandsdatei mit leeren Registern an (eine vorhandene wird ersetzt)."""
+        registers_size = aligned(register_count * array(typecode(word_size)).itemsize)
+        size = HEADER_SIZE + registers_size + 2 * (SLOT_HEADER_SIZE + registers_size)
+        with open(path, 'wb') as state_file:
+            state_file.write(HEADER.pack(MAGIC, VERSION, word_size, register_count, 1, 0).ljust(HEADER_SIZE, b'\0'))
+            # Der Rest bleibt ein Loch in der Datei und wird erst beim Schreiben belegt
+            state_file.truncate(size)
+        return MappedState(path)
+
+    def close(self):
+        self.memory.release()
+        self.map.close()
+
+    def slot_offset(self, slot: int) -> int:
+        return HEADER_SIZE + self.registers_size + slot * self.slot_size
+
+    def slot(self, slot: int) -> tuple[int, int, int, bytes]:
+        return SLOT.unpack_from(self.map, self.slot_offset(slot))
+
+    def latest_slot(self) -> int | None:
+        """Slot mit dem juengsten gueltigen Checkpoint."""
+        generations = [self.slot(0)[0], self.slot(1)[0]]
+        if max(generations) == 0:
+            return None
+        return generations.index(max(generations))
+
+    def store(self, program_counter: int, steps: int):
+        """Aktualisiert Befehlszaehler und Schrittzahl im Kopf fuer mitlesende Prozesse."""
+        struct.pack_into('<qQ', self.map, 16, program_counter, steps)
+
+    def clear(self):
+        self.memory[:] = array(self.typecode, bytes(len(self.memory) * self.memory.itemsize))
+
+    def checkpoint(self, program_counter: int, steps: int, program: Program):
+        """Sichert den aktuellen Zustand dauerhaft: die Register werden innerhalb der Datei in
+        den aelteren Slot kopiert, danach wird zweimal mit flush() (msync) auf die Platte geschrieben."""
+        latest = self.latest_slot()
+        generation = self.slot(latest)[0] + 1 if latest is not None else 1
+        target = 1 - latest if latest is not None else 0
+        offset = self.slot_offset(target)
+        start = offset + SLOT_HEADER_SIZE
+        self.map[start:start + self.registers_size] = self.map[HEADER_SIZE:HEADER_SIZE + self.registers_size]
+        SLOT.pack_into(self.map, offset, 0, program_counter, steps, program_hash(program))
+        self.map.flush()
+        struct.pack_into('<Q', self.map, offset, generation)
+        self.map.flush()
+        self.store(program_counter, steps)
+
+    def resume(self, program: Program) -> tuple[int, int] | None:
+        """Kopiert die Register des letzten Checkpoints zurueck in die laufenden Register und
+        liefert (Befehlszaehler, Schrittzahl) oder None, wenn es keinen Checkpoint gibt."""
+        latest = self.latest_slot()
+        if latest is None:
+            return None
+        _, program_counter, steps, digest = self.slot(latest)
+        if digest != program_hash(program):
+            raise StateFileError('The checkpoint belongs to a different program')
+        start = self.slot_offset(latest) + SLOT_HEADER_SIZE
+        self.map[HEADER_SIZE:HEADER_SIZE + self.registers_size] = self.map[start:start + self.registers_size]
+        self.store(program_counter, steps)
+        return program_counter, steps
+
+    def read(self) -> dict:
+        """Laufender Zustand, wie ihn z.B. ein Ueberwachungsprozess sieht."""
+        _, _, _, _, program_counter, steps = HEADER.unpack_from(self.map)
+        latest = self.latest_slot()
+        checkpoint = None
+        if latest is not None:
+            generation, checkpoint_pc, checkpoint_steps, _ = self.slot(latest)
+            checkpoint = {'generation': generation, 'program_counter': checkpoint_pc, 'steps': checkpoint_steps}
+        return {'program_counter': program_counter, 'steps': steps, 'registers': self.memory.tolist(), 'checkpoint': checkpoint}
+
+def map_machine(machine: Machine, path: str, resume: bool = False) -> MappedState:
+    """Blendet die Register einer Maschine in die Datei path ein. Mit resume=True wird eine
+    vorhandene Datei mit gleicher Speichergeometrie ab ihrem letzten Checkpoint fortgesetzt,
+    sonst wird sie neu angelegt und der aktuelle Speicher uebernommen."""
+    if machine.sparse:
+        raise StateFileError('Memory-mapped state requires dense memory')
+    if resume and os.path.exists(path):
+        state = MappedState(path)
+        if (state.register_count, state.word_size) != (machine.register_count, machine.word_size):
+            state.close()
+            raise StateFileError(f'State file has {state.register_count} registers of {state.word_size} bits, '
+                                 f'the machine {machine.register_count} of {machine.word_size} bits')
+        try:
+            position = state.resume(machine.program)
+        except StateFileError:
+            state.close()
+            raise
+        if position is None:
+            state.clear()
+            position = (1, 0)
+        machine.program_counter, machine.steps = position
+    else:
+        state = MappedState.create(path, machine.register_count, machine.word_size)
+        state.memory[:] = array(state.typecode, machine.memory)
+        state.store(machine.program_counter, machine.steps)
+    return state
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Prints the live state of a memory-mapped machine as JSON.')
+    parser.add_argument('path', help='state file written by Machine.map_state')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='print the state again every SECONDS')
+    args = parser.parse_args(argv)
+    try:
+        state = MappedState(args.path, writable=False)
+    except (OSError, StateFileError) as e:
+        print(f'State could not be read: {e}', file=sys.stderr)
+        return 1
+    try:
+        while True:
+            print(json.dumps(state.read()), flush=True)
+            if args.watch is None:
+                return 0
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        state.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
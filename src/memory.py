@@ -0,0 +1,146 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Speicher der Maschine. DenseMemory legt alle Register in einem typisierten array ab
+# (1, 2, 4 oder 8 Byte je Register), SparseMemory speichert nur Register ungleich 0 und
+# eignet sich fuer sehr grosse Adressraeume, von denen nur wenige Register benutzt werden.
+# Beide verhalten sich beim Indizieren wie eine Liste fester Laenge und ueberlassen das
+# Reduzieren der Werte auf die Wortbreite (Maskieren) der Maschine. Ein memoryview mit passendem
+# Format (z.B. auf eine Datei, siehe mapped_state) kann ebenfalls als Speicher dienen.
+
+from __future__ import annotations
+import sys
+from array import array
+from typing import Iterator
+
+from constants import Constants
+
+def typecode(word_size: int) -> str:
+    """Vorzeichenloser array-Typ mit genau word_size Bit."""
+    for code in 'BHILQ':
+        if array(code).itemsize * 8 == word_size:
+            return code
+    raise ValueError(f'Unsupported word size {word_size}, expected one of {", ".join(map(str, Constants.WORD_SIZES))}')
+
+class DenseMemory(array):
+    def __new__(cls, register_count: int, word_size: int):
+        code = typecode(word_size)
+        return super().__new__(cls, code, bytes(register_count * array(code).itemsize))
+
+    def __str__(self) -> str:
+        return str(self.tolist())
+
+class SparseMemory:
+    def __init__(self, register_count: int, word_size: int):
+        typecode(word_size)
+        self.register_count = register_count
+        self.word_size = word_size
+        self.values: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self.register_count
+
+    def __iter__(self) -> Iterator[int]:
+        values = self.values
+        return (values.get(i, 0) for i in range(self.register_count))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.register_count))]
+        if not 0 <= index < self.register_count:
+            raise IndexError('memory index out of range')
+        return self.values.get(index, 0)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            for i, v in zip(range(*index.indices(self.register_count)), value, strict=True):
+                self[i] = v
+            return
+        if not 0 <= index < self.register_count:
+            raise IndexError('memory index out of range')
+        if not 0 <= value < 1 << self.word_size:
+            raise OverflowError(f'value {value} does not fit into {self.word_size} bits')
+        if value:
+            self.values[index] = value
+        else:
+            self.values.pop(index, None)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, SparseMemory):
+            return self.register_count == other.register_count and self.values == other.values
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'SparseMemory({self.register_count}, {self.word_size}, {self.values})'
+
+    def __str__(self) -> str:
+        return str(dict(self.items()))
+
+    # Belegte Register, z.B. fuer die Ausgabe
+    def items(self) -> list[tuple[int, int]]:
+        return sorted(self.values.items())
+
+Memory = DenseMemory | SparseMemory | memoryview
+
+def allocate(register_count: int, word_size: int, sparse: bool = False) -> Memory:
+    if register_count < 1:
+        raise ValueError(f'A machine needs at least one register, got {register_count}')
+    if sparse:
+        return SparseMemory(register_count, word_size)
+    return DenseMemory(register_count, word_size)
+
+def contents(memory: Memory) -> bytes | frozenset:
+    """Hashbarer Abzug des Inhalts, z.B. fuer Endlosschleifenerkennung und Zeitreise."""
+    if isinstance(memory, SparseMemory):
+        return frozenset(memory.values.items())
+    return memory.tobytes()
+
+def restore_contents(memory: Memory, state: bytes | frozenset):
+    """Schreibt einen mit contents() erstellten Abzug zurueck, ohne den Speicher zu ersetzen."""
+    if isinstance(memory, SparseMemory):
+        memory.values = dict(state)
+    elif isinstance(memory, memoryview):
+        memory[:] = memoryview(state).cast(memory.format)
+    else:
+        memory[:] = array(memory.typecode, state)
+
+def changed_registers(memory: Memory, before: bytes | frozenset) -> list[int]:
+    """Register, deren Inhalt sich seit contents(memory) == before geaendert hat."""
+    after = contents(memory)
+    if after == before:
+        return []
+    if isinstance(before, frozenset):
+        return sorted({register for register, _ in before ^ after})
+    size = len(before) // len(memory)
+    return [r for r in range(len(memory)) if before[r * size:(r + 1) * size] != after[r * size:(r + 1) * size]]
+
+def saved_values(memory: Memory, state: bytes | frozenset, registers: list[int]) -> tuple[tuple[int, int], ...]:
+    """Register und ihre Werte im Abzug state, ohne den ganzen Abzug zu entpacken."""
+    if isinstance(state, frozenset):
+        values = dict(state)
+        return tuple((r, values.get(r, 0)) for r in registers)
+    size = len(state) // len(memory)
+    return tuple((r, int.from_bytes(state[r * size:(r + 1) * size], sys.byteorder)) for r in registers)
+
+def copy_memory(memory: Memory) -> Memory:
+    """Unabhaengige Kopie im Prozessspeicher, auch von einem eingeblendeten memoryview."""
+    if isinstance(memory, SparseMemory):
+        result = SparseMemory(memory.register_count, memory.word_size)
+        result.values = dict(memory.values)
+        return result
+    code = memory.format if isinstance(memory, memoryview) else memory.typecode
+    return array.__new__(DenseMemory, code, memory.tobytes())
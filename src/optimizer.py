@@ -0,0 +1,272 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Optimierer fuer RAM-Programme. Entfernt Kommentare/Leerzeilen und unerreichbaren Code,
+# faltet Konstantenketten, entfernt tote Schreibzugriffe und passt die Sprungziele an.
+# Das Ergebnis hat dieselbe Wirkung auf den Speicher, braucht aber weniger Schritte.
+# Ueber Program.line_map bleibt jede Zeile ihrer Ursprungszeile zugeordnet.
+
+from __future__ import annotations
+import random
+
+from constants import *
+from machine import *
+
+CONDITIONS = {Operator.IF_EQ, Operator.IF_NE, Operator.IF_LT, Operator.IF_LE, Operator.IF_GT, Operator.IF_GE}
+DIRECT = {Operator.LOAD, Operator.STORE, Operator.ADD, Operator.SUB, Operator.MULT, Operator.DIV}
+INDIRECT = {Operator.INDLOAD, Operator.INDSTORE, Operator.INDADD, Operator.INDSUB, Operator.INDMULT, Operator.INDDIV}
+CONSTANT_ARITHMETIC = {Operator.CADD, Operator.CSUB, Operator.CMULT, Operator.CDIV}
+
+class OptimizationError(Exception):
+    pass
+
+def successors(program: Program, pc: int) -> list[int]:
+    instruction = program[pc - 1]
+    if instruction.operator == Operator.END:
+        return []
+    if instruction.operator == Operator.GOTO:
+        return [instruction.operand]
+    if instruction.operator in CONDITIONS:
+        return [pc + 1, pc + 2]
+    return [pc + 1]
+
+def reachable_lines(program: Program) -> set[int]:
+    """Alle Zeilen, die von Zeile 1 aus erreicht werden koennen."""
+    seen: set[int] = set()
+    pending = [1]
+    while pending:
+        pc = pending.pop()
+        if pc in seen or not 1 <= pc <= program.size():
+            continue
+        seen.add(pc)
+        pending.extend(successors(program, pc))
+    return seen
+
+def may_fail(instruction: Instruction, register_count: int) -> bool:
+    """Befehle, die je nach Speicherinhalt einen Laufzeitfehler ausloesen koennen."""
+    operator = instruction.operator
+    if operator in INDIRECT or operator == Operator.DIV:
+        return True
+    if operator in DIRECT and instruction.operand >= register_count:
+        return True
+    return operator == Operator.CDIV and instruction.operand == 0
+
+def overwrites_accumulator(instruction: Instruction) -> bool:
+    """Schreibt den Akkumulator, ohne seinen alten Wert zu lesen."""
+    return instruction.operator == Operator.CLOAD or (instruction.operator == Operator.LOAD and instruction.operand != 0)
+
+def reads_register(instruction: Instruction, register: int) -> bool:
+    operator = instruction.operator
+    if operator in INDIRECT:
+        # Indirekte Zugriffe koennen jedes Register betreffen
+        return True
+    return operator in DIRECT and operator != Operator.STORE and instruction.operand == register
+
+def fold(first: Instruction, second: Instruction, limit: int) -> Instruction | None:
+    """Fasst zwei aufeinanderfolgende Konstantenbefehle auf dem Akkumulator zu einem zusammen."""
+    a, b = first.operator, second.operator
+    x, y = first.operand, second.operand
+    if b == Operator.CLOAD and (a == Operator.CLOAD or a in CONSTANT_ARITHMETIC) and not (a == Operator.CDIV and x == 0):
+        return Instruction(Operator.CLOAD, y)
+    if a == Operator.CLOAD:
+        match b:
+            case Operator.CADD:
+                return Instruction(Operator.CLOAD, (x + y) % limit)
+            case Operator.CSUB:
+                return Instruction(Operator.CLOAD, (x - y) % limit)
+            case Operator.CMULT:
+                return Instruction(Operator.CLOAD, (x * y) % limit)
+            case Operator.CDIV if y != 0:
+                return Instruction(Operator.CLOAD, x // y)
+    if a in (Operator.CADD, Operator.CSUB) and b in (Operator.CADD, Operator.CSUB):
+        total = (x if a == Operator.CADD else -x) + (y if b == Operator.CADD else -y)
+        return Instruction(Operator.CADD, total % limit)
+    if a == Operator.CMULT and b == Operator.CMULT:
+        return Instruction(Operator.CMULT, (x * y) % limit)
+    return None
+
+def is_noop(instruction: Instruction) -> bool:
+    operator = instruction.operator
+    return (operator == Operator.NONE or (operator in (Operator.CADD, Operator.CSUB) and instruction.operand == 0)
+            or (operator == Operator.CMULT and instruction.operand == 1))
+
+def optimize_run(run: list[tuple[int, Instruction]], register_count: int, limit: int) -> list[tuple[int, Instruction]]:
+    """Optimiert eine geradlinige Folge ohne Sprungziele in ihrem Inneren."""
+    # Konstantenketten falten
+    folded: list[tuple[int, Instruction]] = []
+    for line, instruction in run:
+        if folded:
+            merged = fold(folded[-1][1], instruction, limit)
+            if merged is not None:
+                folded[-1] = (folded[-1][0], merged)
+                continue
+        folded.append((line, instruction))
+    folded = [(line, instruction) for line, instruction in folded if not is_noop(instruction)]
+
+    # Tote Schreibzugriffe entfernen: der geschriebene Wert wird vor dem Lesen ueberschrieben
+    # und dazwischen kann kein Laufzeitfehler auftreten
+    result = []
+    for i, (line, instruction) in enumerate(folded):
+        dead = False
+        if not may_fail(instruction, register_count):
+            later = [e for _, e in folded[i + 1:]]
+            writes_accumulator = instruction.operator not in (Operator.STORE, Operator.INDSTORE) and instruction.operator != Operator.NONE
+            for e in later:
+                if may_fail(e, register_count):
+                    break
+                if instruction.operator == Operator.STORE:
+                    if reads_register(e, instruction.operand):
+                        break
+                    if e.operator == Operator.STORE and e.operand == instruction.operand:
+                        dead = True
+                        break
+                elif writes_accumulator:
+                    if overwrites_accumulator(e):
+                        dead = True
+                        break
+                    # Alle anderen Befehle lesen den Akkumulator
+                    break
+        if not dead:
+            result.append((line, instruction))
+    return result
+
+def optimize(program: Program, register_count: int = Constants.REGISTER_COUNT, limit: int = Constants.REGISTER_LIMIT) -> Program:
+    """Liefert ein optimiertes Programm mit derselben Wirkung auf den Speicher.
+
+    Zeilen, die einem IF folgen, werden nie mit anderen Zeilen zusammengefasst, da sie nur
+    bedingt ausgefuehrt werden. Programme mit Sprung auf Zeile 0 werden unveraendert uebernommen."""
+    # Die Maschine reduziert die Operanden ohnehin auf die Wortbreite, danach lassen sie sich direkt vergleichen
+    program = program.masked(limit - 1)
+    size = program.size()
+    lines = list(range(1, size + 1))
+    if any(e.operator == Operator.GOTO and e.operand == 0 for e in program.instructions):
+        return Program(list(program.instructions), [program.source_line(pc) for pc in lines])
+
+    reachable = reachable_lines(program)
+    guarded = {pc + 1 for pc in reachable if program[pc - 1].operator in CONDITIONS}
+    keep = {pc for pc in reachable if program[pc - 1].operator != Operator.NONE or pc in guarded}
+    # Ein IF vor einer leeren Zeile fuehrt in beiden Faellen zur uebernaechsten Zeile
+    for pc in sorted(reachable):
+        instruction = program[pc - 1]
+        if (instruction.operator in CONDITIONS and pc not in guarded and pc + 1 <= size
+                and program[pc].operator == Operator.NONE):
+            keep.discard(pc)
+            keep.discard(pc + 1)
+    kept = sorted(keep)
+
+    def next_kept(target: int) -> int | None:
+        for pc in kept:
+            if pc >= target:
+                return pc
+        return None
+
+    # Einstiegspunkte, an denen keine Zusammenfassung ueber die Grenze hinweg erfolgen darf
+    leaders = {next_kept(1)}
+    for pc in kept:
+        instruction = program[pc - 1]
+        if instruction.operator == Operator.GOTO:
+            leaders.add(next_kept(instruction.operand))
+        elif instruction.operator in CONDITIONS:
+            leaders.add(pc + 1)
+            leaders.add(next_kept(pc + 2))
+        if pc in guarded:
+            leaders.add(next_kept(pc + 1))
+
+    optimized: list[tuple[int, Instruction]] = []
+    run: list[tuple[int, Instruction]] = []
+    for pc in kept:
+        instruction = program[pc - 1]
+        if pc in leaders or pc in guarded:
+            optimized.extend(optimize_run(run, register_count, limit))
+            run = []
+        if instruction.operator in CONDITIONS or instruction.operator in (Operator.GOTO, Operator.END) or pc in guarded:
+            optimized.extend(optimize_run(run, register_count, limit))
+            run = []
+            optimized.append((pc, instruction))
+        else:
+            run.append((pc, instruction))
+    optimized.extend(optimize_run(run, register_count, limit))
+
+    # Sprungziele auf die neuen Zeilennummern umrechnen
+    position = {pc: i + 1 for i, (pc, _) in enumerate(optimized)}
+    end = len(optimized) + 1
+
+    def new_target(target: int) -> int:
+        for pc, _ in optimized:
+            if pc >= target:
+                return position[pc]
+        return end
+
+    instructions = []
+    for pc, instruction in optimized:
+        if instruction.operator == Operator.GOTO:
+            instruction = Instruction(Operator.GOTO, new_target(instruction.operand))
+        instructions.append(instruction)
+    return Program(instructions, [program.source_line(pc) for pc, _ in optimized])
+
+class Counterexample:
+    def __init__(self, memory: list[int], expected: tuple, actual: tuple):
+        self.memory = memory
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self) -> str:
+        return f'Initial memory {self.memory}: expected {self.expected}, got {self.actual}'
+
+def outcome(program: Program, memory: list[int], max_steps: int) -> tuple | None:
+    """Endzustand (Speicher, Fehler) eines Laufs oder None, wenn das Schrittlimit erreicht wurde."""
+    machine = Machine().add_standard_instructions()
+    for i, value in enumerate(memory):
+        machine[i] = value
+    machine.program = program
+    error = None
+    try:
+        machine.run(max_steps)
+    except MachineRuntimeError as e:
+        error = str(e)
+    if error is None and not machine.is_halted():
+        return None
+    return list(machine.memory), error
+
+def check_equivalence(original: Program, optimized: Program, samples: int = 1000, max_steps: int = 100_000,
+                      seed: int = 0) -> Counterexample | None:
+    """Vergleicht beide Programme auf zufaelligen Anfangsbelegungen (und der Nullbelegung).
+    Laeufe, bei denen das Original das Schrittlimit erreicht, werden nicht bewertet."""
+    rng = random.Random(seed)
+    register_count = Constants.REGISTER_COUNT
+    for sample in range(samples):
+        if sample == 0:
+            memory = [0] * register_count
+        else:
+            # Kleine Werte kommen haeufiger vor, damit auch indirekte Adressen gueltig sind
+            memory = [rng.randrange(register_count) if rng.random() < 0.5 else rng.randrange(Constants.REGISTER_LIMIT)
+                      for _ in range(register_count)]
+        expected = outcome(original, memory, max_steps)
+        if expected is None:
+            continue
+        actual = outcome(optimized, memory, max_steps)
+        if actual != expected:
+            return Counterexample(memory, expected, actual)
+    return None
+
+def optimize_checked(program: Program, samples: int = 1000, max_steps: int = 100_000) -> Program:
+    """Optimiert das Programm und prueft das Ergebnis, bei Abweichung wird OptimizationError ausgeloest."""
+    optimized = optimize(program)
+    counterexample = check_equivalence(program, optimized, samples, max_steps)
+    if counterexample is not None:
+        raise OptimizationError(f'Optimized program differs from the original: {counterexample}')
+    return optimized
@@ -0,0 +1,188 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Profiler fuer RAM-Programme: zaehlt, wie oft jede Zeile und jeder Operator ausgefuehrt wurde
+# und wie oft die Bedingung jedes IF erfuellt war. Ohne eingeschalteten Profiler entstehen keine Kosten.
+#
+#   python3 profiler.py prog.ram --registers 5 3 --format csv
+
+from __future__ import annotations
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import Callable
+
+from bytecode import Code, OP_CALL, OP_END, OP_UNDEFINED
+from machine import *
+
+CONDITIONS = {Operator.IF_EQ, Operator.IF_NE, Operator.IF_LT, Operator.IF_LE, Operator.IF_GT, Operator.IF_GE}
+
+class Profile:
+    """Ergebnis eines Profilerlaufs. Zeilen sind die Zeilen im Quelltext (siehe Program.source_line)."""
+
+    def __init__(self, program: Program, hits: dict[int, int], branches: dict[int, tuple[int, int]]):
+        self.program = program
+        # Zeile -> Anzahl der Ausfuehrungen
+        self.hits = hits
+        # Zeile eines IF -> (Bedingung erfuellt, Bedingung nicht erfuellt)
+        self.branches = branches
+
+    def operators(self) -> dict[Operator, int]:
+        counts: dict[Operator, int] = {}
+        for pc in range(1, self.program.size() + 1):
+            line = self.program.source_line(pc)
+            if line in self.hits:
+                operator = self.program[pc - 1].operator
+                counts[operator] = counts.get(operator, 0) + self.hits[line]
+        return counts
+
+    def total(self) -> int:
+        return sum(self.hits.values())
+
+    def to_dict(self) -> dict:
+        return {
+            'total': self.total(),
+            'lines': {str(line): hits for line, hits in sorted(self.hits.items())},
+            'operators': {operator.value: hits for operator, hits in sorted(self.operators().items(), key=lambda e: -e[1])},
+            'branches': {str(line): {'taken': taken, 'not_taken': not_taken} for line, (taken, not_taken) in sorted(self.branches.items())},
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def to_csv(self) -> str:
+        """Eine Zeile je ausgefuehrter Programmzeile, IF-Zeilen mit erfuellten und nicht erfuellten Bedingungen."""
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(['line', 'instruction', 'hits', 'taken', 'not_taken'])
+        for pc in range(1, self.program.size() + 1):
+            line = self.program.source_line(pc)
+            if line not in self.hits:
+                continue
+            taken, not_taken = self.branches.get(line, ('', ''))
+            writer.writerow([line, str(self.program[pc - 1]), self.hits[line], taken, not_taken])
+        return output.getvalue()
+
+class Profiler:
+    """Zaehlt Ausfuehrungen je Befehlszaehler, indem der Code-Durchlauf jeden Befehl mit einem
+    zaehlenden Aufruf umschliesst. Die Zaehler bleiben ueber mehrere run()-Aufrufe erhalten,
+    bis das Programm wechselt oder reset() aufgerufen wird. Eine beschleunigte Schleife
+    (siehe Machine.accelerate_loops) zaehlt als eine Ausfuehrung ihrer ersten Zeile."""
+
+    def __init__(self):
+        self.program: Program | None = None
+        self.hits: list[int] = []
+        # Wie oft ein IF den naechsten Befehl uebersprungen hat (Bedingung nicht erfuellt)
+        self.skips: list[int] = []
+
+    def reset(self):
+        self.program = None
+        self.hits = []
+        self.skips = []
+
+    def follow(self, program: Program):
+        if program is not self.program:
+            self.program = program
+            self.hits = [0] * (program.size() + 3)
+            self.skips = [0] * (program.size() + 3)
+
+    def code_pass(self, machine: Machine, code: Code):
+        self.follow(code.program)
+        for pc in range(code.size + 1):
+            op = code.ops[pc]
+            if op in (OP_END, OP_UNDEFINED):
+                continue
+            operator = code.program[(pc or code.size) - 1].operator
+            function = code.handlers[pc] if code.handlers[pc] is not None else machine.instruction_set[operator]
+            code.handlers[pc] = self.counted(function, operator in CONDITIONS)
+            code.ops[pc] = OP_CALL
+    # Der Profiler umschliesst alle anderen Durchlaeufe, auch die Aufzeichnung
+    code_pass.order = 2
+
+    def counted(self, function: Callable, conditional: bool) -> Callable:
+        hits = self.hits
+        if conditional:
+            skips = self.skips
+            def branch_handler(m: Machine, i: int) -> Machine:
+                pc = m.program_counter
+                function(m, i)
+                hits[pc] += 1
+                if m.program_counter != pc:
+                    skips[pc] += 1
+                return m
+            return branch_handler
+        def handler(m: Machine, i: int) -> Machine:
+            pc = m.program_counter
+            function(m, i)
+            hits[pc] += 1
+            return m
+        return handler
+
+    def count_step(self, m: Machine, instruction: Instruction, function: Callable):
+        """Fuehrt einen Einzelschritt (Machine.advance) aus und zaehlt ihn."""
+        self.follow(m.program)
+        pc = m.program_counter
+        function(m, instruction.operand & m.mask)
+        self.hits[pc] += 1
+        if instruction.operator in CONDITIONS and m.program_counter != pc:
+            self.skips[pc] += 1
+
+    def result(self) -> Profile:
+        program = self.program if self.program is not None else Program()
+        size = program.size()
+        hits: dict[int, int] = {}
+        branches: dict[int, tuple[int, int]] = {}
+        for pc in range(1, size + 1):
+            # Index 0 steht fuer einen Sprung auf Zeile 0, der die letzte Zeile ausfuehrt
+            count = self.hits[pc] + (self.hits[0] if pc == size else 0)
+            if count == 0:
+                continue
+            line = program.source_line(pc)
+            hits[line] = hits.get(line, 0) + count
+            if program[pc - 1].operator in CONDITIONS:
+                skipped = self.skips[pc] + (self.skips[0] if pc == size else 0)
+                branches[line] = (count - skipped, skipped)
+        return Profile(program, hits, branches)
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Runs a RAM program and prints how often each line was executed.')
+    parser.add_argument('path', help='.ram or .ramc file')
+    parser.add_argument('--registers', type=int, nargs='*', default=[], help='initial register values')
+    parser.add_argument('--max-steps', type=int, default=None, help='step limit')
+    parser.add_argument('--format', choices=('json', 'csv'), default='json')
+    args = parser.parse_args(argv)
+
+    machine = Machine().add_standard_instructions().profile()
+    for i, value in enumerate(args.registers):
+        machine[i] = value
+    machine.program = Program.from_file(args.path)
+    error = None
+    try:
+        machine.run(args.max_steps)
+    except MachineRuntimeError as e:
+        error = str(e)
+    profile = machine.profiler.result()
+    print(profile.to_json() if args.format == 'json' else profile.to_csv(), end='\n' if args.format == 'json' else '')
+    if error is not None:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,14 +16,18 @@
 
 
 from __future__ import annotations
+import hashlib
+from typing import Iterable
 from instruction import *
 
 class Program:
-    def __init__(self, instructions = None):
+    def __init__(self, instructions = None, line_map: list[int] | None = None):
         if instructions is None:
             self.instructions: list[Instruction] = []
         else:
             self.instructions = instructions
+        # Ursprungszeile je Befehl, falls das Programm z.B. vom Optimierer umgebaut wurde
+        self.line_map = line_map
 
     def __str__(self) -> str:
         strings = []
@@ -33,16 +37,36 @@ class Program:
 
     @staticmethod
     def from_string(source: str) -> Program:
-        lines = source.lower().replace("go to", "goto").splitlines()
-        instructions: list[Instruction] = []
-        for l in lines:
-            instructions.append(Instruction.from_string(l))
-        return Program(instructions)
+        return Program.from_lines(source.splitlines())
 
     @staticmethod
     def from_file(path: str = 'prog.ram') -> Program:
+        if path.endswith('.ramc'):
+            import ramc
+            return ramc.load(path)
+        # Die Datei wird zeilenweise gelesen und nie vollstaendig in den Speicher geladen
         with open(path, "r") as program_file:
-            return Program.from_string(program_file.read())
+            return Program.from_lines(program_file)
+
+    @staticmethod
+    def from_lines(lines: Iterable[str]) -> Program:
+        """Parst ein Programm Zeile fuer Zeile. Fehler werden nicht beim ersten Auftreten
+        gemeldet, sondern gesammelt und am Ende gemeinsam als InvalidProgram ausgeloest."""
+        instructions: list[Instruction] = []
+        errors: list[tuple[int, Exception]] = []
+        # Gleiche Befehle werden nur einmal angelegt und mehrfach referenziert
+        shared: dict[tuple[Operator, int], Instruction] = {}
+        for number, line in enumerate(lines, 1):
+            try:
+                instruction = Instruction.from_tokens(line.lower().split())
+            except (InvalidOperand, InvalidOperator, InvalidSyntax) as e:
+                errors.append((number, e))
+                continue
+            key = (instruction.operator, instruction.operand)
+            instructions.append(shared.setdefault(key, instruction))
+        if errors:
+            raise InvalidProgram(errors)
+        return Program(instructions)
         
     # Mit Indexoperator kann direkt auf den n. Befehl zugegriffen werden
     def __getitem__(self, key) -> Instruction:
@@ -51,4 +75,24 @@ class Program:
     def size(self) -> int:
         return len(self.instructions)
 
+    # Zeile im Quelltext, die zum Befehlszaehler pc gehoert (z.B. fuer die Hervorhebung in der GUI)
+    def source_line(self, pc: int) -> int:
+        if self.line_map is None or not 1 <= pc <= len(self.line_map):
+            return pc
+        return self.line_map[pc - 1]
+
+    # Programm mit auf eine Wortbreite reduzierten Operanden (operand & mask), wie es eine Maschine ausfuehrt.
+    # Analysen, die mit den Operanden rechnen (JIT, Optimierer, Schleifen), arbeiten auf diesem Programm
+    def masked(self, mask: int) -> Program:
+        if all(0 <= e.operand <= mask for e in self.instructions):
+            return self
+        return Program([Instruction(e.operator, e.operand & mask) for e in self.instructions], self.line_map)
+
+    # Inhaltshash ueber Operatoren und Operanden, z.B. als Schluessel fuer Caches
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for e in self.instructions:
+            digest.update(f'{e.operator.value} {e.operand}\n'.encode())
+        return digest.hexdigest()
+
     
@@ -0,0 +1,177 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Kompiliertes Binaerformat (.ramc) fuer RAM-Programme und ein Cache-Verzeichnis fuer
+# bereits geparste Programme. Aufbau einer Datei (little endian):
+#
+#   Kopf       Magic 'RAMC', Version, SHA-256 des Quelltexts, Anzahl der Befehle, Flags
+#   Operatoren 1 Byte je Befehl (Index in Operator)
+#   Operanden  8 Byte je Befehl, auf 8 Byte ausgerichtet
+#   Zeilen     4 Byte je Befehl mit der Ursprungszeile (nur mit Flag LINE_MAP)
+#
+#   python3 ramc.py prog.ram [-o prog.ramc]
+
+from __future__ import annotations
+import argparse
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+from program import *
+
+MAGIC = b'RAMC'
+# Version 2: Operanden werden nicht mehr modulo 256, sondern als 64-Bit-Werte gespeichert
+VERSION = 2
+HEADER = struct.Struct('<4sHxx32sII')
+LINE_MAP = 1
+
+OPERATORS = list(Operator)
+OPCODES = {operator: index for index, operator in enumerate(OPERATORS)}
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'registermaschine')
+
+class InvalidCompiledProgram(Exception):
+    pass
+
+class InstructionStore:
+    """Befehlsliste auf Basis zweier Arrays. Befehle werden erst beim Zugriff erzeugt
+    und fuer gleiche Operator/Operand-Paare wiederverwendet."""
+
+    def __init__(self, ops: array, operands: array):
+        self.ops = ops
+        self.operands = operands
+        self.shared: dict[tuple[int, int], Instruction] = {}
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        entry = (self.ops[key], self.operands[key])
+        instruction = self.shared.get(entry)
+        if instruction is None:
+            instruction = self.shared[entry] = Instruction(OPERATORS[entry[0]], entry[1])
+        return instruction
+
+    def __iter__(self):
+        for i in range(len(self.ops)):
+            yield self[i]
+
+def to_little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def from_little_endian(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def padding(offset: int) -> int:
+    return -offset % 8
+
+def dumps(program: Program, source_hash: bytes | None = None) -> bytes:
+    """Serialisiert das Programm. Ohne source_hash wird der Fingerabdruck des Programms verwendet."""
+    if source_hash is None:
+        source_hash = bytes.fromhex(program.fingerprint())
+    count = program.size()
+    ops = array('B', (OPCODES[e.operator] for e in program.instructions))
+    # Operanden ab 2**63 werden im Zweierkomplement abgelegt, fuer die Maschine ist das derselbe Wert
+    operands = array('q', (e.operand - OPERAND_LIMIT if e.operand >= OPERAND_LIMIT // 2 else e.operand
+                           for e in program.instructions))
+    flags = LINE_MAP if program.line_map is not None else 0
+    parts = [HEADER.pack(MAGIC, VERSION, source_hash, count, flags), ops.tobytes(), bytes(padding(HEADER.size + count))]
+    parts.append(to_little_endian(operands))
+    if flags & LINE_MAP:
+        parts.append(to_little_endian(array('I', program.line_map)))
+    return b''.join(parts)
+
+def loads(data: bytes, source_hash: bytes | None = None) -> Program:
+    """Laedt ein Programm aus dem Binaerformat. Mit source_hash muss der gespeicherte Hash uebereinstimmen."""
+    if len(data) < HEADER.size:
+        raise InvalidCompiledProgram('File is too short for a compiled program')
+    magic, version, stored_hash, count, flags = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise InvalidCompiledProgram('File is no compiled program')
+    if version != VERSION:
+        raise InvalidCompiledProgram(f'Unsupported version {version}, expected {VERSION}')
+    if source_hash is not None and stored_hash != source_hash:
+        raise InvalidCompiledProgram('Compiled program does not match its source')
+    view = memoryview(data)
+    start = HEADER.size
+    operands_start = start + count + padding(start + count)
+    line_map_start = operands_start + 8 * count
+    end = line_map_start + (4 * count if flags & LINE_MAP else 0)
+    if len(data) != end:
+        raise InvalidCompiledProgram('Compiled program is truncated or corrupted')
+    ops = array('B', view[start:start + count])
+    if count and max(ops) >= len(OPERATORS):
+        raise InvalidCompiledProgram('Compiled program contains unknown operators')
+    operands = from_little_endian('q', view[operands_start:line_map_start])
+    line_map = from_little_endian('I', view[line_map_start:end]).tolist() if flags & LINE_MAP else None
+    return Program(InstructionStore(ops, operands), line_map)
+
+def save(program: Program, path: str, source_hash: bytes | None = None):
+    # Erst in eine temporaere Datei schreiben, damit parallele Leser nie eine halbe Datei sehen
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as compiled_file:
+        compiled_file.write(dumps(program, source_hash))
+    os.replace(temporary, path)
+
+def load(path: str, source_hash: bytes | None = None) -> Program:
+    with open(path, 'rb') as compiled_file:
+        return loads(compiled_file.read(), source_hash)
+
+def load_cached(path: str, cache_dir: str = DEFAULT_CACHE_DIR) -> Program:
+    """Laedt eine .ram-Datei ueber den Cache: ist fuer den SHA-256 des Quelltexts bereits
+    ein kompiliertes Programm vorhanden, wird es verwendet, sonst wird geparst und gespeichert."""
+    with open(path, 'rb') as source_file:
+        source = source_file.read()
+    source_hash = hashlib.sha256(source).digest()
+    cache_path = os.path.join(cache_dir, source_hash.hex() + '.ramc')
+    try:
+        return load(cache_path, source_hash)
+    except (OSError, InvalidCompiledProgram):
+        pass
+    program = Program.from_string(source.decode())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        save(program, cache_path, source_hash)
+    except OSError:
+        # Ohne beschreibbaren Cache wird das Programm trotzdem geladen
+        pass
+    return program
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Compiles RAM programs to the binary .ramc format.')
+    parser.add_argument('source', help='.ram file')
+    parser.add_argument('-o', '--output', help='output file (default: source with .ramc extension)')
+    args = parser.parse_args(argv)
+    with open(args.source, 'rb') as source_file:
+        source = source_file.read()
+    program = Program.from_string(source.decode())
+    save(program, args.output or os.path.splitext(args.source)[0] + '.ramc', hashlib.sha256(source).digest())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
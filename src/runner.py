@@ -0,0 +1,139 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Kommandozeilen-Runner ohne GUI: fuehrt viele RAM-Dateien mit mehreren
+# Registerbelegungen parallel in einem Prozesspool aus und gibt die Ergebnisse als JSON-Zeilen aus.
+#
+#   python3 runner.py ../Beispielprogramme --inputs inputs.json --max-steps 100000
+#
+# Die optionale Eingabedatei ist entweder eine Liste von Registerbelegungen, die fuer alle
+# Programme verwendet wird, oder ein Objekt, das Dateinamen auf solche Listen abbildet.
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+from machine import *
+from optimizer import optimize
+import ramc
+
+DEFAULT_MAX_STEPS = 1_000_000
+
+# Geparste Programme werden pro Arbeitsprozess wiederverwendet, mit cache_dir auch ueber Laeufe hinweg
+@lru_cache(maxsize=256)
+def load_program(path: str, modified: float, optimized: bool = False, cache_dir: str | None = None,
+                 register_count: int = Constants.REGISTER_COUNT, word_size: int = Constants.WORD_SIZE) -> Program:
+    if cache_dir is not None and not path.endswith('.ramc'):
+        program = ramc.load_cached(path, cache_dir)
+    else:
+        program = Program.from_file(path)
+    return optimize(program, register_count, 1 << word_size) if optimized else program
+
+def run_job(path: str, registers: list[int], max_steps: int, use_jit: bool = False, detect_loops: bool = False,
+            accelerate_loops: bool = False, optimized: bool = False, cache_dir: str | None = None,
+            profile: bool = False, register_count: int = Constants.REGISTER_COUNT, word_size: int = Constants.WORD_SIZE,
+            sparse: bool = False) -> dict:
+    """Fuehrt ein Programm mit einer Anfangsbelegung aus und liefert das Ergebnis als Dictionary."""
+    result = {'file': path, 'input': registers, 'registers': None, 'program_counter': None, 'steps': 0, 'halted': False, 'error': None}
+    try:
+        program = load_program(path, os.path.getmtime(path), optimized, cache_dir, register_count, word_size)
+    except Exception as e:
+        result['error'] = f'Program could not be loaded: {e}'
+        return result
+    machine = (Machine(register_count=register_count, word_size=word_size, sparse=sparse).add_standard_instructions().use_jit(use_jit).detect_loops(detect_loops)
+               .accelerate_loops(accelerate_loops).profile(profile))
+    try:
+        # Eine fehlerhafte Belegung in der Eingabedatei betrifft nur ihren eigenen Lauf
+        if not isinstance(registers, list) or any(type(value) is not int for value in registers):
+            raise MachineRuntimeError(f'Input registers must be a list of integers, got {registers!r}')
+        if len(registers) > len(machine.memory):
+            raise MachineRuntimeError(f'Expected at most {len(machine.memory)} input registers')
+        for i, value in enumerate(registers):
+            machine[i] = value
+        machine.program = program
+        machine.run(max_steps)
+        if not machine.is_halted():
+            result['error'] = f'Step limit of {max_steps} reached'
+    except MachineRuntimeError as e:
+        result['error'] = str(e)
+    # Bei duenn besetztem Speicher nur die belegten Register
+    result['registers'] = dict(machine.memory.items()) if sparse else list(machine.memory)
+    # Bei optimierten Programmen wird die Zeile im Quelltext gemeldet
+    result['program_counter'] = program.source_line(machine.get_programcounter())
+    result['steps'] = machine.steps
+    result['halted'] = result['error'] is None
+    if profile:
+        result['profile'] = machine.profiler.result().to_dict()
+    return result
+
+def find_programs(paths: list[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.ram')))
+        else:
+            files.append(path)
+    return files
+
+def load_inputs(path: str | None) -> dict[str, list[list[int]]] | list[list[int]]:
+    if path is None:
+        return [[]]
+    with open(path, 'r', encoding='utf-8') as inputs_file:
+        return json.load(inputs_file)
+
+def inputs_for(inputs, file: str) -> list[list[int]]:
+    if isinstance(inputs, list):
+        return inputs
+    return inputs.get(os.path.basename(file), inputs.get(file, [[]]))
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Runs RAM programs headless and prints one JSON line per run.')
+    parser.add_argument('paths', nargs='+', help='.ram or .ramc files or directories containing .ram files')
+    parser.add_argument('--inputs', help='JSON file with initial register values')
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS, help='step limit per run')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: all cores)')
+    parser.add_argument('--jit', action='store_true', help='compile programs to Python functions before running them')
+    parser.add_argument('--detect-loops', action='store_true', help='abort runs as soon as they are caught in an infinite loop')
+    parser.add_argument('--accelerate-loops', action='store_true', help='execute simple counting loops in closed form')
+    parser.add_argument('--optimize', action='store_true', help='optimize programs before running them (step counts shrink)')
+    parser.add_argument('--profile', action='store_true', help='add execution counts per line, operator and branch to each result')
+    parser.add_argument('--register-count', type=int, default=Constants.REGISTER_COUNT, help='number of registers per machine')
+    parser.add_argument('--word-size', type=int, choices=Constants.WORD_SIZES, default=Constants.WORD_SIZE, help='register width in bits')
+    parser.add_argument('--sparse', action='store_true', help='only store registers that are not 0 (for very large register counts)')
+    parser.add_argument('--cache-dir', nargs='?', const=ramc.DEFAULT_CACHE_DIR, default=None,
+                        help=f'reuse compiled programs from this directory (default: {ramc.DEFAULT_CACHE_DIR})')
+    args = parser.parse_args(argv)
+
+    inputs = load_inputs(args.inputs)
+    failed = False
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_job, file, registers, args.max_steps, args.jit, args.detect_loops, args.accelerate_loops, args.optimize, args.cache_dir, args.profile,
+                               args.register_count, args.word_size, args.sparse)
+                   for file in find_programs(args.paths) for registers in inputs_for(inputs, file)]
+        # Ergebnisse werden in der Reihenfolge ihrer Fertigstellung ausgegeben
+        for future in as_completed(futures):
+            result = future.result()
+            failed = failed or result['error'] is not None
+            print(json.dumps(result), flush=True)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
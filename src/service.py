@@ -0,0 +1,303 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Lokaler Ausfuehrungsdienst: Clients schicken Quelltext und Anfangsbelegung als JSON-Zeile
+# und erhalten den Endzustand als JSON-Zeile zurueck (Zuordnung ueber das Feld id).
+#
+#   python3 service.py --port 8765
+#   {"id": 1, "program": "cload 5\nend", "registers": [0, 3], "max_steps": 1000, "time_limit": 0.5}
+#
+# Die Ausfuehrung uebernimmt ein Pool bereits gestarteter Arbeitsprozesse, die geparste Programme
+# ueber ihren Inhaltshash zwischenspeichern. Anfragen fuer dasselbe Programm mit denselben
+# Optionen, die kurz nacheinander eintreffen, werden gesammelt und in einem Durchgang ausgefuehrt
+# (mit NumPy vektorisiert ueber BatchMachine, sonst nacheinander auf einer Maschine).
+
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import BatchMachine, HALTED, RUNNING, np
+from machine import *
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_STEPS = 1_000_000
+DEFAULT_TIME_LIMIT = 5.0 # s
+# Wartezeit, in der weitere Anfragen fuer dasselbe Programm gesammelt werden
+BATCH_WINDOW = 0.002 # s
+MAX_BATCH = 1024
+# Ab dieser Anzahl lohnt sich die vektorisierte Ausfuehrung
+VECTOR_BATCH = 8
+# Schritte zwischen zwei Pruefungen des Zeitlimits, vektorisiert ist jeder Schritt deutlich teurer
+TIME_SLICE = 50_000
+VECTOR_TIME_SLICE = 500
+# Obergrenze fuer register_count einer Anfrage, jede Maschine belegt ihren Speicher vollstaendig
+MAX_REGISTER_COUNT = 1 << 16
+
+# Geparste Programme je Arbeitsprozess, Schluessel ist der SHA-256 des Quelltexts
+PROGRAMS: OrderedDict[str, Program] = OrderedDict()
+PROGRAM_CACHE_SIZE = 256
+
+def source_hash(source: str) -> str:
+    return hashlib.sha256(source.encode()).hexdigest()
+
+def cached_program(digest: str, source: str) -> Program:
+    program = PROGRAMS.get(digest)
+    if program is None:
+        program = Program.from_string(source)
+        PROGRAMS[digest] = program
+        if len(PROGRAMS) > PROGRAM_CACHE_SIZE:
+            PROGRAMS.popitem(last=False)
+    else:
+        PROGRAMS.move_to_end(digest)
+    return program
+
+def warm_up() -> int:
+    """Laedt im Arbeitsprozess alle Module und uebersetzt ein kleines Programm einmal vorab."""
+    Machine().add_standard_instructions().use_jit().run_code('cload 1\ncadd 1\nif < 3\ngoto 2\nend')
+    return os.getpid()
+
+class Options:
+    """Optionen, die fuer alle Anfragen eines Durchgangs gleich sein muessen."""
+
+    def __init__(self, max_steps: int, time_limit: float, use_jit: bool, register_count: int, word_size: int):
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        self.use_jit = use_jit
+        self.register_count = register_count
+        self.word_size = word_size
+
+    def key(self) -> tuple:
+        return self.max_steps, self.time_limit, self.use_jit, self.register_count, self.word_size
+
+def result_of(registers: list[int], program: Program, program_counter: int, steps: int, error: str | None) -> dict:
+    return {'registers': registers, 'program_counter': program.source_line(program_counter), 'steps': steps,
+            'halted': error is None, 'error': error}
+
+def run_batch(digest: str, source: str, inputs: list[list[int]], options: Options) -> list[dict]:
+    """Fuehrt ein Programm fuer mehrere Anfangsbelegungen aus (im Arbeitsprozess)."""
+    try:
+        program = cached_program(digest, source)
+    except InvalidProgram as e:
+        return [{'registers': None, 'program_counter': None, 'steps': 0, 'halted': False,
+                 'error': f'Program could not be loaded: {e}'} for _ in inputs]
+    default_geometry = (options.register_count, options.word_size) == (Constants.REGISTER_COUNT, Constants.WORD_SIZE)
+    if np is not None and len(inputs) >= VECTOR_BATCH and default_geometry and not options.use_jit:
+        return run_vectorized(program, inputs, options)
+    machine = Machine(register_count=options.register_count, word_size=options.word_size).add_standard_instructions().use_jit(options.use_jit)
+    machine.program = program
+    # Wie bei der vektorisierten Ausfuehrung gilt das Zeitlimit fuer den ganzen Durchgang
+    deadline = time.perf_counter() + options.time_limit
+    return [run_single(machine, program, registers, options, deadline) for registers in inputs]
+
+def run_single(machine: Machine, program: Program, registers: list[int], options: Options, deadline: float) -> dict:
+    # Ohne reset() bleibt der dekodierte Code der Maschine fuer die naechste Anfrage erhalten
+    machine.clear_memory()
+    machine.program_counter = 1
+    machine.steps = 0
+    error = None
+    try:
+        if len(registers) > len(machine.memory):
+            raise MachineRuntimeError(f'Expected at most {len(machine.memory)} input registers')
+        for i, value in enumerate(registers):
+            machine[i] = value
+        while not machine.is_halted() and machine.steps < options.max_steps:
+            if time.perf_counter() > deadline:
+                error = f'Time limit of {options.time_limit} s reached'
+                break
+            machine.run(min(TIME_SLICE, options.max_steps - machine.steps))
+        if error is None and not machine.is_halted():
+            error = f'Step limit of {options.max_steps} reached'
+    except MachineRuntimeError as e:
+        error = str(e)
+    return result_of(list(machine.memory), program, machine.program_counter, machine.steps, error)
+
+def run_vectorized(program: Program, inputs: list[list[int]], options: Options) -> list[dict]:
+    """Alle Belegungen laufen gleichzeitig, das Zeitlimit gilt daher fuer den ganzen Durchgang."""
+    deadline = time.perf_counter() + options.time_limit
+    results: list[dict | None] = [None] * len(inputs)
+    valid = []
+    for index, registers in enumerate(inputs):
+        if len(registers) > Constants.REGISTER_COUNT:
+            results[index] = result_of(None, program, 1, 0, f'Expected at most {Constants.REGISTER_COUNT} input registers')
+        else:
+            valid.append(index)
+    memory = np.zeros((len(valid), Constants.REGISTER_COUNT), dtype=np.int64)
+    for lane, index in enumerate(valid):
+        memory[lane, :len(inputs[index])] = inputs[index]
+    batch = BatchMachine(program, memory)
+    timed_out = False
+    while True:
+        running = (batch.state == RUNNING) & (batch.steps < options.max_steps)
+        if not running.any():
+            break
+        if time.perf_counter() > deadline:
+            timed_out = True
+            break
+        batch.run(min(VECTOR_TIME_SLICE, options.max_steps - int(batch.steps[running].min())))
+    for lane, index in enumerate(valid):
+        pc = int(batch.program_counter[lane])
+        error = batch.errors[lane]
+        if error is None and batch.state[lane] != HALTED:
+            error = f'Time limit of {options.time_limit} s reached' if timed_out else f'Step limit of {options.max_steps} reached'
+        results[index] = result_of(batch.memory[lane].tolist(), program, pc, int(batch.steps[lane]), error)
+    return results
+
+class ExecutionService:
+    """Nimmt Anfragen entgegen, sammelt sie nach Programm und Optionen und verteilt die
+    Durchgaenge auf den Prozesspool. Die Limits der Anfragen werden auf die des Dienstes begrenzt."""
+
+    def __init__(self, workers: int | None = None, max_steps: int = DEFAULT_MAX_STEPS, time_limit: float = DEFAULT_TIME_LIMIT,
+                 batch_window: float = BATCH_WINDOW):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        self.batch_window = batch_window
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        # Gesammelte Anfragen je (Programmhash, Optionen): Quelltext, Optionen, [(Belegung, Future)]
+        self.pending: dict[tuple, tuple[str, Options, list[tuple[list[int], asyncio.Future]]]] = {}
+        self.running: set[asyncio.Task] = set()
+
+    async def start(self) -> ExecutionService:
+        """Startet alle Arbeitsprozesse vorab, damit die erste Anfrage nicht darauf warten muss."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, warm_up) for _ in range(self.workers)))
+        return self
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def options(self, request: dict) -> Options:
+        max_steps = min(int(request.get('max_steps', self.max_steps)), self.max_steps)
+        time_limit = request.get('time_limit', self.time_limit)
+        # NaN wuerde jeden Vergleich mit der Frist verlieren und das Zeitlimit abschalten
+        if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)) or not math.isfinite(time_limit) or time_limit <= 0:
+            raise ValueError('time_limit must be a positive number')
+        time_limit = min(float(time_limit), self.time_limit)
+        word_size = int(request.get('word_size', Constants.WORD_SIZE))
+        if word_size not in Constants.WORD_SIZES:
+            raise ValueError(f'Unsupported word size {word_size}')
+        register_count = int(request.get('register_count', Constants.REGISTER_COUNT))
+        if not 1 <= register_count <= MAX_REGISTER_COUNT:
+            raise ValueError(f'register_count must be between 1 and {MAX_REGISTER_COUNT}')
+        return Options(max_steps, time_limit, bool(request.get('jit', False)), register_count, word_size)
+
+    async def submit(self, request: dict) -> dict:
+        """Fuehrt eine Anfrage aus und liefert das Ergebnis, Fehler stehen im Feld error."""
+        response = {'id': request.get('id')}
+        try:
+            source = request['program']
+            if not isinstance(source, str):
+                raise ValueError('program must be a string')
+            registers = [int(value) for value in request.get('registers', [])]
+            options = self.options(request)
+        except (KeyError, TypeError, ValueError) as e:
+            response['error'] = f'Invalid request: {e}'
+            return response
+        digest = source_hash(source)
+        key = (digest, options.key())
+        future = asyncio.get_running_loop().create_future()
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = (source, options, [])
+            self.pending[key] = entry
+            asyncio.get_running_loop().call_later(self.batch_window, self.flush, key)
+        entry[2].append((registers, future))
+        if len(entry[2]) >= MAX_BATCH:
+            self.flush(key)
+        response.update(await future)
+        return response
+
+    def flush(self, key: tuple):
+        entry = self.pending.pop(key, None)
+        if entry is not None:
+            task = asyncio.create_task(self.execute(key[0], *entry))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def execute(self, digest: str, source: str, options: Options, requests: list[tuple[list[int], asyncio.Future]]):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.pool, run_batch, digest, source, [registers for registers, _ in requests], options)
+        except Exception as e:
+            results = [{'error': f'Execution failed: {e}'} for _ in requests]
+        for (_, future), result in zip(requests, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Eine Verbindung: Anfragen werden nebenlaeufig bearbeitet, Antworten in der Reihenfolge
+        ihrer Fertigstellung geschrieben."""
+        tasks = set()
+
+        async def answer(line: bytes):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('request must be an object')
+            except ValueError as e:
+                response = {'id': None, 'error': f'Invalid request: {e}'}
+            else:
+                response = await self.submit(request)
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT):
+        await self.start()
+        server = await asyncio.start_server(self.handle, host, port, limit=1 << 24)
+        async with server:
+            await server.serve_forever()
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Runs RAM programs for local clients, one JSON request and response per line.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: only local connections)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: all cores)')
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS, help='upper bound for the step limit of a request')
+    parser.add_argument('--time-limit', type=float, default=DEFAULT_TIME_LIMIT, help='upper bound for the time limit of a request in seconds')
+    args = parser.parse_args(argv)
+
+    service = ExecutionService(args.workers, args.max_steps, args.time_limit)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Viele interaktive Sitzungen in einem Prozess: jede Sitzung besitzt eine eigene Maschine und ein
+# Schrittbudget, ausgefuehrt wird mit Machine.run_async() abschnittsweise in der Ereignisschleife.
+# Ein Programm ohne Ende blockiert damit weder andere Sitzungen noch den Prozess.
+#
+#   manager = SessionManager()
+#   session = manager.create('cload 1\nend', budget=1_000_000)
+#   state = await manager.run(session.id)
+
+from __future__ import annotations
+import asyncio
+import uuid
+
+from machine import *
+
+DEFAULT_MAX_SESSIONS = 1000
+
+class SessionError(Exception):
+    pass
+
+class Session:
+    def __init__(self, session_id: str, machine: Machine, budget: int | None):
+        self.id = session_id
+        self.machine = machine
+        # Schritte, die die Sitzung insgesamt ausfuehren darf (None fuer unbegrenzt)
+        self.budget = budget
+        self.used = 0
+        self.task: asyncio.Task | None = None
+        self.cancelled = False
+        self.error: str | None = None
+
+    def remaining(self) -> int | None:
+        return None if self.budget is None else self.budget - self.used
+
+    def running(self) -> bool:
+        return self.task is not None
+
+    def state(self) -> dict:
+        m = self.machine
+        return {
+            'id': self.id,
+            'registers': dict(m.memory.items()) if m.sparse else list(m.memory),
+            'program_counter': m.program.source_line(m.program_counter),
+            'steps': m.steps,
+            'remaining': self.remaining(),
+            'halted': m.is_halted(),
+            'running': self.running(),
+            'error': self.error,
+        }
+
+class SessionManager:
+    """Verwaltet Sitzungen. Jeder Aufruf von run() fuehrt die Maschine einer Sitzung bis zum Ende,
+    bis max_steps oder bis das Budget der Sitzung aufgebraucht ist, und gibt dabei nach jeweils
+    slice_steps Schritten die Kontrolle ab. cancel() bricht einen laufenden Aufruf ab."""
+
+    def __init__(self, slice_steps: int = ASYNC_SLICE, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.slice_steps = slice_steps
+        self.max_sessions = max_sessions
+        self.sessions: dict[str, Session] = {}
+
+    def create(self, source: str, registers: list[int] = (), budget: int | None = None, use_jit: bool = False,
+               register_count: int = Constants.REGISTER_COUNT, word_size: int = Constants.WORD_SIZE,
+               sparse: bool = False) -> Session:
+        """Legt eine Sitzung fuer den Quelltext an, Fehler im Programm werden als InvalidProgram ausgeloest."""
+        if len(self.sessions) >= self.max_sessions:
+            raise SessionError(f'Too many sessions, at most {self.max_sessions} are allowed')
+        machine = Machine(register_count=register_count, word_size=word_size, sparse=sparse).add_standard_instructions().use_jit(use_jit)
+        if len(registers) > len(machine.memory):
+            raise SessionError(f'Expected at most {len(machine.memory)} input registers')
+        for i, value in enumerate(registers):
+            machine[i] = value
+        machine.program = Program.from_string(source)
+        session = Session(uuid.uuid4().hex, machine, budget)
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Session:
+        try:
+            return self.sessions[session_id]
+        except KeyError:
+            raise SessionError(f'Unknown session {session_id}')
+
+    async def run(self, session_id: str, max_steps: int | None = None) -> dict:
+        """Fuehrt die Sitzung weiter aus und liefert ihren Zustand."""
+        session = self.get(session_id)
+        if session.running():
+            raise SessionError(f'Session {session_id} is already running')
+        machine = session.machine
+        remaining = session.remaining()
+        limit = remaining if max_steps is None else max_steps if remaining is None else min(max_steps, remaining)
+        before = machine.steps
+        session.error = None
+        session.task = asyncio.create_task(machine.run_async(limit, self.slice_steps))
+        try:
+            await session.task
+        except asyncio.CancelledError:
+            if not session.cancelled:
+                # Der Aufrufer selbst wurde abgebrochen
+                raise
+            session.error = 'Cancelled'
+        except MachineRuntimeError as e:
+            session.error = str(e)
+        finally:
+            session.task = None
+            session.cancelled = False
+            session.used += machine.steps - before
+        if session.error is None and not machine.is_halted() and session.remaining() == 0:
+            session.error = f'Step budget of {session.budget} exhausted'
+        return session.state()
+
+    def cancel(self, session_id: str) -> bool:
+        """Bricht die laufende Ausfuehrung der Sitzung ab, liefert False, wenn sie nicht laeuft."""
+        session = self.get(session_id)
+        if not session.running():
+            return False
+        session.cancelled = True
+        session.task.cancel()
+        return True
+
+    def close(self, session_id: str):
+        self.cancel(session_id)
+        del self.sessions[session_id]
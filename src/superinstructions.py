@@ -0,0 +1,127 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+# Superinstruktionen: haeufige Folgen benachbarter Befehle werden vom Bytecode-Interpreter
+# mit einem Opcode ausgefuehrt, das spart das Verteilen auf die einzelnen Befehle.
+# Jede Zeile zaehlt weiterhin als ein Schritt und der Befehlszaehler steht nach run() auf
+# derselben Zeile wie ohne Zusammenfassung.
+#
+#   python3 superinstructions.py prog.ram --registers 5 3
+#
+# gibt die (mit Profil gewichteten) haeufigsten Paare und Tripel eines Programms aus.
+
+from __future__ import annotations
+import argparse
+import sys
+from collections import Counter
+
+from bytecode import *
+from machine import *
+from profiler import Profile
+
+# Folge von Operatoren -> Opcode der Superinstruktion
+SUPERINSTRUCTIONS: dict[tuple[Operator, ...], int] = {
+    (Operator.LOAD, Operator.ADD, Operator.STORE): OP_LOAD_ADD_STORE,
+    (Operator.LOAD, Operator.SUB, Operator.STORE): OP_LOAD_SUB_STORE,
+    (Operator.LOAD, Operator.CADD, Operator.STORE): OP_LOAD_CADD_STORE,
+    (Operator.LOAD, Operator.CSUB, Operator.STORE): OP_LOAD_CSUB_STORE,
+    (Operator.CADD, Operator.IF_NE, Operator.GOTO): OP_CADD_IF_NE_GOTO,
+    (Operator.LOAD, Operator.STORE): OP_LOAD_STORE,
+    (Operator.CLOAD, Operator.STORE): OP_CLOAD_STORE,
+    (Operator.INDLOAD, Operator.STORE): OP_INDLOAD_STORE,
+    (Operator.LOAD, Operator.INDSTORE): OP_LOAD_INDSTORE,
+    (Operator.INDLOAD, Operator.INDSTORE): OP_INDLOAD_INDSTORE,
+    (Operator.IF_EQ, Operator.GOTO): OP_IF_EQ_GOTO,
+    (Operator.IF_NE, Operator.GOTO): OP_IF_NE_GOTO,
+}
+
+# Kandidaten je erstem Operator, laengere Folgen zuerst
+BY_FIRST: dict[Operator, list[tuple[tuple[Operator, ...], int]]] = {}
+for sequence, op in sorted(SUPERINSTRUCTIONS.items(), key=lambda e: -len(e[0])):
+    BY_FIRST.setdefault(sequence[0], []).append((sequence, op))
+
+# Befehle, deren Operand ein Register ist; nur mit gueltigem Register duerfen sie zusammengefasst werden
+REGISTER_OPERANDS = {Operator.LOAD, Operator.STORE, Operator.ADD, Operator.SUB, Operator.INDLOAD, Operator.INDSTORE}
+
+def fusible(machine: Machine, code: Code, pc: int, sequence: tuple[Operator, ...]) -> bool:
+    """Die Zeilen ab pc enthalten die Folge und werden alle noch vom Interpreter selbst ausgefuehrt,
+    sind also weder durch eigene Befehle noch durch andere Durchlaeufe ersetzt."""
+    if pc + len(sequence) - 1 > code.size:
+        return False
+    for line, operator in enumerate(sequence, pc):
+        if code.ops[line] != OPCODES[operator] or code.program[line - 1].operator != operator:
+            return False
+        if operator in REGISTER_OPERANDS and code.args[line] >= len(machine.memory):
+            return False
+    return True
+
+def fusion_pass(machine: Machine, code: Code):
+    """Setzt in jede Zeile, in der eine Folge aus SUPERINSTRUCTIONS beginnt, den Opcode der
+    laengsten passenden Folge. Spruenge in die Mitte einer Folge fuehren die restlichen Zeilen
+    einzeln aus, Folgen duerfen sich daher ueberlappen."""
+    for pc in range(1, code.size + 1):
+        for sequence, op in BY_FIRST.get(code.program[pc - 1].operator, ()):
+            if fusible(machine, code, pc, sequence):
+                code.ops[pc] = op
+                break
+# Nach den Durchlaeufen, die Befehle ersetzen, und vor Aufzeichnung und Profiler,
+# die wieder jede Zeile einzeln ausfuehren
+fusion_pass.order = 0.5
+
+def sequence_counts(program: Program, length: int = 2, profile: Profile | None = None) -> Counter:
+    """Zaehlt Folgen von length benachbarten Operatoren. Mit Profil wird jede Folge mit der
+    kleinsten Ausfuehrungszahl ihrer Zeilen gewichtet, ohne Profil zaehlt jedes Vorkommen einmal."""
+    counts: Counter = Counter()
+    for pc in range(1, program.size() - length + 2):
+        sequence = tuple(program[line - 1].operator for line in range(pc, pc + length))
+        if profile is None:
+            weight = 1
+        else:
+            weight = min(profile.hits.get(program.source_line(line), 0) for line in range(pc, pc + length))
+        if weight:
+            counts[sequence] += weight
+    return counts
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Prints the most frequent instruction pairs and triples of a RAM program.')
+    parser.add_argument('path', help='.ram or .ramc file')
+    parser.add_argument('--registers', type=int, nargs='*', default=None, help='run the program with these initial values and weight by execution counts')
+    parser.add_argument('--max-steps', type=int, default=None, help='step limit for the profiling run')
+    parser.add_argument('--top', type=int, default=10, help='number of sequences per length')
+    args = parser.parse_args(argv)
+
+    program = Program.from_file(args.path)
+    profile = None
+    if args.registers is not None:
+        machine = Machine().add_standard_instructions().profile()
+        for i, value in enumerate(args.registers):
+            machine[i] = value
+        machine.program = program
+        try:
+            machine.run(args.max_steps)
+        except MachineRuntimeError as e:
+            print(e, file=sys.stderr)
+        profile = machine.profiler.result()
+    for length in (2, 3):
+        for sequence, count in sequence_counts(program, length, profile).most_common(args.top):
+            fused = '*' if sequence in SUPERINSTRUCTIONS else ' '
+            print(f'{count:>12} {fused} {" ".join(operator.value for operator in sequence)}')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
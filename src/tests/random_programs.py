@@ -0,0 +1,80 @@
+# Zufaellige Programme und der Einzelschritt als Referenz fuer Vergleichstests
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from machine import *
+
+SEEDS = range(300)
+MAX_STEPS = 500
+
+# Operatoren, deren Operand ein Register ist, und Spruenge
+REGISTER_OPERATORS = [Operator.LOAD, Operator.STORE, Operator.ADD, Operator.SUB, Operator.MULT, Operator.DIV,
+                      Operator.INDLOAD, Operator.INDSTORE, Operator.INDADD, Operator.INDSUB, Operator.INDMULT, Operator.INDDIV]
+CONSTANT_OPERATORS = [Operator.CLOAD, Operator.CADD, Operator.CSUB, Operator.CMULT, Operator.CDIV]
+CONDITIONS = [Operator.IF_EQ, Operator.IF_NE, Operator.IF_LT, Operator.IF_LE, Operator.IF_GT, Operator.IF_GE]
+
+def random_program(seed: int, size: int = 12, register_count: int = Constants.REGISTER_COUNT) -> Program:
+    """Programm aus allen eingebauten Befehlen. Einzelne Register liegen ausserhalb des Speichers,
+    Spruenge fuehren auch auf Zeile 0 und hinter das Programmende, damit Fehler und Randfaelle vorkommen."""
+    rng = random.Random(seed)
+    instructions = []
+    for _ in range(size):
+        kind = rng.random()
+        if kind < 0.35:
+            operator = rng.choice(REGISTER_OPERATORS)
+            operand = rng.randrange(register_count + 1) if rng.random() < 0.1 else rng.randrange(register_count)
+        elif kind < 0.65:
+            operator = rng.choice(CONSTANT_OPERATORS)
+            operand = rng.choice([0, 1, 2, 3, 7, 128, 255, rng.randrange(256)]) if rng.random() < 0.5 else rng.randrange(register_count)
+        elif kind < 0.85:
+            operator = rng.choice(CONDITIONS)
+            operand = rng.choice([0, 1, 5, 255, rng.randrange(256)])
+        elif kind < 0.97:
+            operator = Operator.GOTO
+            operand = rng.randrange(size + 2)
+        else:
+            operator = rng.choice([Operator.END, Operator.NONE])
+            operand = 0
+        instructions.append(Instruction(operator, operand))
+    instructions.append(Instruction(Operator.END, 0))
+    return Program(instructions)
+
+def random_registers(seed: int, register_count: int = Constants.REGISTER_COUNT) -> list[int]:
+    rng = random.Random(-seed - 1)
+    # Ueberwiegend gueltige Zeiger, damit indirekte Befehle nicht sofort scheitern
+    return [rng.randrange(register_count) if rng.random() < 0.7 else rng.choice([0, 255, rng.randrange(256)])
+            for _ in range(register_count)]
+
+def state(machine: Machine, error: str | None) -> tuple:
+    return machine.program_counter, machine.steps, list(machine.memory), error
+
+def prepared(program: Program, registers: list[int], machine: Machine | None = None) -> Machine:
+    machine = machine or Machine().add_standard_instructions()
+    machine.program = program
+    for i, value in enumerate(registers):
+        machine[i] = value
+    return machine
+
+def reference(program: Program, registers: list[int], max_steps: int = MAX_STEPS) -> tuple:
+    """Endzustand mit dem Einzelschritt-Dispatcher step()."""
+    machine = prepared(program, registers)
+    error = None
+    try:
+        while not machine.is_halted() and machine.steps < max_steps:
+            machine.step()
+    except MachineRuntimeError as e:
+        error = str(e)
+    return state(machine, error)
+
+def run(machine: Machine, max_steps: int = MAX_STEPS) -> tuple:
+    """Endzustand mit run()."""
+    error = None
+    try:
+        machine.run(max_steps)
+    except MachineRuntimeError as e:
+        error = str(e)
+    return state(machine, error)
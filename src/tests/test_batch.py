@@ -0,0 +1,25 @@
+# Jede Spur der BatchMachine verhaelt sich wie der Einzelschritt auf derselben Belegung
+
+import pytest
+
+from random_programs import *
+
+np = pytest.importorskip('numpy')
+
+from batch import BatchMachine, RUNNING
+
+def test_lanes_match_step():
+    for seed in SEEDS[:100]:
+        program = random_program(seed)
+        # Mehrere Belegungen je Programm, damit die Spuren auseinanderlaufen
+        inputs = [random_registers(seed * 16 + lane) for lane in range(16)]
+        batch = BatchMachine(program, np.array(inputs)).run(MAX_STEPS)
+        for lane, registers in enumerate(inputs):
+            pc, steps, memory, error = reference(program, registers)
+            assert int(batch.program_counter[lane]) == pc, (seed, lane)
+            assert int(batch.steps[lane]) == steps, (seed, lane)
+            assert batch.memory[lane].tolist() == memory, (seed, lane)
+            assert batch.errors[lane] == error, (seed, lane)
+            # Wie Machine.is_halted()
+            halted = not (pc <= program.size() and program[pc - 1].operator != Operator.END)
+            assert (batch.state[lane] == RUNNING) == (error is None and not halted), (seed, lane)
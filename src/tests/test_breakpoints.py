@@ -0,0 +1,51 @@
+# Haltepunkte und Ueberwachungen halten an den richtigen Stellen und aendern den Lauf nicht
+
+import random
+
+from random_programs import *
+
+def run_to_end(machine: Machine) -> tuple[tuple, list[tuple]]:
+    """Setzt nach jedem Anhalten fort, liefert den Endzustand und die Zustaende beim Anhalten."""
+    stops = []
+    while True:
+        outcome = run(machine, MAX_STEPS - machine.steps)
+        if machine.stopped is None:
+            return outcome, stops
+        stops.append(outcome)
+
+def test_conditions_that_never_hold():
+    for seed in SEEDS[:100]:
+        program, registers = random_program(seed), random_registers(seed)
+        machine = prepared(program, registers)
+        for line in range(1, program.size() + 1):
+            machine.add_breakpoint(line, 'akku > 255')
+        machine.add_watchpoint(0, 'R1 < 0')
+        assert run_to_end(machine) == (reference(program, registers), []), seed
+
+def test_breakpoints_match_step():
+    stopped = 0
+    for seed in SEEDS[:100]:
+        program, registers = random_program(seed), random_registers(seed)
+        line = random.Random(seed).randrange(1, program.size() + 1)
+        outcome, stops = run_to_end(prepared(program, registers).add_breakpoint(line))
+        stopped += len(stops)
+        assert outcome == reference(program, registers), seed
+        for pc, steps, memory, error in stops:
+            # Angehalten wird vor der Zeile, im selben Zustand wie der Einzelschritt nach steps Schritten
+            assert (pc or program.size()) == line, seed
+            assert (pc, steps, memory, error) == reference(program, registers, steps), seed
+    assert stopped
+
+def test_watchpoints_match_step():
+    stopped = 0
+    for seed in SEEDS[:100]:
+        program, registers = random_program(seed), random_registers(seed)
+        register = random.Random(seed).randrange(Constants.REGISTER_COUNT)
+        outcome, stops = run_to_end(prepared(program, registers).add_watchpoint(register))
+        stopped += len(stops)
+        assert outcome == reference(program, registers), seed
+        for pc, steps, memory, error in stops:
+            # Angehalten wird nach dem Befehl, der das Register geaendert hat
+            assert (pc, steps, memory, error) == reference(program, registers, steps), seed
+            assert reference(program, registers, steps - 1)[2][register] != memory[register], seed
+    assert stopped
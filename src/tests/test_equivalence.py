@@ -0,0 +1,33 @@
+# Kommandozeile des vollstaendigen Vergleichs
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from equivalence import INCONCLUSIVE, main
+
+@pytest.fixture
+def programs(tmp_path) -> dict[str, str]:
+    sources = {'inc': 'load 1\ncadd 1\nstore 2\nend', 'inc2': 'load 1\ncadd 2\nstore 2\nend', 'loop': 'goto 1\nend'}
+    paths = {}
+    for name, source in sources.items():
+        paths[name] = str(tmp_path / f'{name}.ram')
+        with open(paths[name], 'w', encoding='utf-8') as program_file:
+            program_file.write(source)
+    return paths
+
+@pytest.mark.parametrize('arguments', [['--inputs', '1', '1'], ['--inputs', '1', '--base', '1', '2'],
+                                       ['--inputs', '1', '--base', '0', '0', '0', '0', '0', '0', '0', '256']])
+def test_invalid_arguments(programs, arguments):
+    with pytest.raises(SystemExit) as exit_info:
+        main([programs['inc'], programs['inc'], *arguments])
+    assert exit_info.value.code == 2
+
+def test_exit_codes(programs):
+    pytest.importorskip('numpy')
+    assert main([programs['inc'], programs['inc'], '--inputs', '1', '--workers', '1']) == 0
+    assert main([programs['inc'], programs['inc2'], '--inputs', '1', '--workers', '1']) == 1
+    assert main([programs['loop'], programs['loop'], '--inputs', '1', '--max-steps', '10', '--workers', '1']) == INCONCLUSIVE
@@ -0,0 +1,30 @@
+# Beobachter muessen mit und ohne Superinstruktionen dieselben Ereignisse bekommen
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from machine import *
+
+LOOPS = [
+    'cadd 1\nif != 10\ngoto 1\nend',
+    'cload 3\nstore 1\nload 1\ncsub 1\nstore 1\nif != 0\ngoto 3\nend',
+    'cload 5\nstore 2\nload 2\nstore 3\nload 3\ncadd 1\nstore 4\nend',
+]
+
+def events(source: str, kind: str, fuse: bool) -> list:
+    machine = Machine().add_standard_instructions().fuse_instructions(fuse)
+    collected = []
+    machine.add_hook(kind, collected.extend)
+    machine.program = Program.from_string(source)
+    machine.run(1000)
+    return collected
+
+def test_events_with_fusion():
+    for source in LOOPS:
+        for kind in ('step', 'write', 'branch'):
+            assert events(source, kind, True) == events(source, kind, False), (source, kind)
+
+def test_branch_events_in_fused_loop():
+    assert len(events(LOOPS[0], 'branch', True)) == 10
@@ -0,0 +1,18 @@
+# Der Bytecode-Interpreter von run() verhaelt sich wie der Einzelschritt
+
+from random_programs import *
+
+def test_run_matches_step():
+    for seed in SEEDS:
+        program, registers = random_program(seed), random_registers(seed)
+        assert run(prepared(program, registers)) == reference(program, registers), seed
+
+def test_run_in_slices_matches_step():
+    for seed in SEEDS[:50]:
+        program, registers = random_program(seed), random_registers(seed)
+        machine = prepared(program, registers)
+        for _ in range(MAX_STEPS // 7 + 1):
+            outcome = run(machine, min(7, MAX_STEPS - machine.steps))
+            if outcome[3] is not None or machine.is_halted() or machine.steps >= MAX_STEPS:
+                break
+        assert outcome == reference(program, registers), seed
@@ -0,0 +1,37 @@
+# Der JIT verhaelt sich wie der Einzelschritt, uebersetzte Programme werden je Programmobjekt nur einmal gehasht
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from machine import *
+from random_programs import *
+
+def test_fingerprint_once_per_program(monkeypatch):
+    calls = []
+    fingerprint = Program.fingerprint
+    monkeypatch.setattr(Program, 'fingerprint', lambda program: calls.append(program) or fingerprint(program))
+    machine = Machine().add_standard_instructions().use_jit()
+    machine.program = Program.from_string('cadd 1\nstore 1\ngoto 1')
+    for _ in range(50):
+        machine.run(10)
+    assert machine.steps == 500 and machine.memory[1] == machine.memory[0]
+    assert len(calls) == 1
+
+def test_jit_matches_step():
+    for seed in SEEDS:
+        program, registers = random_program(seed), random_registers(seed)
+        machine = prepared(program, registers).use_jit()
+        assert run(machine) == reference(program, registers), seed
+
+def test_jit_in_slices_matches_step():
+    # Kurze Abschnitte enden mitten in Grundbloecken, den Rest uebernimmt der Interpreter
+    for seed in SEEDS[:50]:
+        program, registers = random_program(seed), random_registers(seed)
+        machine = prepared(program, registers).use_jit()
+        while True:
+            outcome = run(machine, min(5, MAX_STEPS - machine.steps))
+            if outcome[3] is not None or machine.is_halted() or machine.steps >= MAX_STEPS:
+                break
+        assert outcome == reference(program, registers), seed
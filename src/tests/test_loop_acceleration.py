@@ -0,0 +1,56 @@
+# Beschleunigte Zaehlschleifen muessen wie der Interpreter enden, auch bei Schrittgrenzen
+
+import random
+
+import loop_acceleration
+from random_programs import *
+from benchmarks.workloads import counted_loops
+
+def final_state(source: str, accelerate: bool, max_steps: int | None, word_size: int = Constants.WORD_SIZE) -> tuple:
+    machine = Machine(word_size=word_size).add_standard_instructions().accelerate_loops(accelerate)
+    machine.program = Program.from_string(source)
+    machine.run(max_steps)
+    return machine.program_counter, machine.steps, list(machine.memory)
+
+def test_counted_loops_match_interpreter():
+    source = counted_loops(2, 7)
+    for max_steps in (None, 1, 10, 57, 300, 10_000):
+        assert final_state(source, True, max_steps) == final_state(source, False, max_steps), max_steps
+
+def test_endless_loop_is_simulated_once(monkeypatch):
+    calls = []
+    iterations = loop_acceleration.CountingLoop.iterations
+    monkeypatch.setattr(loop_acceleration.CountingLoop, 'iterations', lambda loop, x: calls.append(x) or iterations(loop, x))
+    for word_size, limit in ((8, 255), (16, 65535)):
+        calls.clear()
+        source = f'cadd 2\nif < {limit}\ngoto 1\nend'
+        assert final_state(source, True, 3000, word_size) == final_state(source, False, 3000, word_size)
+        assert len(calls) == 1
+
+def counting_loop(seed: int) -> Program:
+    """Zufaellige Schleife aus affinen Befehlen auf Akkumulator und Register 1."""
+    rng = random.Random(seed)
+    body = ['load 1']
+    for _ in range(rng.randrange(1, 4)):
+        body.append(rng.choice(['cadd {}', 'csub {}', 'cmult {}', 'add 1', 'sub 1', 'load 1']).format(rng.randrange(1, 8)))
+    body.append('store 1')
+    if rng.random() < 0.5:
+        body += ['load 1', f'cmult {rng.randrange(1, 4)}', 'store 2']
+    comparator = rng.choice(['=', '!=', '<', '<=', '>', '>='])
+    source = [f'cload {rng.randrange(256)}', 'store 1'] + body + [f'if {comparator} {rng.randrange(256)}', 'goto 3', 'end']
+    return Program.from_string('\n'.join(source))
+
+def test_random_counting_loops_match_step():
+    accelerated = 0
+    for seed in SEEDS:
+        program = counting_loop(seed)
+        accelerated += bool(loop_acceleration.find_counting_loops(program))
+        for max_steps in (MAX_STEPS, 13):
+            machine = prepared(program, []).accelerate_loops()
+            assert run(machine, max_steps) == reference(program, [], max_steps), (seed, max_steps)
+    assert accelerated > len(SEEDS) // 2
+
+def test_random_programs_match_step():
+    for seed in SEEDS:
+        program, registers = random_program(seed), random_registers(seed)
+        assert run(prepared(program, registers).accelerate_loops()) == reference(program, registers), seed
@@ -0,0 +1,19 @@
+# Die Endlosschleifenerkennung aendert keinen Lauf und meldet nur Laeufe, die nie enden
+
+from random_programs import *
+
+def test_detection_matches_step():
+    detected = 0
+    for seed in SEEDS:
+        program, registers = random_program(seed), random_registers(seed)
+        machine = prepared(program, registers).detect_loops()
+        pc, steps, memory, error = run(machine)
+        if error is not None and error.startswith('Infinite loop detected'):
+            detected += 1
+            # Bis zur Meldung verlaeuft alles wie im Einzelschritt, danach endet der Lauf nie
+            assert (pc, steps, memory, None) == reference(program, registers, steps), seed
+            outcome = reference(program, registers)
+            assert outcome[3] is None and outcome[1] == MAX_STEPS, seed
+        else:
+            assert (pc, steps, memory, error) == reference(program, registers), seed
+    assert detected
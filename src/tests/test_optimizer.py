@@ -0,0 +1,20 @@
+# Optimierte Programme enden mit denselben Registern und Fehlern wie der Einzelschritt
+
+from random_programs import *
+from optimizer import optimize
+
+def test_optimized_matches_step():
+    shorter = 0
+    for seed in SEEDS:
+        program, registers = random_program(seed), random_registers(seed)
+        optimized = optimize(program)
+        shorter += optimized.size() < program.size()
+        pc, steps, memory, error = reference(program, registers)
+        if error is None and steps >= MAX_STEPS:
+            # Laeufe am Schrittlimit werden wie in check_equivalence nicht bewertet
+            continue
+        outcome = run(prepared(optimized, registers))
+        # Die optimierte Fassung braucht hoechstens so viele Schritte
+        assert outcome[1] <= steps, seed
+        assert (outcome[2], outcome[3]) == (memory, error), seed
+    assert shorter
@@ -0,0 +1,31 @@
+# Programme aus dem Binaerformat .ramc laufen wie die Originale im Einzelschritt
+
+import ramc
+from optimizer import optimize
+from random_programs import *
+
+def test_round_trip_matches_step():
+    for seed in SEEDS:
+        program, registers = random_program(seed), random_registers(seed)
+        loaded = ramc.loads(ramc.dumps(program))
+        assert loaded.fingerprint() == program.fingerprint(), seed
+        assert run(prepared(loaded, registers)) == reference(program, registers), seed
+
+def test_line_map_survives():
+    for seed in SEEDS[:50]:
+        optimized = optimize(random_program(seed))
+        loaded = ramc.loads(ramc.dumps(optimized))
+        assert loaded.line_map == optimized.line_map, seed
+        assert all(loaded.source_line(pc) == optimized.source_line(pc) for pc in range(optimized.size() + 2)), seed
+
+def test_cached_source_matches_step(tmp_path):
+    source = 'cload 5\nstore 1\n# Kommentar\nload 1\ncsub 1\nstore 1\nif > 0\ngoto 4\ncload -1\nend'
+    path = tmp_path / 'countdown.ram'
+    path.write_text(source, encoding='utf-8')
+    cache_dir = str(tmp_path / 'cache')
+    parsed = Program.from_string(source)
+    # Der erste Aufruf parst und speichert, der zweite laedt aus dem Cache
+    for _ in range(2):
+        loaded = ramc.load_cached(str(path), cache_dir)
+        assert run(prepared(loaded, [])) == reference(parsed, [])
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
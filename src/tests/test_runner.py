@@ -0,0 +1,25 @@
+# Jeder Lauf des Runners liefert ein Ergebnis, auch bei fehlerhaften Belegungen
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from runner import run_job
+
+@pytest.fixture
+def program(tmp_path) -> str:
+    path = tmp_path / 'add.ram'
+    path.write_text('load 1\nadd 2\nstore 3\nend\n', encoding='utf-8')
+    return str(path)
+
+def test_run_job(program):
+    result = run_job(program, [0, 2, 3], 100)
+    assert result['halted'] and result['registers'][3] == 5
+
+@pytest.mark.parametrize('registers', [['a', 1], [1.5], [True], 'x', {'1': 2}])
+def test_invalid_registers(program, registers):
+    result = run_job(program, registers, 100)
+    assert not result['halted'] and result['error'].startswith('Input registers must be a list of integers')
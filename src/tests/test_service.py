@@ -0,0 +1,61 @@
+# Optionen und Limits des Ausfuehrungsdienstes, Ergebnisse wie im Einzelschritt
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from service import *
+from random_programs import *
+
+def options(request: dict) -> Options:
+    # Ohne Pool, options() braucht nur die Limits des Dienstes
+    service = ExecutionService.__new__(ExecutionService)
+    service.max_steps = 1000
+    service.time_limit = 1.0
+    return service.options(request)
+
+def test_limits_are_capped():
+    assert options({'time_limit': 100, 'max_steps': 10**9}).key()[:2] == (1000, 1.0)
+    assert options({'time_limit': 0.5}).time_limit == 0.5
+
+@pytest.mark.parametrize('request_options', [
+    {'time_limit': float('nan')}, {'time_limit': float('inf')}, {'time_limit': 0}, {'time_limit': -1},
+    {'time_limit': [1]}, {'time_limit': {}}, {'register_count': MAX_REGISTER_COUNT + 1}, {'word_size': 12},
+])
+def test_invalid_options(request_options):
+    with pytest.raises(ValueError):
+        options(request_options)
+
+def test_time_limit_covers_whole_batch():
+    start = time.perf_counter()
+    results = run_batch(source_hash('goto 1'), 'goto 1', [[1], [2], [3]], Options(10**12, 0.2, False, 8, 8))
+    assert time.perf_counter() - start < 0.5
+    assert all(result['error'] == 'Time limit of 0.2 s reached' for result in results)
+
+def source_of(program: Program) -> str:
+    return '\n'.join('' if e.operator == Operator.NONE else str(e) for e in program.instructions)
+
+def assert_matches_step(program: Program, inputs: list[list[int]], results: list[dict], seed: int):
+    for registers, result in zip(inputs, results, strict=True):
+        pc, steps, memory, error = reference(program, registers)
+        assert (result['registers'], result['program_counter'], result['steps']) == (memory, pc, steps), seed
+        # Wie Machine.is_halted(), am Schrittlimit meldet der Dienst einen Fehler
+        halted = not (pc <= program.size() and program[pc - 1].operator != Operator.END)
+        if error is None and not halted:
+            error = f'Step limit of {MAX_STEPS} reached'
+        assert (result['error'], result['halted']) == (error, error is None), seed
+
+@pytest.mark.parametrize('lanes, use_jit', [(1, False), (3, True), (VECTOR_BATCH, False)])
+def test_batches_match_step(lanes, use_jit):
+    if lanes >= VECTOR_BATCH:
+        pytest.importorskip('numpy')
+    for seed in SEEDS[:60]:
+        program = random_program(seed)
+        source = source_of(program)
+        inputs = [random_registers(seed * lanes + lane) for lane in range(lanes)]
+        results = run_batch(source_hash(source), source, inputs, Options(MAX_STEPS, 10.0, use_jit, 8, 8))
+        assert_matches_step(program, inputs, results, seed)
@@ -0,0 +1,69 @@
+# Zurueckgehen muss unabhaengig von Haltepunkten, Beobachtern und Profiler genau ankommen
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from machine import *
+
+COUNTER = 'cload 1\ncadd 1\ncadd 1\ncadd 1\ncadd 1\ncadd 1\ncadd 1\ncadd 1\nend'
+
+def recorded_machine() -> Machine:
+    machine = Machine().add_standard_instructions().record_trace()
+    machine.trace.snapshot_interval = 3
+    machine.program = Program.from_string(COUNTER)
+    return machine
+
+def test_run_back_to_ignores_breakpoints():
+    machine = recorded_machine()
+    machine.run()
+    machine.add_breakpoint(4)
+    assert machine.run_back_to(5)
+    assert (machine.program_counter, machine.steps, machine.memory[0]) == (5, 4, 4)
+    assert machine.stopped is None
+
+def test_replay_is_not_observed():
+    machine = recorded_machine().profile()
+    events = []
+    machine.add_hook('step', events.extend)
+    machine.run()
+    count, hits = len(events), list(machine.profiler.hits)
+    assert machine.run_back_to(5)
+    assert len(events) == count
+    assert list(machine.profiler.hits) == hits
+
+LOOP = 'cload 3\nstore 1\nload 1\ncsub 1\nstore 1\nstore 2\nif != 0\ngoto 3\nend'
+
+def test_step_back_over_unknown_effects():
+    program = Program.from_string(LOOP)
+    for sparse in (False, True):
+        reference = Machine(register_count=64, sparse=sparse).add_standard_instructions()
+        reference.program = program
+        states = []
+        while not reference.is_halted():
+            states.append((reference.program_counter, reference.steps, list(reference.memory)))
+            reference.step()
+        # Unter der Endlosschleifenerkennung ist auch jedes goto ein Befehl mit unbekannter Wirkung
+        machine = Machine(register_count=64, sparse=sparse).add_standard_instructions().detect_loops().record_trace()
+        # Als eigener Befehl hat auch store eine unbekannte Wirkung
+        @machine.instruction()
+        def store(m: Machine, i: int) -> Machine:
+            m[i] = m[0]
+            return m
+        machine.program = program
+        machine.run()
+        # Gesichert werden nur die geaenderten Register, nicht der ganze Speicher
+        changes = [values for _, _, values in machine.trace.full.values()]
+        assert any(changes) and all(len(values) <= 1 for values in changes)
+        while states:
+            assert machine.step_back()
+            assert (machine.program_counter, machine.steps, list(machine.memory)) == states.pop()
+
+def test_registers_beyond_32_bit():
+    machine = Machine(register_count=1 << 40, word_size=64, sparse=True).add_standard_instructions().record_trace()
+    machine.run_code('cload 4294967296\nstore 5\ncload 1\nindstore 5\nend')
+    assert machine.memory.items() == [(0, 1), (5, 1 << 32), (1 << 32, 1)]
+    while machine.step_back():
+        pass
+    assert (machine.program_counter, machine.steps, machine.memory.items()) == (1, 0, [])
@@ -0,0 +1,19 @@
+# Der Worker veroeffentlicht nur die angezeigten Register, auch bei sehr grossem Speicher
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from machine import *
+from worker import MachineWorker
+
+def test_snapshot_of_large_sparse_memory():
+    machine = Machine(register_count=1 << 40, word_size=64, sparse=True).add_standard_instructions()
+    machine.program = Program.from_string('cadd 1\nstore 3\ngoto 1')
+    worker = MachineWorker(machine).start()
+    time.sleep(0.05)
+    snapshot = worker.stop()
+    assert len(snapshot.memory) == Constants.REGISTER_COUNT
+    assert snapshot.steps > 0 and snapshot.memory[0] == machine.memory[0]
@@ -0,0 +1,244 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+from array import array
+from collections import deque
+from typing import Callable
+
+from bytecode import Code, OPCODES, OP_CALL, OP_END, OP_EXIT, OP_UNDEFINED
+from constants import *
+from memory import changed_registers, contents, restore_contents, saved_values
+from program import *
+
+# Standardgroesse des Ringpuffers, 20 Byte je Schritt
+DEFAULT_CAPACITY = 1 << 20
+# Abstand der vollstaendigen Snapshots in Schritten
+SNAPSHOT_INTERVAL = 1 << 14
+
+# Besondere Werte fuer das geschriebene Register eines Eintrags
+NO_WRITE = -1
+FULL = -2 # Geaenderte Register in TimeTravel.full, z.B. fuer eigene Befehle
+
+CONDITIONS = {Operator.IF_EQ, Operator.IF_NE, Operator.IF_LT, Operator.IF_LE, Operator.IF_GT, Operator.IF_GE}
+# Befehle, die genau den Akkumulator ueberschreiben
+WRITES_ACCUMULATOR = {Operator.LOAD, Operator.ADD, Operator.SUB, Operator.MULT, Operator.DIV,
+                      Operator.CLOAD, Operator.CADD, Operator.CSUB, Operator.CMULT, Operator.CDIV,
+                      Operator.INDLOAD, Operator.INDADD, Operator.INDSUB, Operator.INDMULT, Operator.INDDIV}
+
+class TimeTravel:
+    """Zeichnet die Ausfuehrung einer Maschine als Ringpuffer kompakter Deltas auf.
+
+    Je Schritt werden nur Befehlszaehler vor dem Schritt, das geschriebene Register und dessen
+    alter Wert in Arrays abgelegt, ein Schritt laesst sich damit exakt rueckgaengig machen. Ist
+    der Puffer voll, werden die aeltesten Schritte ueberschrieben, der Speicherbedarf bleibt also
+    auch bei sehr langen Laeufen begrenzt. Zusaetzlich wird alle snapshot_interval Schritte der
+    vollstaendige Zustand gesichert, damit weite Spruenge zurueck per erneuter Ausfuehrung ab
+    einem Snapshot statt Schritt fuer Schritt erfolgen koennen. Setzt voraus, dass der Speicher
+    zwischen den Schritten nur vom Programm veraendert wird."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, snapshot_interval: int = SNAPSHOT_INTERVAL):
+        self.capacity = capacity
+        self.snapshot_interval = snapshot_interval
+        self.pcs = array('i', bytes(4 * capacity))
+        # Registernummern duenn besetzter Speicher passen nicht immer in 32 Bit
+        self.registers = array('q', bytes(8 * capacity))
+        self.values = array('Q', bytes(8 * capacity))
+        # Zustand vor Eintraegen mit FULL: Eintragsnummer -> (Befehlszaehler, Schritte, alte Werte
+        # der geaenderten Register als Paare (Register, Wert))
+        self.full: dict[int, tuple[int, int, tuple[tuple[int, int], ...]]] = {}
+        # Snapshots (Eintragsnummer, Befehlszaehler, Schritte, Speicher), aufsteigend
+        self.snapshots: deque[tuple[int, int, int, tuple[int, ...]]] = deque()
+        # Anzahl aller bisher aufgezeichneten Schritte, der naechste Eintrag hat diese Nummer
+        self.head = 0
+        # Nummer des aeltesten noch nicht ueberschriebenen Eintrags
+        self.start = 0
+        self.next_snapshot = 0
+        self.program: Program | None = None
+
+    def __len__(self) -> int:
+        """Anzahl der Schritte, die rueckgaengig gemacht werden koennen."""
+        return self.head - self.oldest()
+
+    def oldest(self) -> int:
+        return self.start
+
+    def clear(self):
+        self.full.clear()
+        self.snapshots.clear()
+        self.head = 0
+        self.start = 0
+        self.next_snapshot = 0
+        self.program = None
+
+    def follow(self, program: Program):
+        # Die Aufzeichnung gehoert immer zu genau einem Programm
+        if program is not self.program:
+            self.clear()
+            self.program = program
+
+    def take_snapshot(self, m):
+        self.snapshots.append((self.head, m.program_counter, m.steps, contents(m.memory)))
+        self.next_snapshot = self.head + self.snapshot_interval
+        # Snapshots vor dem aeltesten Eintrag werden nicht mehr gebraucht
+        while len(self.snapshots) > 1 and self.snapshots[1][0] <= self.oldest():
+            self.snapshots.popleft()
+
+    def record(self, pc: int, register: int, value: int):
+        head = self.head
+        position = head % self.capacity
+        if head - self.start >= self.capacity:
+            # Der ueberschriebene Eintrag kann einen vollstaendigen Zustand besitzen
+            self.full.pop(self.start, None)
+            self.start += 1
+        self.pcs[position] = pc
+        self.registers[position] = register
+        self.values[position] = value
+        self.head = head + 1
+
+    def call(self, m, function: Callable, operator: Operator | None, i: int):
+        """Fuehrt einen Befehl aus und zeichnet ihn auf. operator None steht fuer einen
+        Befehl mit unbekannter Wirkung, dann werden Schrittzahl und die alten Werte aller
+        Register gesichert, die er geaendert hat."""
+        if self.head >= self.next_snapshot:
+            self.take_snapshot(m)
+        pc = m.program_counter
+        memory = m.memory
+        if operator is None:
+            steps = m.steps
+            before = contents(memory)
+            function(m, i)
+            changed = changed_registers(m.memory, before)
+            self.full[self.head] = (pc, steps, saved_values(m.memory, before, changed))
+            self.record(pc, FULL, 0)
+            return m
+        register = NO_WRITE
+        if operator in WRITES_ACCUMULATOR:
+            register = 0
+        elif operator == Operator.STORE:
+            register = i
+        elif operator == Operator.INDSTORE and 0 <= i < len(memory):
+            register = memory[i]
+        if not 0 <= register < len(memory):
+            # Der Befehl scheitert ohnehin, es gibt nichts aufzuzeichnen
+            register = NO_WRITE
+        value = memory[register] if register != NO_WRITE else 0
+        function(m, i)
+        self.record(pc, register, value)
+        return m
+
+    def undo(self, m) -> bool:
+        """Macht den letzten aufgezeichneten Schritt rueckgaengig."""
+        if self.head <= self.oldest() or m.program is not self.program:
+            return False
+        self.head -= 1
+        position = self.head % self.capacity
+        register = self.registers[position]
+        if register == FULL:
+            pc, steps, values = self.full.pop(self.head)
+            for changed, value in values:
+                m.memory[changed] = value
+            m.steps = steps
+        else:
+            if register != NO_WRITE:
+                m.memory[register] = self.values[position]
+            pc = self.pcs[position]
+            m.steps -= 1
+        m.program_counter = pc
+        while self.snapshots and self.snapshots[-1][0] > self.head:
+            self.snapshots.pop()
+        self.next_snapshot = self.snapshots[-1][0] + self.snapshot_interval if self.snapshots else self.head
+        return True
+
+    def rewind_to(self, m, entry: int) -> bool:
+        """Stellt den Zustand vor dem Eintrag mit der Nummer entry wieder her. Liegt ein passender
+        Snapshot naeher als der aktuelle Zustand, wird ab dem Snapshot erneut ausgefuehrt."""
+        if not self.oldest() <= entry <= self.head or m.program is not self.program:
+            return False
+        snapshot = None
+        for candidate in reversed(self.snapshots):
+            if candidate[0] <= entry:
+                snapshot = candidate
+                break
+        replayable = (snapshot is not None and entry - snapshot[0] < self.head - entry
+                      and not any(snapshot[0] <= e < entry for e in self.full))
+        if replayable:
+            start, pc, steps, memory = snapshot
+            for e in [e for e in self.full if e >= start]:
+                del self.full[e]
+            while self.snapshots and self.snapshots[-1][0] > start:
+                self.snapshots.pop()
+            self.head = start
+            # Die Eintraege ab dem Snapshot werden bei der erneuten Ausfuehrung neu geschrieben
+            self.start = min(self.start, start)
+            self.next_snapshot = start + self.snapshot_interval
+            m.program_counter = pc
+            m.steps = steps
+            restore_contents(m.memory, memory)
+            # Ohne eigene Befehle entspricht jeder Eintrag genau einem Schritt. Haltepunkte,
+            # Beobachter und Profiler haben diese Schritte schon gesehen und bleiben aussen vor.
+            passes = m.code_passes
+            observers = [owner for owner in (m.profiler, m.hooks, m.breakpoints) if owner is not None]
+            m.code_passes = [p for p in passes if getattr(p, '__self__', None) not in observers]
+            try:
+                m.run(entry - start)
+            finally:
+                m.code_passes = passes
+        while self.head > entry:
+            self.undo(m)
+        return self.head == entry
+
+    def find_line(self, line: int, program: Program) -> int | None:
+        """Nummer des juengsten Eintrags, vor dessen Ausfuehrung der Befehlszaehler auf line stand."""
+        for entry in range(self.head - 1, self.oldest() - 1, -1):
+            if program.source_line(self.pcs[entry % self.capacity] or program.size()) == line:
+                return entry
+        return None
+
+    def code_pass(self, machine, code: Code):
+        """Leitet jeden Befehl des Codes ueber call(), damit auch run() aufgezeichnet wird."""
+        self.follow(code.program)
+        for pc in range(code.size + 1):
+            op = code.ops[pc]
+            if op in (OP_END, OP_UNDEFINED):
+                continue
+            operator = code.program[(pc or code.size) - 1].operator
+            if op == OP_CALL:
+                code.handlers[pc] = self.recorded(code.handlers[pc], None)
+            else:
+                code.handlers[pc] = self.recorded(machine.instruction_set[operator], operator)
+            code.ops[pc] = OP_CALL
+    # Die Aufzeichnung umschliesst die Befehle, die andere Durchlaeufe ersetzt haben
+    code_pass.order = 1
+
+    def recorded(self, function: Callable, operator: Operator | None) -> Callable:
+        if operator in WRITES_ACCUMULATOR or operator in (Operator.NONE, Operator.GOTO) or operator in CONDITIONS:
+            # Haeufigste Faelle ohne Fallunterscheidung zur Laufzeit
+            register = 0 if operator in WRITES_ACCUMULATOR else NO_WRITE
+            record = self.record
+            def fast_handler(m, i: int):
+                if self.head >= self.next_snapshot:
+                    self.take_snapshot(m)
+                pc = m.program_counter
+                value = m.memory[0]
+                function(m, i)
+                record(pc, register, value)
+                return m
+            return fast_handler
+        def handler(m, i: int):
+            return self.call(m, function, operator, i)
+        return handler
@@ -0,0 +1,134 @@
+# registermaschine - A simple register machine simulator
+# Copyright (C) 2024  Tim Ernst, Vincent A. Hey
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+import threading
+import time
+from typing import NamedTuple
+
+from machine import *
+
+# Dauer eines Ausfuehrungsabschnitts, nach dem der Worker Pause und Abbruch prueft
+SLICE = 0.002 # s
+
+class Snapshot(NamedTuple):
+    program_counter: int
+    # Nur die angezeigten Register, der ganze Speicher kann sehr gross sein
+    memory: tuple[int, ...]
+    steps: int
+    running: bool
+    error: str | None
+    # Grund, wenn ein Haltepunkt oder eine Ueberwachung den Lauf angehalten hat
+    stop: str | None = None
+
+class MachineWorker:
+    """Fuehrt eine Maschine in einem eigenen Thread aus, damit die GUI nicht blockiert.
+
+    Nach jedem kurzen Abschnitt wird ein unveraenderlicher Snapshot veroeffentlicht. Das
+    Ersetzen des Attributs ist atomar, die GUI kann snapshot daher ohne Sperre abfragen.
+    Waehrend der Ausfuehrung ist der Beobachter der Maschine abgehaengt, da Tk nur aus dem
+    Hauptthread verwendet werden darf. stop() haengt ihn wieder an und muss deshalb
+    aus dem Hauptthread aufgerufen werden."""
+
+    def __init__(self, machine: Machine, speed: int | None = None, visible: int | None = None):
+        self.machine = machine
+        # Schritte pro Sekunde, None = so schnell wie moeglich
+        self.speed = speed
+        self.data_manager = machine.data_manager
+        # Anzahl der Register im Snapshot, standardmaessig die des Beobachters
+        if visible is None:
+            visible = len(self.data_manager.registers) if self.data_manager is not None else Constants.REGISTER_COUNT
+        self.visible = visible
+        self.cancelled = threading.Event()
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self.snapshot = self.take_snapshot(True, None)
+        self.thread = threading.Thread(target=self.work, name='MachineWorker', daemon=True)
+
+    def take_snapshot(self, running: bool, error: str | None) -> Snapshot:
+        m = self.machine
+        stop = str(m.stopped) if m.stopped is not None else None
+        return Snapshot(m.program_counter, tuple(m.memory[:self.visible]), m.steps, running, error, stop)
+
+    def start(self) -> MachineWorker:
+        self.machine.detach()
+        self.thread.start()
+        return self
+
+    def pause(self):
+        self.resumed.clear()
+
+    def resume(self):
+        self.resumed.set()
+
+    def cancel(self):
+        self.cancelled.set()
+        # Ein pausierter Worker muss aufwachen, um den Abbruch zu bemerken
+        self.resumed.set()
+
+    def stop(self) -> Snapshot:
+        """Bricht den Worker ab, wartet auf ihn und haengt den Beobachter wieder an."""
+        self.cancel()
+        if self.thread.is_alive():
+            self.thread.join()
+        if self.data_manager is not None:
+            self.machine.attach(self.data_manager)
+        return self.snapshot
+
+    def work(self):
+        m = self.machine
+        error = None
+        chunk = 100
+        speed = self.speed
+        started = 0.0
+        done = 0
+        restart = True
+        try:
+            while not self.cancelled.is_set() and not m.is_halted():
+                if not self.resumed.is_set():
+                    self.resumed.wait()
+                    # Nach einer Pause beginnt die Taktung von vorn
+                    restart = True
+                    continue
+                if restart or self.speed != speed:
+                    speed = self.speed
+                    started = time.perf_counter()
+                    done = 0
+                    restart = False
+                steps = chunk
+                if speed is not None:
+                    # Der erste Schritt erfolgt sofort, danach im Takt der Geschwindigkeit
+                    due = int(speed * (time.perf_counter() - started)) + 1 - done
+                    if due <= 0:
+                        self.cancelled.wait(min((done / speed) - (time.perf_counter() - started), 0.05))
+                        continue
+                    steps = min(chunk, due)
+                begin = time.perf_counter()
+                before = m.steps
+                m.run(steps)
+                if m.stopped is not None:
+                    # Haltepunkt: der Worker endet, erneutes Play setzt hinter ihm fort
+                    break
+                done += steps
+                elapsed = time.perf_counter() - begin
+                if m.steps - before >= steps:
+                    # Abschnitte so bemessen, dass Pause und Abbruch nach wenigen Millisekunden greifen
+                    chunk = max(1, min(chunk * 2, int(steps * SLICE / elapsed) if elapsed > 0 else chunk * 2))
+                self.snapshot = self.take_snapshot(True, None)
+        except Exception as e:
+            error = str(e)
+        self.snapshot = self.take_snapshot(False, error)